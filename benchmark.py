@@ -0,0 +1,289 @@
+"""
+Measures the speed and solution quality of the solver on a sample of inputs.
+
+The sample takes the same number of inputs of every size (the _50, _100 and
+_200 suffixes of the input names), and each one is solved in a fresh process,
+one at a time, recording the seconds spent in each phase (parsing, the phases
+solver.solve reports in details['timings'], which include the all pairs
+shortest paths and every constructive solver, and writing the output), the
+peak resident memory of the process and the cost. An input that takes longer
+than --timeout seconds is stopped and counts as failed.
+
+The results are written as JSON and compared with a baseline written by an
+earlier run, and with the best cost of each input among the archived outputs
+in output_submissions/*.json. A cost that is worse than the baseline, or a
+size whose total time is slower than the baseline by more than the allowed
+tolerance, is a regression: it is printed and the command exits with status 1.
+
+    python3 benchmark.py --output baseline.json [params]
+    python3 benchmark.py --output benchmark.json --baseline baseline.json [params]
+
+The first command writes a baseline to compare later runs with.
+"""
+import sys
+sys.path.append('..')
+import argparse
+import collections
+import contextlib
+import glob
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import time
+
+import instance_cache
+import instance_io
+import instrumentation
+import utils
+from output_validator import check_output
+from parallel import run_tasks
+from solver import solve
+from solvers.context import InstanceContext
+
+ARCHIVE_PATTERN = 'output_submissions/*.json'
+
+# A cost more than this fraction above the baseline cost is a regression
+COST_TOLERANCE = 1e-6
+# A size whose inputs take more than this fraction longer in total than in the
+# baseline is a regression, unless they are faster than MIN_TIME_CHANGE seconds
+TIME_TOLERANCE = 0.25
+MIN_TIME_CHANGE = 0.5
+# Seconds an input may take before it is stopped and counts as failed
+TIMEOUT = 600
+
+
+def input_size(input_file):
+    """
+    The size tier of an input from its name, e.g. 200 for inputs/1_200.in, or
+    None if the name has no size suffix.
+    """
+    match = re.search(r'_(\d+)\.in$', os.path.basename(input_file))
+    return int(match.group(1)) if match else None
+
+
+def sample_inputs(input_directory, per_size, seed=0):
+    """
+    Picks per_size inputs of every size at random (the same ones for the same
+    seed and inputs), sorted by size and then name.
+    """
+    by_size = collections.defaultdict(list)
+    for input_file in sorted(utils.get_files_with_extension(input_directory, '.in')):
+        by_size[input_size(input_file)].append(input_file)
+    rng = random.Random(seed)
+    sample = []
+    for size in sorted(by_size, key=lambda size: (size is None, size or 0)):
+        files = by_size[size]
+        sample.extend(sorted(rng.sample(files, min(per_size, len(files)))))
+    return sample
+
+
+def load_archives(pattern=ARCHIVE_PATTERN):
+    """
+    Reads every archived output bundle, each a JSON object mapping output
+    names (e.g. 1_200.out) to output file contents.
+    """
+    archives = {}
+    for archive_file in sorted(glob.glob(pattern)):
+        with open(archive_file) as f:
+            archives[archive_file] = json.load(f)
+    return archives
+
+
+def archive_name(input_file):
+    return os.path.splitext(os.path.basename(input_file))[0] + '.out'
+
+
+def archived_cost(parsed_input, context, input_file, archives):
+    """
+    The lowest cost of a valid archived output of an input, or None.
+    """
+    name = archive_name(input_file)
+    best = None
+    for outputs in archives.values():
+        if name not in outputs:
+            continue
+        output_data = [line.split() for line in outputs[name].splitlines() if line.strip()]
+        try:
+            cost, _, _ = check_output(parsed_input, output_data, context=context)
+        except Exception:
+            continue
+        if not isinstance(cost, str) and (best is None or cost < best):
+            best = cost
+    return best
+
+
+def benchmark_input(input_file, params, archives):
+    """
+    Solves one input, timing every phase.
+    Output:
+        a dictionary with the input's size, the solver used, the cost, the
+        lower bound, the best archived cost, the timings, the work counters of
+        instrumentation and the peak resident memory in megabytes
+    """
+    with instrumentation.collect() as stats:
+        start = time.time()
+        instance = instance_cache.load_parsed(input_file)
+        timings = {'parse': time.time() - start}
+        _, _, list_locations, list_houses, starting_car_location, adjacency_matrix = instance
+
+        details = {}
+        with contextlib.redirect_stdout(io.StringIO()):
+            car_path, drop_offs = solve(list_locations, list_houses, starting_car_location, adjacency_matrix,
+                                        params=params, details=details)
+    timings.update(details['timings'])
+
+    start = time.time()
+    with tempfile.TemporaryDirectory() as output_directory:
+        instance_io.write_output(utils.input_to_output(input_file, output_directory),
+                                 car_path, drop_offs, list_locations)
+    timings['write'] = time.time() - start
+    timings['total'] = sum(timings.values())
+
+    context = InstanceContext(list_locations, list_houses, starting_car_location, adjacency_matrix)
+    return {
+        'input_file': input_file,
+        'size': input_size(input_file),
+        'solver': details['solver'],
+        'cost': details['cost'],
+        'lower_bound': details['lower_bound'],
+        'archived_cost': archived_cost(instance, context, input_file, archives),
+        'timings': timings,
+        'counters': dict(stats.counters),
+        'peak_memory_mb': instrumentation.peak_memory_mb(),
+    }
+
+
+def _benchmark_task(task):
+    input_file, params, archives = task
+    return benchmark_input(input_file, params, archives)
+
+
+def run_benchmark(input_files, params=[], archives=None, timeout=TIMEOUT):
+    """
+    Benchmarks every input in its own process, one after the other, so that
+    the timings do not compete for cores and peak memory is per input. An
+    input that fails, or takes more than timeout seconds and is stopped, is
+    recorded with the last line of its error.
+    """
+    archives = load_archives() if archives is None else archives
+    results = []
+    for input_file in input_files:
+        name = archive_name(input_file)
+        task = (input_file, params, {archive_file: {name: outputs[name]}
+                                     for archive_file, outputs in archives.items() if name in outputs})
+        # A pool of one worker per input, so every input gets a fresh process
+        result = next(run_tasks(_benchmark_task, [task], jobs=1, timeout=timeout))
+        if result.error is not None:
+            result = {'input_file': input_file, 'size': input_size(input_file),
+                      'error': result.error.strip().splitlines()[-1]}
+        else:
+            result = result.value
+        status = result.get('error') or f'cost {result["cost"]}, {result["timings"]["total"]:.2f} s'
+        print(f'{input_file}: {status}')
+        results.append(result)
+    return results
+
+
+def summarize(results):
+    """
+    Totals per size: number of inputs, total seconds per phase and overall,
+    total cost, worst peak memory and the mean ratio of cost to the best
+    archived cost.
+    """
+    summary = {}
+    for size in sorted({r.get('size') for r in results}, key=lambda size: (size is None, size or 0)):
+        rows = [r for r in results if r.get('size') == size and 'error' not in r]
+        phases = collections.defaultdict(float)
+        for r in rows:
+            for phase, seconds in r['timings'].items():
+                phases[phase] += seconds
+        ratios = [r['cost'] / r['archived_cost'] for r in rows if r['archived_cost']]
+        summary[str(size)] = {
+            'num_inputs': len(rows),
+            'num_failed': sum(1 for r in results if r.get('size') == size and 'error' in r),
+            'total_time': phases['total'],
+            'timings': dict(phases),
+            'total_cost': sum(r['cost'] for r in rows),
+            'peak_memory_mb': max([r['peak_memory_mb'] for r in rows] + [0]),
+            'mean_archive_ratio': sum(ratios) / len(ratios) if ratios else None,
+        }
+    return summary
+
+
+def compare(report, baseline, cost_tolerance=COST_TOLERANCE, time_tolerance=TIME_TOLERANCE):
+    """
+    Returns a message for every regression of report against baseline: an
+    input that failed or got more expensive, or a size that got slower.
+    """
+    regressions = []
+    baseline_inputs = {r['input_file']: r for r in baseline['inputs'] if 'error' not in r}
+    for r in report['inputs']:
+        old = baseline_inputs.get(r['input_file'])
+        if old is None:
+            continue
+        if 'error' in r:
+            regressions.append(f'{r["input_file"]} failed: {r["error"]}')
+        elif r['cost'] > old['cost'] * (1 + cost_tolerance) + cost_tolerance:
+            regressions.append(f'{r["input_file"]} costs {r["cost"]}, was {old["cost"]}')
+    for size, totals in report['summary'].items():
+        old = baseline['summary'].get(size)
+        if old is None or totals['num_inputs'] != old['num_inputs']:
+            continue
+        slower = totals['total_time'] - old['total_time']
+        if slower > time_tolerance * old['total_time'] and slower > MIN_TIME_CHANGE:
+            regressions.append(f'Inputs of size {size} took {totals["total_time"]:.2f} s, '
+                               f'was {old["total_time"]:.2f} s')
+    return regressions
+
+
+def print_summary(summary):
+    for size, totals in summary.items():
+        ratio = totals['mean_archive_ratio']
+        ratio = f'{ratio:.4f}' if ratio is not None else 'n/a'
+        print(f'size {size}: {totals["num_inputs"]} inputs, {totals["total_time"]:.2f} s, '
+              f'total cost {totals["total_cost"]}, cost / archived {ratio}, '
+              f'peak memory {totals["peak_memory_mb"]:.0f} MB')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the solver on a sample of inputs of every size')
+    parser.add_argument('--inputs', type=str, default='inputs', help='Directory of inputs to sample from')
+    parser.add_argument('--per-size', type=int, default=5, help='Number of inputs of every size')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the sample')
+    parser.add_argument('--output', type=str, default='benchmark.json', help='Where to write the results')
+    parser.add_argument('--baseline', type=str, default=None, help='Results of an earlier run to compare with; its sample is reused')
+    parser.add_argument('--cost-tolerance', type=float, default=COST_TOLERANCE, help='Allowed relative cost increase per input')
+    parser.add_argument('--time-tolerance', type=float, default=TIME_TOLERANCE, help='Allowed relative time increase per size')
+    parser.add_argument('--timeout', type=float, default=TIMEOUT, help='Seconds an input may take before it counts as failed')
+    parser.add_argument('params', nargs=argparse.REMAINDER, help='Extra key=value arguments passed to the solver')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline is not None:
+        if not os.path.isfile(args.baseline):
+            parser.error(f'baseline {args.baseline} does not exist; run without --baseline to write a first one')
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        input_files = [r['input_file'] for r in baseline['inputs']]
+    else:
+        input_files = sample_inputs(args.inputs, args.per_size, args.seed)
+
+    results = run_benchmark(input_files, params=args.params, timeout=args.timeout)
+    report = {'params': args.params, 'created': time.time(), 'inputs': results, 'summary': summarize(results)}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print_summary(report['summary'])
+
+    failed = [r for r in results if 'error' in r]
+    regressions = compare(report, baseline, args.cost_tolerance, args.time_tolerance) if baseline else []
+    regressions += [f'{r["input_file"]} failed: {r["error"]}' for r in failed
+                    if not baseline or r['input_file'] not in {b['input_file'] for b in baseline['inputs']}]
+    if regressions:
+        print(f'\n{len(regressions)} REGRESSIONS against {args.baseline or "the run"}:', file=sys.stderr)
+        for message in regressions:
+            print(f'  {message}', file=sys.stderr)
+        sys.exit(1)
+    print('No regressions' + (f' against {args.baseline}' if baseline else ''))
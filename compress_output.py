@@ -1,22 +1,238 @@
-import os
-import json
+import sys
+sys.path.append('..')
+sys.path.append('../..')
 import argparse
+import collections
+import json
+import os
+import re
+import zipfile
+
+import utils
+from instance_io import split_lines
+from output_validator import check_output, input_context, load_input
+from parallel import run_tasks
 
 """
-Run `python3 compress_outputs.py <path to output folder>` and submit the 'outputs.json'
-that is created to gradescope.
+Run `python3 compress_output.py <output folders, outputs_*.zip archives or
+output_submissions/*.json bundles>` and submit the 'outputs.json' that is
+created to gradescope.
+
+For every input in the input directory, the .out of that input in each source
+is scored and the cheapest valid one goes into outputs.json (the first source
+given wins ties). Sources are read in place, one output at a time: archives are
+not extracted, and JSON bundles are indexed by the position of every output in
+the file once, then read back one output at a time. Outputs are written to
+outputs.json as they are picked, so memory does not grow with the number or
+size of the outputs.
 """
+
+# Bytes read at a time from JSON bundles
+CHUNK_SIZE = 1 << 16
+
+# A complete JSON string, in bytes; '"' and '\\' never occur inside multibyte
+# UTF-8 characters
+JSON_STRING = re.compile(rb'"(?:[^"\\]|\\.)*"', re.DOTALL)
+JSON_SEPARATORS = re.compile(rb'[\s{}:,]*')
+
+
+class DirectorySource:
+    def __init__(self, path):
+        self.path = path
+        self.names = {name for name in os.listdir(path) if name.endswith('.out')}
+
+    def read(self, name):
+        with open(os.path.join(self.path, name), 'r') as f:
+            return f.read()
+
+
+class ZipSource:
+    def __init__(self, path):
+        """
+        The .out files of a zip archive, at any depth; the first one of each
+        name wins.
+        """
+        self.path = path
+        self.archive = zipfile.ZipFile(path)
+        self.members = {}
+        for member in self.archive.namelist():
+            name = os.path.basename(member)
+            if name.endswith('.out'):
+                self.members.setdefault(name, member)
+        self.names = set(self.members)
+
+    def read(self, name):
+        return self.archive.read(self.members[name]).decode()
+
+
+class BundleSource:
+    def __init__(self, path):
+        """
+        A JSON object mapping output names to output contents, as written by
+        this script. Only the byte offset of every output is kept.
+        """
+        self.path = path
+        self.file = open(path, 'rb')
+        self.offsets = {}
+        key = None
+        for offset, text in scan_json_strings(self.file):
+            if key is None:
+                key = json.loads(text)
+            else:
+                self.offsets.setdefault(key, offset)
+                key = None
+        self.names = set(self.offsets)
+
+    def read(self, name):
+        self.file.seek(self.offsets[name])
+        return json.loads(next(scan_json_strings(self.file))[1])
+
+
+def scan_json_strings(f, chunk_size=CHUNK_SIZE):
+    """
+    Yields the byte offset and the encoded text of every string in a JSON file
+    of strings in objects, from its current position, reading chunk_size bytes
+    at a time. Raises ValueError on anything else, e.g. a number or a list.
+    """
+    base = f.tell()
+    buffer = b''
+    pos = 0
+    while True:
+        start = JSON_SEPARATORS.match(buffer, pos).end()
+        match = JSON_STRING.match(buffer, start)
+        if match is None:
+            chunk = f.read(chunk_size)
+            if chunk:
+                # Drop what has been read and wait for the rest of the string
+                base += start
+                buffer = buffer[start:] + chunk
+                pos = 0
+                continue
+            if start < len(buffer):
+                raise ValueError(f'Unexpected {buffer[start:start + 20]!r} at byte {base + start} of {f.name}, '
+                                 f'expected a JSON object of strings')
+            return
+        yield base + match.start(), match.group()
+        pos = match.end()
+
+
+def open_source(path):
+    """
+    A directory, a zip archive (.zip) or a JSON bundle (.json) of outputs.
+    """
+    if os.path.isdir(path):
+        return DirectorySource(path)
+    if path.endswith('.zip'):
+        return ZipSource(path)
+    if path.endswith('.json'):
+        return BundleSource(path)
+    raise ValueError(f'{path} is not a directory, a .zip archive or a .json bundle')
+
+
+# Sources opened by each process, keyed by (process id, path), so that worker
+# processes never share a file position with the process that started them
+_open_sources = {}
+
+
+def get_source(path):
+    key = (os.getpid(), path)
+    if key not in _open_sources:
+        _open_sources[key] = open_source(path)
+    return _open_sources[key]
+
+
+def output_name(input_file):
+    return os.path.basename(utils.input_to_output(input_file, '.'))
+
+
+def pick_output(task):
+    """
+    Scores the output of one input in every source.
+    Input:
+        task: (input_file, list of source paths)
+    Output:
+        the index of the source with the cheapest valid output (None if there
+        is no valid output), its cost and the number of sources with an
+        output and with an invalid one
+    """
+    input_file, source_paths = task
+    name = output_name(input_file)
+    parsed_input = load_input(input_file)
+    context = input_context(parsed_input)
+    best, best_cost, num_outputs, num_invalid = None, None, 0, 0
+    for i, path in enumerate(source_paths):
+        source = get_source(path)
+        if name not in source.names:
+            continue
+        num_outputs += 1
+        output_data = [line.split() for line in split_lines(source.read(name))]
+        try:
+            cost, _, _ = check_output(parsed_input, output_data, context=context)
+        except Exception:
+            cost = 'infinite'
+        if isinstance(cost, str):
+            num_invalid += 1
+        elif best is None or cost < best_cost:
+            best, best_cost = i, cost
+    return best, best_cost, num_outputs, num_invalid
+
+
+def compress_outputs(input_directory, source_paths, output_file='outputs.json', jobs=1):
+    """
+    Writes the cheapest valid output of every input in input_directory among
+    the sources to output_file, a JSON object from output names (e.g.
+    1_200.out) to output contents. The file is written as outputs are picked,
+    and replaces output_file only once it is complete.
+    Output:
+        the total cost of the outputs written
+    """
+    input_files = sorted(utils.get_files_with_extension(input_directory, '.in'))
+    known = {output_name(input_file) for input_file in input_files}
+    sources = [get_source(path) for path in source_paths]
+    unknown = set().union(*(source.names for source in sources)) - known
+    if unknown:
+        print(f'Skipping {len(unknown)} outputs with no input in {input_directory}, e.g. {min(unknown)}')
+
+    wins = collections.Counter()
+    missing, total = [], 0
+    temp_file = output_file + '.tmp'
+    with open(temp_file, 'w') as f:
+        f.write('{')
+        first = True
+        tasks = [(input_file, source_paths) for input_file in input_files]
+        for result in run_tasks(pick_output, tasks, jobs=jobs):
+            input_file = result.task[0]
+            if result.error is not None:
+                print(f'Failed to score the outputs of {input_file}:\n{result.error}')
+                missing.append(input_file)
+                continue
+            best, cost, num_outputs, num_invalid = result.value
+            if num_invalid:
+                print(f'{num_invalid} of {num_outputs} outputs of {input_file} are invalid')
+            if best is None:
+                missing.append(input_file)
+                continue
+            name = output_name(input_file)
+            f.write(('' if first else ', ') + json.dumps(name) + ': ' + json.dumps(sources[best].read(name)))
+            first = False
+            wins[source_paths[best]] += 1
+            total += cost
+        f.write('}')
+    os.replace(temp_file, output_file)
+
+    for path in source_paths:
+        print(f'{wins[path]} outputs from {path}')
+    if missing:
+        print(f'No valid output for {len(missing)} inputs, e.g. {", ".join(missing[:10])}')
+    print(f'Wrote {sum(wins.values())} outputs to {output_file}, total cost {total}')
+    return total
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Parsing arguments')
-    parser.add_argument('outputs', type=str, help='The path to the output file or directory')
+    parser.add_argument('--inputs', type=str, default='inputs', help='The path to the input directory')
+    parser.add_argument('--output', type=str, default='outputs.json', help='Where to write the submission')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of worker processes to score outputs with')
+    parser.add_argument('outputs', type=str, nargs='+', help='Output directories, .zip archives of outputs or .json bundles')
     args = parser.parse_args()
-    with open('outputs.json', 'w') as output_json:
-        data = {}
-        for output in os.listdir(args.outputs):
-            with open(args.outputs + output, 'r') as output_file:
-                if output[-4:] == '.out':
-                    string = ''
-                    for l in output_file.readlines():
-                        string += l
-                        data[output] = string
-        output_json.write(json.dumps(data))
+    compress_outputs(args.inputs, args.outputs, args.output, jobs=args.jobs)
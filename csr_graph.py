@@ -0,0 +1,195 @@
+"""
+Compact undirected weighted graph for the solvers.
+
+Adjacency is stored in compressed sparse row form: the neighbors of u are
+indices[indptr[u]:indptr[u + 1]] and the matching edge weights are
+weights[indptr[u]:indptr[u + 1]], each edge appearing once from both ends.
+Vertices are 0..n-1. A dense n x n weight matrix (np.inf for no edge) answers
+edge weight queries in O(1); for graphs built from a matrix it is that matrix,
+shared rather than copied. A networkx graph is only built on request, with
+to_networkx, e.g. for drawing.
+"""
+import networkx as nx
+import numpy as np
+
+
+class CSRGraph:
+    __slots__ = ('indptr', 'indices', 'weights', '_matrix', '_networkx')
+
+    def __init__(self, indptr, indices, weights, matrix=None):
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self._matrix = matrix
+        self._networkx = None
+
+    @classmethod
+    def from_matrix(cls, matrix):
+        """
+        Builds the graph of an n x n float64 weight matrix with np.inf for no
+        edge, as made by shortest_paths.adjacency_matrix_to_weights. Neighbors
+        are listed in increasing order, as in adjacency_matrix_to_graph.
+        """
+        edges = np.isfinite(matrix)
+        np.fill_diagonal(edges, False)
+        rows, cols = np.nonzero(edges)
+        indptr = np.zeros(len(matrix) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(matrix)), out=indptr[1:])
+        return cls(indptr, cols, matrix[rows, cols], matrix)
+
+    @classmethod
+    def from_edges(cls, num_vertices, us, vs, ws):
+        """
+        Builds a graph from parallel arrays of edge endpoints and weights. Every
+        vertex lists its neighbors in the order its edges are given.
+        """
+        us, vs, ws = np.asarray(us, dtype=np.int64), np.asarray(vs, dtype=np.int64), np.asarray(ws, dtype=np.float64)
+        sources = np.column_stack([us, vs]).ravel()
+        targets = np.column_stack([vs, us]).ravel()
+        order = np.argsort(sources, kind='stable')
+        indptr = np.zeros(num_vertices + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=num_vertices), out=indptr[1:])
+        return cls(indptr, targets[order], np.repeat(ws, 2)[order])
+
+    @classmethod
+    def from_networkx(cls, G):
+        """
+        Builds the graph of a networkx graph whose nodes are 0..n-1, keeping its
+        neighbor order. Edges without a weight weigh 1.
+        """
+        indptr = np.zeros(len(G) + 1, dtype=np.int64)
+        np.cumsum([len(G.adj[u]) for u in range(len(G))], out=indptr[1:])
+        indices = np.array([v for u in range(len(G)) for v in G.adj[u]], dtype=np.int64)
+        weights = np.array([d.get('weight', 1) for u in range(len(G)) for d in G.adj[u].values()],
+                           dtype=np.float64)
+        return cls(indptr, indices, weights)
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def number_of_nodes(self):
+        return len(self)
+
+    def number_of_edges(self):
+        return len(self.indices) // 2
+
+    @property
+    def matrix(self):
+        if self._matrix is None:
+            n = len(self)
+            self._matrix = np.full((n, n), np.inf)
+            self._matrix[self.sources(), self.indices] = self.weights
+        return self._matrix
+
+    def sources(self):
+        """
+        The vertex each entry of indices is a neighbor of.
+        """
+        return np.repeat(np.arange(len(self)), np.diff(self.indptr))
+
+    def degrees(self):
+        return np.diff(self.indptr)
+
+    def neighbors(self, u):
+        return self.indices[self.indptr[u]:self.indptr[u + 1]].tolist()
+
+    def has_edge(self, u, v):
+        return u != v and self.matrix[u, v] != np.inf
+
+    def weight(self, u, v):
+        return float(self.matrix[u, v])
+
+    def edges(self):
+        """
+        Returns arrays (us, vs, ws) with every edge once, as u < v.
+        """
+        sources = self.sources()
+        once = sources < self.indices
+        return sources[once], self.indices[once], self.weights[once]
+
+    def minimum_spanning_tree(self):
+        """
+        Kruskal's algorithm, giving the same tree and neighbor order as
+        nx.minimum_spanning_tree on adjacency_matrix_to_graph: edges are taken
+        by increasing weight, ties in row major order, and every vertex lists
+        its tree neighbors in the order their edges were taken.
+        """
+        us, vs, ws = self.edges()
+        order = np.lexsort((vs, us, ws))
+        parent = list(range(len(self)))
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        taken = []
+        for e, u, v in zip(order.tolist(), us[order].tolist(), vs[order].tolist()):
+            root_u, root_v = find(u), find(v)
+            if root_u != root_v:
+                parent[root_u] = root_v
+                taken.append(e)
+                if len(taken) == len(self) - 1:
+                    break
+        return CSRGraph.from_edges(len(self), us[taken], vs[taken], ws[taken])
+
+    def dfs_walk(self, source):
+        """
+        Depth first traversal from source that walks back along every tree edge,
+        returning the closed walk as a list of vertices. On a tree this visits
+        every reachable vertex and returns to source.
+        """
+        indptr, indices = self.indptr.tolist(), self.indices.tolist()
+        seen = [False] * len(self)
+        seen[source] = True
+        walk = [source]
+        stack = [[source, indptr[source]]]
+        while stack:
+            frame = stack[-1]
+            u, i = frame
+            end = indptr[u + 1]
+            while i < end and seen[indices[i]]:
+                i += 1
+            if i == end:
+                stack.pop()
+                if stack:
+                    walk.append(stack[-1][0])
+                continue
+            frame[1] = i + 1
+            v = indices[i]
+            seen[v] = True
+            walk.append(v)
+            stack.append([v, indptr[v]])
+        return walk
+
+    def reachable(self, source):
+        """
+        Returns a boolean mask of the vertices reachable from source, expanding
+        one breadth first level at a time.
+        """
+        seen = np.zeros(len(self), dtype=bool)
+        seen[source] = True
+        frontier = np.array([source])
+        while len(frontier):
+            starts, ends = self.indptr[frontier], self.indptr[frontier + 1]
+            slots = np.repeat(ends - np.cumsum(ends - starts), ends - starts) + np.arange((ends - starts).sum())
+            frontier = np.unique(self.indices[slots])
+            frontier = frontier[~seen[frontier]]
+            seen[frontier] = True
+        return seen
+
+    def is_connected(self):
+        return len(self) > 0 and bool(self.reachable(0).all())
+
+    def to_networkx(self):
+        """
+        The same graph as an nx.Graph with 'weight' edge attributes, built the
+        first time it is asked for.
+        """
+        if self._networkx is None:
+            G = nx.Graph()
+            G.add_nodes_from(range(len(self)))
+            G.add_weighted_edges_from(zip(*[a.tolist() for a in self.edges()]))
+            self._networkx = G
+        return self._networkx
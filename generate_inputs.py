@@ -1,14 +1,43 @@
+"""
+Generates random inputs by joining random, branching, cycle and diamond
+subgraphs from phase1/generate_graphs.
+
+Run `python3 generate_inputs.py --sizes 50,100,200,1000,5000 --per-size N
+--seed S --jobs J [output directory]` to write N inputs of every size, named
+<k>_<size>.in like the inputs in inputs/. Every input is generated from its own
+seed (see instance_seed), so any one of them can be regenerated on its own and
+a run with the same seed writes the same files whatever the number of jobs.
+Each input is checked with the input validator's adjacency matrix checks
+before it is written, and a line per input with its seed, its size and how long
+it took (or why it failed) is appended to manifest.jsonl in the output
+directory.
+"""
+import sys
+sys.path.append('..')
+import argparse
+import json
+import os
+import random
+import time
+
+import numpy as np
+
 from phase1.generate_graphs import (
     create_random_graph,
     create_branching_graph,
     create_cycle_graph,
     create_diamond_graph)
 from phase1.subgraph import join_subgraphs
-import random
-import os
-from utils import write_to_file
-from student_utils import is_metric
-import numpy as np
+from instance_io import write_input
+from input_validator import weights_tests
+from parallel import run_tasks
+from shortest_paths import graph_to_weights
+
+# Fraction of the locations that are homes
+HOME_FRACTION = 0.5
+
+DEFAULT_SIZES = [50, 100, 200, 1000, 5000]
+
 
 def generate_small():
     return create_branching_graph(50, 3, .5)
@@ -30,16 +59,13 @@ def generate_bigger(size):
             remainder = num_verts % 4
             num_verts -= remainder
         num_verts = min(num_verts, limit)
+        if num_verts < 4:
+            # Too few vertices left for a random, cycle or diamond subgraph
+            indx, num_verts = 1, limit
         graphs.append(func[indx](num_verts))
         limit -= num_verts
-        print(limit)
     return join_subgraphs(graphs)
 
-# if __name__ == '__main__':
-#     G = generate_bigger(200)
-#     print(is_metric(G._G))
-#     G.draw()
-
 def select_houses(G, num_houses):
     sample = np.random.choice(len(G), size=num_houses, replace=False)
     return sample
@@ -53,51 +79,104 @@ def write_input_to_file(filepath, G, H, source):
     """
     # assert source in G, 'Source vertex must be in the graph'
 
-    def list_as_str(lst):
-        return [str(el) for el in lst]
-
-    num_vertices = len(G)
-    write_to_file(filepath, f'{num_vertices}\n')
-    num_houses = len(H)
-    write_to_file(filepath, f'{num_houses}\n', append=True)
-    write_to_file(filepath, " ".join(list_as_str(G.nodes())) + '\n', append=True)
-    write_to_file(filepath, " ".join(list_as_str(H)) + '\n', append=True)
-    write_to_file(filepath, f'{source}\n', append=True)
-    adj = graph_to_adjacency_matrix(G)
-    for i, row in enumerate(adj):
-        write_to_file(filepath,
-            " ".join(list_as_str(row)) + ('\n' if i < len(adj) - 1 else ''),
-            append=True)
+    write_input(filepath, list(G.nodes()), list(H), source, graph_to_adjacency_matrix(G))
 
 def graph_to_adjacency_matrix(G):
-    adj = [['x' for _ in range(len(G))] for _ in range(len(G))]
-    for edge in G.edges(data=True):
-        u, v, data = edge
-        adj[u][v] = adj[v][u] = data['weight']
-    return adj
-
-# if __name__ == '__main__':
-#     from generate_graphs import create_branching_graph
-#     G = create_branching_graph(10)
-#     H = [2, 4, 6]
-#     source = 0
-#     fp = './test.in'
-#     write_input_to_file(fp, G, H, source)
+    """
+    The adjacency matrix of G in the order of G.nodes, as a float array with
+    NaN for no edge, which instance_io.write_input writes with 'x'.
+    """
+    weights = graph_to_weights(G)
+    weights[np.isinf(weights)] = np.nan
+    return weights
+
+
+def instance_seed(seed, size, index):
+    """
+    The seed of the index-th input of a size in a run with the given seed.
+    """
+    return random.Random(f'{seed}-{size}-{index}').getrandbits(32)
+
+
+def generate_instance(size, seed, num_houses=None):
+    """
+    Generates one input of size locations from seed, seeding both random and
+    np.random, which the subgraph generators draw from.
+    Output:
+        the location names, the homes, the starting location and the
+        adjacency matrix, as instance_io.write_input takes them
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    if num_houses is None:
+        num_houses = max(1, int(size * HOME_FRACTION))
+    G = generate_bigger(size)._G
+    locations = list(G.nodes())
+    houses = [locations[i] for i in select_houses(G, num_houses).tolist()]
+    return locations, houses, locations[0], graph_to_adjacency_matrix(G)
+
+
+def _generate_task(task):
+    """
+    Generates, checks and writes one input.
+    Output:
+        a manifest entry: the input file, its size, seed and number of edges,
+        the seconds it took, and the validator's message if it is invalid (in
+        which case it is not written)
+    """
+    input_file, size, seed, num_houses = task
+    start = time.time()
+    locations, houses, source, weights = generate_instance(size, seed, num_houses)
+    message, error = weights_tests(weights, len(locations))
+    entry = {'input_file': input_file, 'size': len(locations), 'seed': seed, 'num_houses': len(houses),
+             'num_edges': int(np.sum(~np.isnan(weights)) // 2), 'error': message if error else None}
+    if not error:
+        write_input(input_file, [str(v) for v in locations], [str(v) for v in houses], str(source), weights)
+    entry['elapsed'] = time.time() - start
+    return entry
+
+
+def generate_all(output_directory, sizes=DEFAULT_SIZES, per_size=1, seed=0, jobs=1, num_houses=None):
+    """
+    Writes per_size inputs of every size to output_directory across `jobs`
+    worker processes, appending a manifest entry for each (see
+    _generate_task) to manifest.jsonl there as they finish.
+    Output:
+        the number of inputs that failed
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    manifest_file = os.path.join(output_directory, 'manifest.jsonl')
+    tasks = [(os.path.join(output_directory, f'{index}_{size}.in'), size, instance_seed(seed, size, index), num_houses)
+             for size in sizes for index in range(1, per_size + 1)]
+    failed = 0
+    for result in run_tasks(_generate_task, tasks, jobs=jobs):
+        input_file, size, instance_seed_, _ = result.task
+        if result.error is not None:
+            entry = {'input_file': input_file, 'size': size, 'seed': instance_seed_, 'error': result.error,
+                     'elapsed': result.elapsed}
+        else:
+            entry = result.value
+        if entry['error'] is not None:
+            failed += 1
+            print(f'Failed to generate {input_file} (seed {instance_seed_}):\n{entry["error"]}')
+        else:
+            print(f'Wrote {input_file} ({entry["num_edges"]} edges) in {entry["elapsed"]:.1f} seconds')
+        with open(manifest_file, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+    print(f'Generated {len(tasks) - failed} of {len(tasks)} inputs in {output_directory}')
+    return failed
+
 
 if __name__ == '__main__':
-    # from generate_graphs import create_branching_graph
-    # G = create_branching_graph(10)
-    # H = [2, 4, 6]
-    # source = 0
-    # fp = './test.in'
-    # write_input_to_file(fp, G, H, source)
-    def list_as_str(lst):
-        return [str(el) for el in lst]
-
-    filepath = '200.out'
-    num_vertices = 200
-    vertices = [i for i in range(num_vertices)]
-    num_houses = 100
-    write_to_file(filepath, " ".join(list_as_str(vertices)) + '\n')
-    write_to_file(filepath, f'{num_houses}\n', append=True)
-    write_to_file(filepath, '0 ', append=True)
+    parser = argparse.ArgumentParser(description='Generates random inputs of several sizes')
+    parser.add_argument('--sizes', type=str, default=','.join(map(str, DEFAULT_SIZES)), help='Comma separated numbers of locations')
+    parser.add_argument('--per-size', type=int, default=1, help='Number of inputs of every size')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the run; each input gets its own seed from it')
+    parser.add_argument('--houses', type=int, default=None, help=f'Number of homes in every input (default: {HOME_FRACTION} of the locations)')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of worker processes')
+    parser.add_argument('output_directory', type=str, nargs='?', default='generated_inputs', help='Where to write the inputs')
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+    failed = generate_all(args.output_directory, sizes=sizes, per_size=args.per_size, seed=args.seed,
+                          jobs=args.jobs, num_houses=args.houses)
+    sys.exit(1 if failed else 0)
@@ -2,47 +2,87 @@ import sys
 sys.path.append('..')
 sys.path.append('../..')
 import os
+import re
 import argparse
 import utils
+from instance_cache import load_instance
+from parallel import run_tasks
+from csr_graph import CSRGraph
 import networkx as nx
 import numpy as np
 from student_utils import *
 
 # Change these if you want to allow files with different names and/or graph sizes
+# (or pass --sizes to check other sizes without editing this file)
 RANGE_OF_INPUT_SIZES = [50, 100, 200]
 VALID_FILENAMES = ['50.in', '100.in', '200.in']
 MAX_NAME_LENGTH = 20
 
-def validate_input(input_file, params=[]):
+def validate_input(input_file, params=[], sizes=None):
     print('Processing', input_file)
-    message, error = tests(input_file, params)
+    message, error = tests(input_file, params, sizes=sizes)
     print(message)
 
 
-def validate_all_inputs(input_directory, params=[]):
+def _validate_task(task):
+    input_file, params, sizes = task
+    return tests(input_file, params, sizes=sizes)
+
+
+def validate_all_inputs(input_directory, params=[], jobs=1, sizes=None):
+    """
+    Validates every input in input_directory across `jobs` worker processes,
+    printing each file's comments as it finishes.
+    """
     input_files = utils.get_files_with_extension(input_directory, 'in')
+    tasks = [(input_file, params, sizes) for input_file in input_files]
 
-    for input_file in input_files:
-        validate_input(input_file, params=params)
+    for result in run_tasks(_validate_task, tasks, jobs=jobs):
+        print('Processing', result.task[0])
+        if result.error is not None:
+            print(result.error)
+        else:
+            message, error = result.value
+            print(message)
 
 
-def tests(input_file, params=[]):
-    input_data = utils.read_file(input_file)
-    num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix = data_parser(input_data)
+def tests(input_file, params=[], sizes=None):
+    """
+    Checks an input file, returning the comments on it and whether it is
+    invalid. sizes lists the allowed numbers of locations, each allowed as the
+    file name <size>.in or, like the inputs generate_inputs.py writes,
+    <k>_<size>.in, and defaults to RANGE_OF_INPUT_SIZES.
+    """
+    # Generated inputs are only checked against sizes that are given
+    allow_generated_names = sizes is not None
+    if sizes is None:
+        sizes, valid_filenames = RANGE_OF_INPUT_SIZES, VALID_FILENAMES
+    else:
+        valid_filenames = [f'{size}.in' for size in sizes]
+    instance = load_instance(input_file)
+    if instance is None:
+        num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix = data_parser(utils.read_file(input_file))
+    else:
+        num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix = instance
     message = ''
     error = False
 
     file_basename = os.path.basename(input_file)
 
     # check name constraints
-    if file_basename not in VALID_FILENAMES:
-        message += f'Your file is named {file_basename}. The allowed file names are: {RANGE_OF_INPUT_SIZES}.\n'
+    name_size = None
+    if file_basename in valid_filenames:
+        name_size = sizes[valid_filenames.index(file_basename)]
+    elif allow_generated_names:
+        match = re.fullmatch(r'\d+_(\d+)\.in', file_basename)
+        if match and int(match.group(1)) in sizes:
+            name_size = int(match.group(1))
+    if name_size is None:
+        message += f'Your file is named {file_basename}. The allowed file names are: {sizes}.\n'
+        error = True
+    elif int(num_of_locations) > name_size:
+        message += f'Your file is named {file_basename}, but the size of the input is {num_of_locations}.\n'
         error = True
-
-    for i in range(len(RANGE_OF_INPUT_SIZES)):
-        if file_basename == VALID_FILENAMES[i] and (int(num_of_locations) > RANGE_OF_INPUT_SIZES[i]):
-            message += f'Your file is named {file_basename}, but the size of the input is {num_of_locations}.\n'
-            error = True
 
     if not all(name.isalnum() and len(name) <= MAX_NAME_LENGTH for name in list_locations):
         message += f'One or more of the names of your locations are either not alphanumeric or are above the max length of {MAX_NAME_LENGTH}.\n'
@@ -62,16 +102,17 @@ def tests(input_file, params=[]):
         error = True
 
     # check containment
-    if any(house not in list_locations for house in list_houses):
+    locations = set(list_locations)
+    if any(house not in locations for house in list_houses):
         message += f'You listed at least one house that is not an actual location. Ahh!\n'
         error = True
 
-    if starting_car_location not in list_locations:
+    if starting_car_location not in locations:
         message += f'You listed a starting car location that is not an actual location.\n'
         error = True
 
     # check distinct
-    if not len(set(list_locations)) == len(list_locations):
+    if not len(locations) == len(list_locations):
         message += 'The names of your locations are not distinct.\n'
         error = True
 
@@ -80,6 +121,97 @@ def tests(input_file, params=[]):
         error = True
 
     # check adjacency matrix
+    if instance is None:
+        matrix_message, matrix_error = adjacency_matrix_tests(adjacency_matrix, num_of_locations)
+    else:
+        matrix_message, matrix_error = weights_tests(adjacency_matrix, num_of_locations)
+    message += matrix_message
+    error = error or matrix_error
+
+    if not message:
+        message = "If you've received no other error messages, then your input is valid!\n\n\n"
+    return message, error
+
+
+def valid_entries(values):
+    """
+    Whether every weight is a strictly positive number up to 2e9 with at most
+    5 decimal digits, as decimal_digits_check counts them. Weights that are
+    already multiples of 1e-5 pass without formatting them; only the rest are
+    checked with decimal_digits_check.
+    """
+    in_range = (values > 0) & (values <= 2e9)
+    if not in_range.all():
+        return False
+    unsure = values[np.round(values, 5) != values]
+    return all(decimal_digits_check(entry) for entry in unsure.tolist())
+
+
+def weights_tests(weights, num_of_locations):
+    """
+    The adjacency matrix checks of tests on a float array with NaN for 'x', as
+    whole array operations. The graph that is checked for connectivity and the
+    metric property is the one adjacency_matrix_to_graph builds: zero entries
+    are not edges, and where the matrix is not symmetric the entry below the
+    diagonal wins.
+    """
+    message = ''
+    error = False
+    num_rows, num_columns = weights.shape
+    missing = np.isnan(weights)
+
+    if not num_rows == num_columns == num_of_locations:
+        message += f'The dimensions of your adjacency matrix do not match the number of locations you provided.\n'
+        error = True
+
+    if not valid_entries(weights[~missing]):
+        message += f'Your adjacency matrix may only contain the character "x", or strictly positive integers less than 2e+9, or strictly positive floats with less than 5 decimal digits.\n'
+        error = True
+
+    # if not square, terminate
+    if num_rows != num_columns:
+        message += f'Your adjacency matrix must be square.\n'
+        error = True
+        return message, error
+
+    # check requirements on square matrix
+    if not np.all((weights == weights.T) | (missing & missing.T)):
+        message += f'Your adjacency matrix is not symmetric.\n'
+        error = True
+
+    # if the graph has self loops, terminate
+    self_loops = np.flatnonzero(~np.diag(missing))
+    if len(self_loops):
+        for node in self_loops.tolist():
+            message += 'The location {} has a road to itself. This is not allowed.\n'.format(node)
+        error = True
+        return message, error
+
+    values = np.where(missing, 0, weights)
+    upper, lower = np.triu(values, 1), np.tril(values, -1).T
+    pair_weights = np.where(lower != 0, lower, upper)
+    graph_weights = np.where(pair_weights != 0, pair_weights, np.inf)
+    graph_weights = np.minimum(graph_weights, graph_weights.T)
+
+    if not CSRGraph.from_matrix(graph_weights).is_connected():
+        message += 'Your graph is not connected.\n'
+        error = True
+
+    if not weights_are_metric(graph_weights):
+        message += 'Your graph is not metric.\n'
+        error = True
+    return message, error
+
+
+def adjacency_matrix_tests(adjacency_matrix, num_of_locations):
+    """
+    The adjacency matrix checks of tests on the lists from data_parser, for
+    matrices that are not rectangular or hold non finite numbers and so have no
+    array form.
+    """
+    message = ''
+    error = False
+
     if not len(adjacency_matrix) == len(adjacency_matrix[0]) == num_of_locations:
         message += f'The dimensions of your adjacency matrix do not match the number of locations you provided.\n'
         error = True
@@ -94,7 +226,7 @@ def tests(input_file, params=[]):
         error = True
         return message, error
 
-    adjacency_matrix_numpy = np.matrix(adjacency_matrix)
+    adjacency_matrix_numpy = np.array(adjacency_matrix)
 
     # check requirements on square matrix
     if not np.all(adjacency_matrix_numpy.T == adjacency_matrix_numpy):
@@ -117,20 +249,21 @@ def tests(input_file, params=[]):
         message += 'Your graph is not metric.\n'
         error = True
 
-    if not message:
-        message = "If you've received no other error messages, then your input is valid!\n\n\n"
     return message, error
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Parsing arguments')
     parser.add_argument('--all', action='store_true', help='If specified, the input validator is run on all files in the input directory. Else, it is run on just the given input file.')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of worker processes to use with --all')
+    parser.add_argument('--sizes', type=str, default=None, help='Comma separated allowed input sizes, e.g. 50,100,200,1000 (default: RANGE_OF_INPUT_SIZES)')
     parser.add_argument('input', type=str, help='The path to the input file or directory')
     parser.add_argument('params', nargs=argparse.REMAINDER, help='Extra arguments passed in')
     args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')] if args.sizes else None
     if args.all:
         input_directory = args.input
-        validate_all_inputs(input_directory, params=args.params)
+        validate_all_inputs(input_directory, params=args.params, jobs=args.jobs, sizes=sizes)
     else:
         input_file = args.input
-        validate_input(input_file, params=args.params)
+        validate_input(input_file, params=args.params, sizes=sizes)
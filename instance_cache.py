@@ -0,0 +1,163 @@
+"""
+On-disk cache of parsed input files, keyed by a hash of the file contents.
+
+Each cached instance is one binary file:
+    MAGIC | header length (8 byte little endian) | JSON header | padding | weights
+where the header holds the counts and names from the input file and weights is
+the n x n float64 adjacency matrix in C order, with NaN for 'x'. Weights are
+memory-mapped on load, so reading a cached instance costs almost nothing. Since
+the key is the content hash, editing an input file simply misses the cache.
+Small results derived from an input, such as its validation, are stored next to
+it as JSON (see read_json and write_json).
+"""
+import collections
+import hashlib
+import json
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+import instrumentation
+import utils
+from instance_io import read_input
+from student_utils import data_parser
+
+CACHE_DIR = os.environ.get('INSTANCE_CACHE_DIR', '.instance_cache')
+MAGIC = b'CS170IN1'
+ALIGNMENT = 64
+
+Instance = collections.namedtuple('Instance', [
+    'num_of_locations', 'num_houses', 'list_of_locations', 'list_of_houses',
+    'starting_car_location', 'weights'])
+
+
+def content_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def cache_path(digest, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, digest[:2], digest + '.bin')
+
+
+def read_json(path):
+    """
+    Reads a JSON file from the cache, returning None if it is missing or corrupt.
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(path, data):
+    """
+    Atomically writes data as JSON to a file in the cache.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+
+def array_to_adjacency_matrix(weights):
+    """
+    Converts a weight array with NaN for 'x' back into the list of lists that
+    data_parser returns.
+    """
+    return [['x' if entry != entry else entry for entry in row] for row in weights.tolist()]
+
+
+def write_cached(path, instance):
+    """
+    Atomically writes instance to path, so concurrent writers never leave a
+    partial file behind.
+    """
+    header = json.dumps({
+        'num_of_locations': instance.num_of_locations,
+        'num_houses': instance.num_houses,
+        'list_of_locations': instance.list_of_locations,
+        'list_of_houses': instance.list_of_houses,
+        'starting_car_location': instance.starting_car_location,
+        'shape': list(instance.weights.shape),
+    }).encode()
+    offset = len(MAGIC) + 8 + len(header)
+    padding = (-offset) % ALIGNMENT
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+        f.write(MAGIC + struct.pack('<Q', len(header)) + header + b'\0' * padding)
+        f.write(np.ascontiguousarray(instance.weights, dtype='<f8').tobytes())
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+
+def read_cached(path):
+    """
+    Reads a cached instance, memory-mapping its weights. Returns None if path is
+    missing or not a cache file.
+    """
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            header_length, = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_length))
+    except (OSError, ValueError, struct.error):
+        return None
+    offset = len(MAGIC) + 8 + header_length
+    offset += (-offset) % ALIGNMENT
+    shape = tuple(header.pop('shape'))
+    if shape[0] * shape[1]:
+        weights = np.memmap(path, dtype='<f8', mode='r', offset=offset, shape=shape)
+    else:
+        weights = np.zeros(shape)
+    return Instance(weights=weights, **header)
+
+
+def parse_instance(input_file):
+    """
+    Parses an input file from its text. Returns None if it is too malformed to
+    cache: a ragged adjacency matrix or non finite weights.
+    """
+    parsed = read_input(input_file)
+    if parsed[5] is None:
+        return None
+    return Instance(*parsed)
+
+
+def load_instance(input_file, cache_dir=CACHE_DIR):
+    """
+    Returns the parsed input file as an Instance, from the cache when its
+    contents have been parsed before. Raises the parser's error if the file is
+    malformed, and returns None if it parses but cannot be represented as an
+    Instance (see parse_instance).
+    """
+    path = cache_path(content_hash(input_file), cache_dir)
+    instance = read_cached(path)
+    instrumentation.count('instance_cache_misses' if instance is None else 'instance_cache_hits')
+    if instance is None:
+        instance = parse_instance(input_file)
+        if instance is not None:
+            try:
+                write_cached(path, instance)
+            except OSError:
+                pass
+    return instance
+
+
+def load_parsed(input_file, cache_dir=CACHE_DIR):
+    """
+    Drop-in replacement for data_parser(utils.read_file(input_file)) that goes
+    through the cache whenever the input can be cached.
+    """
+    instance = load_instance(input_file, cache_dir)
+    if instance is None:
+        return data_parser(utils.read_file(input_file))
+    return instance[:5] + (array_to_adjacency_matrix(instance.weights),)
@@ -0,0 +1,157 @@
+"""
+Fast reading and writing of the .in and .out file formats.
+
+The adjacency block of an input is parsed straight into a float64 array with NaN
+for 'x', and whole files are written with a single buffered write. Output is
+byte for byte what the original writers produced, so the validators read it
+unchanged. Outputs are written to a temporary file that then replaces the
+output, so an output is never left half written.
+"""
+import os
+import tempfile
+
+import numpy as np
+
+NO_EDGE = 'x'
+
+
+def read_lines(input_file):
+    """
+    Reads a file into a list of lines split on whitespace, like utils.read_file.
+    """
+    with open(input_file, 'r') as f:
+        return split_lines(f.read())
+
+
+def split_lines(text):
+    """
+    The lines of the contents of a file, as read_lines returns them.
+    """
+    lines = text.replace('Â', ' ').split('\n')
+    if lines and lines[-1] == '':
+        lines.pop()
+    return lines
+
+
+def row_lengths(lines, block):
+    """
+    Number of entries on each line. Lines written with single spaces only,
+    as every generator writes them, are counted without splitting.
+    """
+    single_spaced = (block.isascii() and '  ' not in block and '\t' not in block
+                     and not any(line[:1] == ' ' or line[-1:] == ' ' for line in lines))
+    if single_spaced:
+        return set(line.count(' ') + 1 if line else 0 for line in lines)
+    return set(len(line.split()) for line in lines)
+
+
+def parse_adjacency_block(lines):
+    """
+    Parses the rows of an adjacency matrix into an n x m float64 array with NaN
+    for 'x'. Returns None if the rows have different lengths or contain a
+    value that would be confused with 'x' (nan) or is not finite.
+    """
+    block = ' '.join(lines)
+    lengths = row_lengths(lines, block)
+    if len(lengths) > 1:
+        return None
+    num_columns = lengths.pop() if lengths else 0
+
+    num_missing = block.count(NO_EDGE)
+    block = block.replace(NO_EDGE, 'nan')
+    values = np.fromstring(block, dtype=np.float64, sep=' ') if block.strip() else np.zeros(0)
+    if len(values) != len(lines) * num_columns:
+        # Let numpy raise the same kind of error float() would for a bad entry
+        values = np.array(block.split(), dtype=np.float64)
+    if np.isnan(values).sum() != num_missing or np.isinf(values).any():
+        return None
+    return values.reshape(len(lines), num_columns)
+
+
+def read_input(input_file):
+    """
+    Parses an input file.
+    Output:
+        (num_of_locations, num_houses, list_of_locations, list_of_houses,
+        starting_car_location, weights), where weights is the adjacency matrix
+        as a float64 array with NaN for 'x', or None if the adjacency matrix
+        cannot be represented as an array (see parse_adjacency_block).
+        Malformed header lines raise the same errors as data_parser.
+    """
+    lines = read_lines(input_file)
+    header = [line.split() for line in lines[:5]]
+    num_of_locations = int(header[0][0])
+    num_houses = int(header[1][0])
+    list_of_locations = header[2]
+    list_of_houses = header[3]
+    starting_car_location = header[4][0]
+    weights = parse_adjacency_block(lines[5:])
+    return num_of_locations, num_houses, list_of_locations, list_of_houses, starting_car_location, weights
+
+
+def format_weight(weight):
+    if weight != weight:
+        return NO_EDGE
+    if float(weight).is_integer():
+        return str(int(weight))
+    return repr(float(weight))
+
+
+def format_row(row):
+    """
+    Formats a row of a float array with NaN for 'x', formatting each distinct
+    weight once; rows of large inputs hold few distinct weights.
+    """
+    values, inverse = np.unique(row, return_inverse=True)
+    names = np.array([format_weight(w) for w in values.tolist()], dtype=object)
+    return ' '.join(names[inverse].tolist())
+
+
+def format_input(list_of_locations, list_of_houses, starting_car_location, adjacency_matrix):
+    """
+    Formats an input file. adjacency_matrix is either a list of lists of weights
+    and 'x' (written with str, as generate_inputs always did) or a float array
+    with NaN for 'x'.
+    """
+    if isinstance(adjacency_matrix, np.ndarray):
+        rows = [format_row(row) for row in adjacency_matrix]
+    else:
+        rows = [' '.join([str(w) for w in row]) for row in adjacency_matrix]
+    header = [
+        str(len(list_of_locations)),
+        str(len(list_of_houses)),
+        ' '.join([str(name) for name in list_of_locations]),
+        ' '.join([str(name) for name in list_of_houses]),
+        str(starting_car_location),
+    ]
+    return '\n'.join(header + rows)
+
+
+def write_input(input_file, list_of_locations, list_of_houses, starting_car_location, adjacency_matrix):
+    with open(input_file, 'w') as f:
+        f.write(format_input(list_of_locations, list_of_houses, starting_car_location, adjacency_matrix))
+
+
+def format_output(path, dropoff_mapping, list_locs):
+    """
+    Formats a solution given in indices as an output file in location names.
+    """
+    lines = [' '.join([list_locs[node] for node in path]), str(len(dropoff_mapping))]
+    for dropoff, homes in dropoff_mapping.items():
+        lines.append(' '.join([list_locs[dropoff]] + [list_locs[node] for node in homes]))
+    return '\n'.join(lines) + '\n'
+
+
+def write_output(output_file, path, dropoff_mapping, list_locs):
+    """
+    Atomically writes a solution given in indices to output_file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(output_file) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(format_output(path, dropoff_mapping, list_locs))
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, output_file)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
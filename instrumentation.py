@@ -0,0 +1,154 @@
+"""
+Lightweight instrumentation of a solve: seconds spent per phase, seconds per
+local search iteration, counters of the work done in the hot paths and peak
+memory, plus optional cProfile dumps.
+
+Counts and timings go to the Stats that is active in the current process (see
+collect), and are dropped at the cost of a function call and a None check
+when none is, so the solvers can call count and phase unconditionally. Stats
+are per process: work done in other processes (e.g. annealing chains) has to
+be added by the process that started them.
+
+    with collect() as stats:
+        with phase('apsp'):
+            ...
+        count('neighbors', len(neighbors))
+    write_record('stats.jsonl', dict(input_file=..., **stats.to_dict()))
+"""
+import collections
+import contextlib
+import cProfile
+import json
+import os
+import resource
+import sys
+import time
+
+_active = None
+
+
+class Stats:
+    def __init__(self):
+        """
+        Seconds per phase (summed over every time a phase runs), the duration
+        of every repetition of repeated steps, and counters.
+        """
+        self.timings = collections.defaultdict(float)
+        self.iterations = collections.defaultdict(list)
+        self.counters = collections.Counter()
+
+    def to_dict(self):
+        return {
+            'timings': dict(self.timings),
+            'iterations': {name: {'count': len(times), 'total': sum(times), 'max': max(times),
+                                  'times': times}
+                           for name, times in self.iterations.items()},
+            'counters': dict(self.counters),
+            'peak_memory_mb': peak_memory_mb(),
+        }
+
+
+def active():
+    """
+    The Stats collecting in this process, or None.
+    """
+    return _active
+
+
+@contextlib.contextmanager
+def collect():
+    """
+    Makes a new Stats active for the duration of the block and yields it, or
+    yields the active one if there already is one, so that nested solves
+    report to the outermost caller.
+    """
+    global _active
+    if _active is not None:
+        yield _active
+        return
+    _active = Stats()
+    try:
+        yield _active
+    finally:
+        _active = None
+
+
+@contextlib.contextmanager
+def phase(name):
+    """
+    Adds the seconds the block takes to the timing of phase name.
+    """
+    if _active is None:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        if _active is not None:
+            _active.timings[name] += time.time() - start
+
+
+def add_time(name, seconds):
+    if _active is not None:
+        _active.timings[name] += seconds
+
+
+def record_iteration(name, seconds):
+    """
+    Records how long one repetition of the step name (e.g. a local search
+    iteration) took.
+    """
+    if _active is not None:
+        _active.iterations[name].append(seconds)
+
+
+def count(name, n=1):
+    if _active is not None:
+        _active.counters[name] += n
+
+
+def peak_memory_mb():
+    """
+    Peak resident memory of this process so far, in megabytes. Worker
+    processes solve many inputs, so this is the largest of any input so far.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / (1 << 10)
+
+
+def profile_file(profile_directory, input_file):
+    """
+    Where the cProfile dump of an input goes, e.g. profiles/1_200.prof.
+    """
+    name = os.path.splitext(os.path.basename(input_file))[0]
+    return os.path.join(profile_directory, name + '.prof')
+
+
+@contextlib.contextmanager
+def profiled(output_file):
+    """
+    Runs the block under cProfile and writes its pstats dump to output_file,
+    or just runs it if output_file is None. Read dumps with
+    python3 -m pstats FILE, or pstats.Stats(FILE).sort_stats('cumulative').
+    """
+    if output_file is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+        profiler.dump_stats(output_file)
+
+
+def write_record(log_file, record):
+    """
+    Appends one JSON line to log_file.
+    """
+    with open(log_file, 'a') as f:
+        f.write(json.dumps(record) + '\n')
@@ -4,19 +4,77 @@ import sys
 sys.path.append('..')
 sys.path.append('../..')
 import argparse
+import csv
+import json
+import os
 import utils
+import instance_cache
 from student_utils import *
 import input_validator
+from parallel import run_tasks
+from solvers.context import InstanceContext
+from solvers.bounds import lower_bound, optimality_gap, is_optimal
+from shortest_paths import adjacency_matrix_to_weights
+
+# Bump to invalidate input validation results cached by earlier versions
+INPUT_VALIDATION_VERSION = 1
+
+REPORT_FIELDS = ['input_file', 'output_file', 'cost', 'driving_cost', 'walking_cost', 'lower_bound', 'gap',
+                 'input_error', 'error', 'elapsed']
+
+
+def validate_input_cached(input_file, cache_dir=instance_cache.CACHE_DIR):
+    """
+    input_validator.tests(input_file), remembered on disk next to the cached
+    instance. Results are keyed by the input's contents and by its file name and
+    the allowed sizes, which the name checks depend on.
+    """
+    digest = instance_cache.content_hash(input_file)
+    path = os.path.join(cache_dir, digest[:2], digest + '.validation.json')
+    key = json.dumps([INPUT_VALIDATION_VERSION, os.path.basename(input_file),
+                      input_validator.RANGE_OF_INPUT_SIZES])
+    results = instance_cache.read_json(path) or {}
+    if key not in results:
+        results[key] = input_validator.tests(input_file)
+        try:
+            instance_cache.write_json(path, results)
+        except OSError:
+            pass
+    input_message, input_error = results[key]
+    return input_message, input_error
+
+
+def load_input(input_file):
+    """
+    Parses an input file, through the instance cache when possible. The
+    adjacency matrix is an array with NaN for 'x' if the input was cached, and
+    the lists of data_parser otherwise.
+    """
+    instance = instance_cache.load_instance(input_file)
+    if instance is None:
+        return data_parser(utils.read_file(input_file))
+    return tuple(instance)
+
+
+def input_context(parsed_input):
+    """
+    The InstanceContext of an input parsed by load_input, or None if its
+    adjacency matrix is not well formed.
+    """
+    try:
+        return InstanceContext(parsed_input[2], parsed_input[3], parsed_input[4],
+                               adjacency_matrix_to_weights(parsed_input[5]))
+    except Exception:
+        return None
 
 
 def validate_output(input_file, output_file, params=[]):
     print('Processing', input_file)
 
-    input_data = utils.read_file(input_file)
     output_data = utils.read_file(output_file)
 
-    input_message, input_error = input_validator.tests(input_file)
-    cost, message = tests(input_data, output_data, params=params)
+    input_message, input_error = validate_input_cached(input_file)
+    cost, message, _ = check_output(load_input(input_file), output_data, params=params)
     message = 'Comments about input file:\n\n' + input_message + 'Comments about output file:\n\n' + message
 
     print(message)
@@ -27,7 +85,7 @@ def validate_output(input_file, output_file, params=[]):
 
 def validate_all_outputs(input_directory, output_directory, params=[]):
     input_files = utils.get_files_with_extension(input_directory, '.in')
-    output_files = utils.get_files_with_extension(output_directory, '.out')
+    output_files = set(utils.get_files_with_extension(output_directory, '.out'))
 
     all_results = []
     for input_file in input_files:
@@ -43,48 +101,165 @@ def validate_all_outputs(input_directory, output_directory, params=[]):
     return all_results
 
 
+def score_output(task):
+    """
+    Scores one output without printing, for score_all_outputs.
+    Input:
+        task: (input_file, output_file, params)
+    Output:
+        a report row, see REPORT_FIELDS. cost is a number, 'infinite' for an
+        invalid output, or None if there is no output file. Outputs of inputs
+        that fail input validation (which validate_output gives no score) are
+        still scored, with input_error set and the input comments in error.
+        lower_bound is the lower bound of solvers.bounds on the cost of the
+        input and gap how far above it a finite cost is, as a fraction of cost.
+    """
+    input_file, output_file, params = task
+    row = {'input_file': input_file, 'output_file': output_file, 'cost': None,
+           'driving_cost': None, 'walking_cost': None, 'lower_bound': None, 'gap': None,
+           'input_error': None, 'error': None}
+    if not os.path.isfile(output_file):
+        row['error'] = f'No corresponding .out file for {input_file}'
+        return row
+
+    input_message, input_error = validate_input_cached(input_file)
+    row['input_error'] = input_error
+    parsed_input = load_input(input_file)
+    context = input_context(parsed_input)
+    cost, message, parts = check_output(parsed_input, utils.read_file(output_file), params=params, context=context)
+    row['cost'] = cost
+    if parts is not None:
+        row['driving_cost'], row['walking_cost'] = parts
+    if parts is not None and context is not None:
+        row['lower_bound'] = lower_bound(context)
+        row['gap'] = optimality_gap(cost, row['lower_bound'])
+    if input_error:
+        row['error'] = input_message
+    if cost == 'infinite':
+        row['error'] = (row['error'] or '') + message
+    return row
+
+
+def score_all_outputs(input_directory, output_directory, report_file=None, params=[], jobs=1):
+    """
+    Scores the output of every input in input_directory across `jobs` worker
+    processes. Each input is parsed and its shortest paths computed once, and
+    input validation results are cached by the input's contents, so rescoring
+    after another solver run only redoes the outputs.
+    If report_file is given, a report with one row per input (see REPORT_FIELDS)
+    and the total is written to it, as CSV if its name ends in .csv and as JSON
+    otherwise.
+    Output:
+        the list of report rows, and the total cost of the outputs that have a
+        finite cost
+    """
+    input_files = sorted(utils.get_files_with_extension(input_directory, '.in'))
+    tasks = [(input_file, utils.input_to_output(input_file, output_directory), params)
+             for input_file in input_files]
+
+    rows = []
+    for result in run_tasks(score_output, tasks, jobs=jobs):
+        if result.error is not None:
+            input_file, output_file, _ = result.task
+            row = {field: None for field in REPORT_FIELDS}
+            row.update(input_file=input_file, output_file=output_file, error=result.error)
+        else:
+            row = result.value
+        row['elapsed'] = result.elapsed
+        rows.append(row)
+    rows.sort(key=lambda row: row['input_file'])
+
+    scored = [row['cost'] for row in rows if row['cost'] not in (None, 'infinite')]
+    total = sum(scored)
+    print(f'Scored {len(scored)} of {len(rows)} outputs, total cost {total}')
+    if report_file is not None:
+        write_report(report_file, rows, total)
+    return rows, total
+
+
+def write_report(report_file, rows, total):
+    summary = {
+        'total_cost': total,
+        'num_outputs': len(rows),
+        'num_scored': sum(row['cost'] not in (None, 'infinite') for row in rows),
+        'num_infinite': sum(row['cost'] == 'infinite' for row in rows),
+        'num_missing': sum(not os.path.isfile(row['output_file']) for row in rows),
+        'num_failed': sum(row['cost'] is None and os.path.isfile(row['output_file']) for row in rows),
+        'num_input_errors': sum(bool(row['input_error']) for row in rows),
+        'num_optimal': sum(row['gap'] is not None and is_optimal(row['cost'], row['lower_bound']) for row in rows),
+    }
+    if report_file.endswith('.csv'):
+        with open(report_file, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+            writer.writerow({'input_file': 'TOTAL', 'cost': total})
+    else:
+        with open(report_file, 'w') as f:
+            json.dump(dict(summary, outputs=rows), f, indent=2)
+
+
 def tests(input_data, output_data, params=[]):
-    number_of_locations, number_of_houses, list_of_locations, list_of_houses, starting_location, adjacency_matrix = data_parser(input_data)
+    cost, message, _ = check_output(data_parser(input_data), output_data, params=params)
+    return cost, message
+
+
+def check_output(parsed_input, output_data, params=[], context=None):
+    """
+    The checks of tests, on an input parsed by data_parser or load_input, using
+    dictionary and set lookups. context is an optional InstanceContext of the
+    input, built here if it is needed and not given.
+    Output:
+        cost and message as returned by tests, and the (driving, walking) costs
+        if the output is valid, None otherwise
+    """
+    number_of_locations, number_of_houses, list_of_locations, list_of_houses, starting_location, adjacency_matrix = parsed_input
     try:
-        G, message = adjacency_matrix_to_graph(adjacency_matrix)
+        weights = adjacency_matrix_to_weights(adjacency_matrix)
     except Exception:
-        return 'Your adjacency matrix is not well formed.\n', 'infinite'
+        return 'Your adjacency matrix is not well formed.\n', 'infinite', None
+    location_index = {}
+    for i, name in enumerate(list_of_locations):
+        location_index.setdefault(name, i)
+    houses = set(list_of_houses)
     message = ''
     cost = -1
     car_cycle = output_data[0]
+    cycle_locations = set(car_cycle)
     num_dropoffs = int(output_data[1][0])
     if len(output_data) - 2 != num_dropoffs:
         message += f'Number of dropoffs in output ({len(output_data) - 2}) does not match number stated ({num_dropoffs}).\n'
         cost = 'infinite'
-        return cost, message
-    targets = []
+        return cost, message, None
+    targets = set()
     dropoffs = {}
     for i in range(num_dropoffs):
         dropoff = output_data[i + 2]
-        if dropoff[0] not in list_of_locations:
+        if dropoff[0] not in location_index:
             message += 'At least one dropoff location is not an actual location.\n'
             cost = 'infinite'
-        if dropoff[0] not in car_cycle:
+        if dropoff[0] not in cycle_locations:
             message += 'At least one dropoff location is not in the path of the car.\n'
             cost = 'infinite'
-        dropoff_index = list_of_locations.index(dropoff[0])
-        if list_of_locations.index(dropoff[0]) in dropoffs.keys():
+        # Raises the same ValueError as before for a dropoff that is not a location
+        dropoff_index = location_index[dropoff[0]] if dropoff[0] in location_index else list_of_locations.index(dropoff[0])
+        if dropoff_index in dropoffs:
             message += 'You have multiple dropoffs with the same location. Please compress them so that there is one dropoff'
             cost = 'infinite'
-        dropoffs[dropoff_index] = convert_locations_to_indices(dropoff[1:], list_of_locations)
+        dropoffs[dropoff_index] = [location_index.get(name) for name in dropoff[1:]]
         if len(dropoff) == 1:
             message += 'One dropoff location has nobody getting off; it should not be included in the list of dropoffs.\n'
             cost = 'infinite'
         for target in dropoff[1:]:
-            if target not in list_of_houses:
+            if target not in houses:
                 message += 'One of the targets is not a house.\n'
                 cost = 'infinite'
             if target in targets:
                 message += 'One of the targets got off at multiple dropoffs'
                 cost = 'infinite'
-            targets.append(target)
+            targets.add(target)
 
-    if any(target not in list_of_locations for target in targets):
+    if any(target not in location_index for target in targets):
         message += 'At least one of the targets is not a valid location.\n'
         cost = 'infinite'
 
@@ -96,29 +271,39 @@ def tests(input_data, output_data, params=[]):
         message += "Your car must start at the specified starting location.\n"
         cost = 'infinite'
 
-    car_cycle = convert_locations_to_indices(car_cycle, list_of_locations)
+    car_cycle = [location_index.get(name) for name in car_cycle]
 
     if (car_cycle[0] != car_cycle[-1]):
         message += "Your car must start and end at the same location.\n"
         cost = 'infinite'
 
+    parts = None
     if cost != 'infinite':
-        cost, solution_message = cost_of_solution(G, car_cycle, dropoffs)
+        if context is None:
+            context = InstanceContext(list_of_locations, list_of_houses, starting_location, weights)
+        cost, solution_message = cost_of_solution(None, car_cycle, dropoffs, context=context)
+        parts = driving_and_walking_costs(None, car_cycle, dropoffs, context=context)
         message += solution_message
 
-    return cost, message
+    return cost, message, parts
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Parsing arguments')
     parser.add_argument('--all', action='store_true', help='If specified, the output validator is run on all files in the output directory. Else, it is run on just the given output file')
+    parser.add_argument('--report', type=str, default=None, help='With --all, score every output without printing comments and write a report to this file (.csv or .json)')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of worker processes to use with --report')
     parser.add_argument('input', type=str, help='The path to the input file or directory')
     parser.add_argument('output', type=str, help='The path to the output file or directory')
     parser.add_argument('params', nargs=argparse.REMAINDER, help='Extra arguments passed in')
     args = parser.parse_args()
     if args.all:
         input_directory, output_directory = args.input, args.output
-        validate_all_outputs(input_directory, output_directory, params=args.params)
+        if args.report:
+            score_all_outputs(input_directory, output_directory, report_file=args.report,
+                              params=args.params, jobs=args.jobs)
+        else:
+            validate_all_outputs(input_directory, output_directory, params=args.params)
     else:
         input_file, output_file = args.input, args.output
         validate_output(input_file, output_file, params=args.params)
@@ -0,0 +1,145 @@
+"""
+Runs a function over many tasks in worker processes, with a hard wall clock
+timeout per task. A worker that times out or dies is replaced by a fresh one,
+so one bad input cannot take down or stall the rest of a batch.
+"""
+import collections
+import multiprocessing
+import multiprocessing.connection
+import time
+import traceback
+
+TaskResult = collections.namedtuple('TaskResult', ['task', 'value', 'error', 'elapsed'])
+
+
+def run_tasks(func, tasks, jobs=1, timeout=None):
+    """
+    Calls func(task) for every task and yields a TaskResult for each one as it
+    finishes, in completion order.
+    Input:
+        func: top-level function taking a single task
+        tasks: iterable of picklable tasks
+        jobs: number of worker processes
+        timeout: wall clock seconds allowed per task, or None for no limit
+    Output:
+        TaskResult(task, value, error, elapsed), where error is None on success
+        and a traceback or reason string otherwise
+    """
+    if jobs <= 1 and timeout is None:
+        yield from _run_inline(func, tasks)
+    else:
+        yield from _run_pool(func, tasks, max(jobs, 1), timeout)
+
+
+def _call(func, task):
+    start = time.time()
+    try:
+        value, error = func(task), None
+    except Exception:
+        value, error = None, traceback.format_exc()
+    return value, error, time.time() - start
+
+
+def _run_inline(func, tasks):
+    for task in tasks:
+        yield TaskResult(task, *_call(func, task))
+
+
+def _worker_loop(func, conn):
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        value, error, elapsed = _call(func, task)
+        try:
+            conn.send((value, error, elapsed))
+        except Exception:
+            conn.send((None, traceback.format_exc(), elapsed))
+
+
+class _Worker:
+    def __init__(self, func):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_loop,
+                                               args=(func, child_conn),
+                                               daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.task = None
+        self.started = None
+
+    def submit(self, task):
+        self.task = task
+        self.started = time.time()
+        self.conn.send(task)
+
+    def finish(self):
+        task, self.task, self.started = self.task, None, None
+        return task
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+def _run_pool(func, tasks, jobs, timeout):
+    pending = iter(tasks)
+    workers = [_Worker(func) for _ in range(jobs)]
+    exhausted = False
+    try:
+        while True:
+            for worker in workers:
+                if worker.task is None and not exhausted:
+                    task = next(pending, None)
+                    if task is None:
+                        exhausted = True
+                    else:
+                        worker.submit(task)
+
+            busy = [w for w in workers if w.task is not None]
+            if not busy:
+                break
+
+            wait_for = None
+            if timeout is not None:
+                now = time.time()
+                wait_for = max(0, min(w.started + timeout - now for w in busy))
+            ready = multiprocessing.connection.wait([w.conn for w in busy], timeout=wait_for)
+
+            for i, worker in enumerate(workers):
+                if worker.task is None:
+                    continue
+                if worker.conn in ready:
+                    try:
+                        value, error, elapsed = worker.conn.recv()
+                    except EOFError:
+                        elapsed = time.time() - worker.started
+                        worker.process.join()
+                        reason = f'Worker exited with code {worker.process.exitcode}'
+                        yield TaskResult(worker.finish(), None, reason, elapsed)
+                        worker.kill()
+                        workers[i] = _Worker(func)
+                        continue
+                    yield TaskResult(worker.finish(), value, error, elapsed)
+                elif timeout is not None and time.time() - worker.started >= timeout:
+                    elapsed = time.time() - worker.started
+                    yield TaskResult(worker.finish(), None, f'Timed out after {timeout} seconds', elapsed)
+                    worker.kill()
+                    workers[i] = _Worker(func)
+    finally:
+        for worker in workers:
+            if worker.task is not None:
+                worker.kill()
+            else:
+                worker.close()
@@ -1,32 +1,87 @@
+import collections
 import numpy as np
 import random
-from student_utils import adjacency_matrix_to_graph, is_metric
+from student_utils import adjacency_matrix_to_graph
 import matplotlib.pyplot as plt
 import networkx as nx
-import itertools
 from phase1.subgraph import Subgraph, join_subgraphs
+from shortest_paths import all_pairs_shortest_paths, graph_to_weights
+
+# Two distances closer than this are equal, as in student_utils.is_metric
+METRIC_TOLERANCE = 0.00001
+
+
+class MetricClosure:
+    def __init__(self, weights):
+        """
+        The shortest path distances of a metric graph (every edge is a shortest
+        path between its endpoints), kept up to date as edges are added so
+        that an edge breaking the metric can be rejected without recomputing
+        them.
+
+        weights: n x n float64 weight matrix, np.inf for no edge
+        """
+        self.weights = np.array(weights, dtype=np.float64)
+        self.dist, _ = all_pairs_shortest_paths(self.weights)
+
+    def try_add_edge(self, u, v, weight):
+        """
+        Adds the edge (u, v) if the graph stays metric with it, updating the
+        distances. Returns whether it was added.
+
+        The edge only shortens the paths from the vertices a that it brings
+        closer to v (d(a, u) + weight < d(a, v)) to the vertices b that it
+        brings closer to u, and an edge (a, b) stops being a shortest path only
+        if its path is one of them, so only that block of pairs is checked and
+        updated, in O(n^2) at worst.
+        """
+        if weight > self.dist[u, v] + METRIC_TOLERANCE:
+            return False
+        to_u, from_v = self.dist[u], self.dist[v]
+        rows = (to_u + weight < from_v - METRIC_TOLERANCE).nonzero()[0][:, None]
+        cols = (from_v + weight < to_u - METRIC_TOLERANCE).nonzero()[0]
+        # The edges at u and v break most often, so they are checked first
+        if (shorter_than_edges(self.weights[u, cols], weight + from_v[cols])
+                or shorter_than_edges(self.weights[rows[:, 0], v], to_u[rows[:, 0]] + weight)):
+            return False
+        through = to_u[rows] + weight + from_v[cols]
+        if shorter_than_edges(self.weights[rows, cols], through):
+            return False
+        block = np.minimum(self.dist[rows, cols], through)
+        self.dist[rows, cols] = block
+        self.dist[cols[:, None], rows.T] = block.T
+        self.weights[u, v] = self.weights[v, u] = weight
+        return True
+
+
+def shorter_than_edges(weights, paths):
+    """
+    Whether any of the paths is shorter than the edge (np.inf for none) it
+    goes between the ends of.
+    """
+    return bool(((weights > paths + METRIC_TOLERANCE) & (weights < np.inf)).any())
 
-def init_adj_matrix(num_vertices):
-    return [
-        ['x' for _ in range(num_vertices)]
-        for _ in range(num_vertices)
-    ]
 
 def create_random_graph(num_vertices, sparsity=.5):
     assert num_vertices > 1
     G = create_random_tree(num_vertices)
     num_edges = num_vertices - 1
     total_edges = (1 - sparsity) * num_vertices * (num_vertices - 1)
-    remaining_edges = [pair for pair in itertools.combinations(G.nodes(), 2)
-           if not G.has_edge(*pair) and pair[0] != pair[1]]
-    while num_edges < total_edges and remaining_edges:
-        rand_idx = random.randint(0, len(remaining_edges) - 1)
-        new_edge = remaining_edges.pop(rand_idx)
-        shortest_path = sum(nx.shortest_path(G, *new_edge))
-        weight = random.randint(1, shortest_path - 1)
-        G.add_edge(*new_edge, weight=weight)
-        if not is_metric(G):
-            G.remove_edge(*new_edge)
+    metric = MetricClosure(graph_to_weights(G, range(num_vertices)))
+    # Vertex pairs without an edge, drawn at random by swapping the drawn pair
+    # with the last of the first num_remaining and shrinking them
+    us, vs = np.triu_indices(num_vertices, 1)
+    remaining_edges = np.flatnonzero(np.isinf(metric.weights[us, vs]))
+    num_remaining = len(remaining_edges)
+    while num_edges < total_edges and num_remaining:
+        rand_idx = random.randint(0, num_remaining - 1)
+        pair = remaining_edges[rand_idx]
+        remaining_edges[rand_idx] = remaining_edges[num_remaining - 1]
+        num_remaining -= 1
+        u, v = int(us[pair]), int(vs[pair])
+        weight = random.randint(1, int(metric.dist[u, v]) - 1)
+        if metric.try_add_edge(u, v, weight):
+            G.add_edge(u, v, weight=weight)
         num_edges += 1
     sample_size = num_vertices // 4 if num_vertices //4 >= 2 else 2
     sample = np.random.choice(num_vertices, size=sample_size, replace=False)
@@ -34,9 +89,35 @@ def create_random_graph(num_vertices, sparsity=.5):
     return Subgraph(G, sample[0:len(sample)//2].tolist(), sample[len(sample)//2:].tolist())
 
 def create_random_tree(num_vertices, scale=100, offset=3):
+    """
+    The minimum spanning tree of a complete graph with random weights, the
+    same tree (with the same edge order) as nx.minimum_spanning_tree of
+    adjacency_matrix_to_graph(adj) would give, without building the complete
+    graph: the edge (u, v) with u < v weighs adj[v][u], and Kruskal's algorithm
+    breaks ties in order of (u, v).
+    """
     adj = (np.random.rand(num_vertices, num_vertices) * scale + offset).astype(np.uint32)
-    G, message = adjacency_matrix_to_graph(adj)
-    G = nx.minimum_spanning_tree(G)
+    us, vs = np.triu_indices(num_vertices, 1)
+    weights = adj[vs, us]
+    G = nx.Graph()
+    G.add_nodes_from((v, {'weight': adj[v, v]}) for v in range(num_vertices))
+    parent = list(range(num_vertices))
+
+    def find(v):
+        while parent[v] != v:
+            parent[v] = parent[parent[v]]
+            v = parent[v]
+        return v
+
+    num_edges = 0
+    for edge in np.argsort(weights, kind='stable').tolist():
+        if num_edges == num_vertices - 1:
+            break
+        root_u, root_v = find(int(us[edge])), find(int(vs[edge]))
+        if root_u != root_v:
+            parent[root_v] = root_u
+            G.add_edge(int(us[edge]), int(vs[edge]), weight=int(weights[edge]))
+            num_edges += 1
     return G
 
 def create_cycle_graph(num_vertices, scale=30):
@@ -62,15 +143,14 @@ def create_diamond_graph(num_vertices, scale=30):
     corners2 = side
     corners3 = side * 2
     corners4 = side * 3
+    metric = MetricClosure(graph_to_weights(G, range(num_vertices)))
     while corners1 + 1 != corners2 and corners3 + 1 != corners4:
         corners1 += 1
         corners3 += 1
         if random.randint(0, 1) == 1:
-            shortest_path = sum(nx.shortest_path(G, corners1, corners3))
-            weight = random.randint(1, shortest_path - 1)
-            G.add_edge(corners1, corners3, weight=weight)
-            if not is_metric(G):
-                G.remove_edge(corners1, corners3)
+            weight = random.randint(1, int(metric.dist[corners1, corners3]) - 1)
+            if metric.try_add_edge(corners1, corners3, weight):
+                G.add_edge(corners1, corners3, weight=weight)
     return Subgraph(G, [corners1], [corners3])
 
 def create_branching_graph(num_locations,
@@ -90,26 +170,27 @@ def create_branching_graph(num_locations,
     assert max_branching_factor >= 2, (
         f'Max branching factor = {max_branching_factor}, but should be >= 2')
     assert branch_prob >= 0 and branch_prob <= 1, (
-        f'Branch probability = {branch_prop}, but should be within [0, 1]')
+        f'Branch probability = {branch_prob}, but should be within [0, 1]')
 
     # TODO: Come up with random weight generation
     def get_random_weight():
         return 1
 
-    adj = init_adj_matrix(num_locations)
-    queue = [0] # 0 is the source
+    G = nx.Graph()
+    G.add_nodes_from(range(num_locations))
+    queue = collections.deque([0]) # 0 is the source
     next_vertex = 1
 
     x_pos = 0
     vertex_positions = {}
     while next_vertex < num_locations:
         for y_pos in range(len(queue)):
-            v = queue.pop(0)
+            v = queue.popleft()
             vertex_positions[v] = (x_pos, y_pos)
             if next_vertex >= num_locations:
                 break
             # Add the next vertex, regardless of branch
-            adj[v][next_vertex] = adj[next_vertex][v] = get_random_weight()
+            G.add_edge(v, next_vertex, weight=get_random_weight())
             queue.append(next_vertex)
             next_vertex += 1
             # Add extra branches with P(branch) = branch_prob
@@ -118,12 +199,11 @@ def create_branching_graph(num_locations,
                 for branch_num in range(num_branches):
                     if next_vertex >= num_locations:
                         break
-                    adj[v][next_vertex] = adj[next_vertex][v] = get_random_weight()
+                    G.add_edge(v, next_vertex, weight=get_random_weight())
                     queue.append(next_vertex)
                     next_vertex += 1
         x_pos += 1
     
-    G, message = adjacency_matrix_to_graph(adj)
     inp = [0]
     out = []
     for i in range(num_locations):
@@ -31,42 +31,72 @@ class Subgraph:
                             min(|subgraph1.output_vertices|, |subgraph.input_vertices|)
                             Sample the number of connections between [1, max_connections]
         """
-        G = subgraph1._G
-        H = subgraph2._G
-        H = nx.relabel_nodes(H, lambda x: x + len(G))
-        
-        H_input_vertices = [v + len(G) for v in subgraph2.input_vertices]
-        output_vertices = [v + len(G) for v in subgraph2.output_vertices]
-        merged_graph = nx.compose(G, H)
+        return join_subgraphs([subgraph1, subgraph2])
 
-        # Add edges between subgraph1.output_vertices and subgraph2.input_vertices
-        max_connections = min(len(subgraph1.output_vertices),
-                              len(subgraph2.input_vertices))
-        num_connections = random.randint(1, max(max_connections, 1))
-        num_edges_added = 0
 
-        max_weight_edge = max(get_weights(merged_graph)) 
-        left, right = subgraph1.output_vertices.copy(), H_input_vertices 
-
-        while num_edges_added < num_connections:
-            rand_idx_left, rand_idx_right = (
-                np.random.randint(len(left)),
-                np.random.randint(len(right)))
-            u, v = left.pop(rand_idx_left), right.pop(rand_idx_right)
-            merged_graph.add_edge(u, v, weight=max_weight_edge)
-            num_edges_added += 1
-
-        return Subgraph(
-            G=merged_graph,
-            input_vertices=subgraph1.input_vertices,
-            output_vertices=output_vertices)
- 
 def join_subgraphs(subgraphs):
+    """
+    Joins the subgraphs into a chain, as folding Subgraph.join over them
+    would: the vertices of each subgraph are renumbered after those of the
+    ones before it, and between 1 and min(|outputs of the previous one|,
+    |inputs of this one|) random edges connect the two, weighing as much as
+    the heaviest edge so far. The result has the inputs of the first subgraph
+    and the outputs of the last.
+
+    The vertices, edges and connecting edges of every subgraph are collected
+    with their new numbers, keeping a running maximum weight, and the graph is
+    built once at the end, so this takes time linear in the total size of the
+    subgraphs. Random numbers are drawn in the same order as the fold.
+    """
     assert subgraphs, 'List of subgraphs cannot be empty'
     if len(subgraphs) == 1:
         return subgraphs[0]
-    merged = subgraphs[0]
-    for i in range(1, len(subgraphs)):
-        subgraph = subgraphs[i]
-        merged = Subgraph.join(merged, subgraph)
-    return merged
+    nodes = {}
+    edges = []
+    graph_attributes = {}
+    max_weight = None
+    outputs = None
+    for subgraph in subgraphs:
+        H = subgraph._G
+        offset = len(nodes)
+        for v, data in H.nodes(data=True):
+            nodes.setdefault(v + offset, {}).update(data)
+        edges.extend((u + offset, v + offset, data) for u, v, data in H.edges(data=True))
+        graph_attributes.update(H.graph)
+        weights = get_weights(H)
+        if weights:
+            max_weight = max(weights) if max_weight is None else max(max_weight, max(weights))
+        inputs = [v + offset for v in subgraph.input_vertices]
+        if outputs is not None:
+            edges.extend(connecting_edges(outputs, inputs, max_weight))
+        outputs = [v + offset for v in subgraph.output_vertices]
+
+    merged_graph = subgraphs[0]._G.__class__()
+    merged_graph.graph.update(graph_attributes)
+    merged_graph.add_nodes_from(nodes.items())
+    merged_graph.add_edges_from(edges)
+    return Subgraph(
+        G=merged_graph,
+        input_vertices=subgraphs[0].input_vertices,
+        output_vertices=outputs)
+
+
+def connecting_edges(outputs, inputs, weight):
+    """
+    The random edges from the outputs of one subgraph to the inputs of the
+    next, all of the given weight (the heaviest edge of both and everything
+    before them).
+    """
+    max_connections = min(len(outputs), len(inputs))
+    num_connections = random.randint(1, max(max_connections, 1))
+    if weight is None:
+        raise ValueError('Cannot connect subgraphs that have no edges')
+    left, right = outputs.copy(), inputs
+    edges = []
+    while len(edges) < num_connections:
+        rand_idx_left, rand_idx_right = (
+            np.random.randint(len(left)),
+            np.random.randint(len(right)))
+        u, v = left.pop(rand_idx_left), right.pop(rand_idx_right)
+        edges.append((u, v, {'weight': weight}))
+    return edges
@@ -0,0 +1,245 @@
+"""
+Best known solution of every input, kept in a SQLite database keyed by a hash
+of the input's contents (so renaming or copying an input keeps its results).
+
+For each input the store records the cheapest valid solution found so far (its
+cost, the solver that found it, how long that run took and the route and
+dropoffs in location indices) and optionally a proven lower bound on the cost.
+A solution only replaces the stored one if it is cheaper, so a worse run can
+never overwrite a better result.
+
+Run `python3 results_store.py import [input directory] [output directory]` to
+add the outputs already on disk, and `python3 results_store.py export [input
+directory] [output directory]` to write the best known .out file of every input.
+"""
+import argparse
+import collections
+import json
+import os
+import sqlite3
+import time
+
+import instance_cache
+import instance_io
+import utils
+from output_validator import check_output, load_input
+from parallel import run_tasks
+
+DEFAULT_STORE = os.environ.get('RESULTS_STORE', 'results.sqlite')
+
+# Two costs closer than this are the same cost
+COST_TOLERANCE = 1e-9
+
+# Solver name of the solutions written while a run is still going (see
+# solver.solve_input), which the run's final solution replaces
+SNAPSHOT_SOLVER = 'snapshot'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS best_solutions (
+    input_hash TEXT PRIMARY KEY,
+    input_file TEXT,
+    cost REAL,
+    solver TEXT,
+    runtime REAL,
+    route TEXT,
+    dropoffs TEXT,
+    lower_bound REAL,
+    updated REAL
+)
+'''
+
+Result = collections.namedtuple('Result', [
+    'input_hash', 'input_file', 'cost', 'solver', 'runtime', 'route', 'dropoffs',
+    'lower_bound', 'updated'])
+
+
+def connect(path=DEFAULT_STORE):
+    """
+    Opens (creating if needed) the store at path. Several processes may use the
+    same store; writers wait for each other.
+    """
+    conn = sqlite3.connect(path, timeout=60)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(SCHEMA)
+    conn.commit()
+    return conn
+
+
+def get_result(conn, input_hash):
+    """
+    Returns the stored Result for an input hash, or None. route is a list of
+    location indices and dropoffs a dict from location index to the list of
+    home indices dropped off there; both are None if only a bound is known.
+    """
+    row = conn.execute('SELECT * FROM best_solutions WHERE input_hash = ?', (input_hash,)).fetchone()
+    if row is None:
+        return None
+    result = Result(*row)
+    if result.route is not None:
+        dropoffs = {int(loc): homes for loc, homes in json.loads(result.dropoffs).items()}
+        result = result._replace(route=json.loads(result.route), dropoffs=dropoffs)
+    return result
+
+
+def best_cost(conn, input_hash):
+    result = get_result(conn, input_hash)
+    return None if result is None else result.cost
+
+
+def beats_best(conn, input_hash, cost):
+    """
+    Whether record_result would store a solution of this cost, so that its
+    output can be written before it is recorded.
+    """
+    result = get_result(conn, input_hash)
+    if result is None or result.cost is None:
+        return True
+    if result.solver == SNAPSHOT_SOLVER:
+        return cost <= result.cost + COST_TOLERANCE
+    return cost < result.cost - COST_TOLERANCE
+
+
+def record_result(conn, input_hash, input_file, cost, solver, runtime, route, dropoffs):
+    """
+    Stores a solution if it is cheaper than the best known one for the input,
+    or if the best known one is a snapshot (SNAPSHOT_SOLVER) that costs as
+    much (see beats_best). Returns whether it was stored.
+    """
+    cursor = conn.execute('''
+        INSERT INTO best_solutions (input_hash, input_file, cost, solver, runtime, route, dropoffs, updated)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (input_hash) DO UPDATE SET
+            input_file = excluded.input_file, cost = excluded.cost, solver = excluded.solver,
+            runtime = excluded.runtime, route = excluded.route, dropoffs = excluded.dropoffs,
+            updated = excluded.updated
+        WHERE best_solutions.cost IS NULL OR excluded.cost < best_solutions.cost - ?
+            OR (best_solutions.solver = ? AND excluded.cost <= best_solutions.cost + ?)
+    ''', (input_hash, input_file, float(cost), solver, runtime, json.dumps([int(v) for v in route]),
+          json.dumps({int(loc): [int(h) for h in homes] for loc, homes in dropoffs.items()}),
+          time.time(), COST_TOLERANCE, SNAPSHOT_SOLVER, COST_TOLERANCE))
+    conn.commit()
+    return cursor.rowcount > 0
+
+
+def record_lower_bound(conn, input_hash, input_file, lower_bound):
+    """
+    Stores a proven lower bound on the cost of an input, keeping the larger one
+    if a bound is already known.
+    """
+    conn.execute('''
+        INSERT INTO best_solutions (input_hash, input_file, lower_bound, updated) VALUES (?, ?, ?, ?)
+        ON CONFLICT (input_hash) DO UPDATE SET lower_bound = excluded.lower_bound
+        WHERE best_solutions.lower_bound IS NULL OR excluded.lower_bound > best_solutions.lower_bound
+    ''', (input_hash, input_file, float(lower_bound), time.time()))
+    conn.commit()
+
+
+def is_solved(result, target=None):
+    """
+    Whether there is nothing left to gain on an input: its best known cost
+    meets the proven lower bound, or the given target cost.
+    """
+    if result is None or result.cost is None:
+        return False
+    if result.lower_bound is not None and result.cost <= result.lower_bound + COST_TOLERANCE:
+        return True
+    return target is not None and result.cost <= target + COST_TOLERANCE
+
+
+def load_targets(targets_file):
+    """
+    Reads target costs from a JSON object mapping input names (e.g. "1_200",
+    with or without the .in extension) to costs.
+    """
+    with open(targets_file) as f:
+        targets = json.load(f)
+    return {os.path.splitext(name)[0]: float(cost) for name, cost in targets.items()}
+
+
+def target_for(targets, input_file):
+    if not targets:
+        return None
+    return targets.get(os.path.splitext(os.path.basename(input_file))[0])
+
+
+def score_existing_output(task):
+    """
+    Scores an output file on disk for import_outputs.
+    Input:
+        task: (input_file, output_file)
+    Output:
+        (cost, route, dropoffs) in location indices, or None if the output is
+        invalid
+    """
+    input_file, output_file = task
+    parsed_input = load_input(input_file)
+    output_data = utils.read_file(output_file)
+    cost, _, _ = check_output(parsed_input, output_data)
+    if isinstance(cost, str):
+        return None
+    index = {}
+    for i, name in enumerate(parsed_input[2]):
+        index.setdefault(name, i)
+    route = [index[name] for name in output_data[0]]
+    dropoffs = {index[line[0]]: [index[name] for name in line[1:]] for line in output_data[2:]}
+    return cost, route, dropoffs
+
+
+def import_outputs(conn, input_files, output_directory, solver='import', jobs=1):
+    """
+    Scores the existing output of each input in output_directory and stores
+    the valid ones that beat the best known cost. Returns how many were stored.
+    """
+    tasks = [(input_file, utils.input_to_output(input_file, output_directory)) for input_file in input_files]
+    tasks = [task for task in tasks if os.path.isfile(task[1])]
+    stored = 0
+    for result in run_tasks(score_existing_output, tasks, jobs=jobs):
+        if result.error is not None or result.value is None:
+            continue
+        input_file = result.task[0]
+        cost, route, dropoffs = result.value
+        if record_result(conn, instance_cache.content_hash(input_file), input_file,
+                         cost, solver, None, route, dropoffs):
+            stored += 1
+    return stored
+
+
+def export_outputs(conn, input_files, output_directory):
+    """
+    Writes the best known solution of every input that has one as an .out file
+    in output_directory. Returns how many were written.
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    written = 0
+    for input_file in input_files:
+        result = get_result(conn, instance_cache.content_hash(input_file))
+        if result is None or result.route is None:
+            continue
+        list_locations = load_input(input_file)[2]
+        instance_io.write_output(utils.input_to_output(input_file, output_directory),
+                                 result.route, result.dropoffs, list_locations)
+        written += 1
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parsing arguments')
+    parser.add_argument('--store', type=str, default=DEFAULT_STORE, help='The path to the results store')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of worker processes to score outputs with on import')
+    parser.add_argument('command', choices=['import', 'export', 'show'], help='import scores existing outputs into the store, export writes the best known outputs, show prints the store')
+    parser.add_argument('input', type=str, help='The path to the input directory')
+    parser.add_argument('output_directory', type=str, nargs='?', default='.', help='The path to the output directory')
+    args = parser.parse_args()
+    conn = connect(args.store)
+    input_files = sorted(utils.get_files_with_extension(args.input, '.in'))
+    if args.command == 'import':
+        stored = import_outputs(conn, input_files, args.output_directory, jobs=args.jobs)
+        print(f'Stored {stored} improved solutions from {args.output_directory}')
+    elif args.command == 'export':
+        written = export_outputs(conn, input_files, args.output_directory)
+        print(f'Wrote {written} outputs to {args.output_directory}')
+    else:
+        for input_file in input_files:
+            result = get_result(conn, instance_cache.content_hash(input_file))
+            if result is not None:
+                print(input_file, result.cost, result.solver, result.runtime, result.lower_bound)
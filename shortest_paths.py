@@ -0,0 +1,205 @@
+"""
+All pairs shortest paths on dense weight matrices.
+
+Distances come back as an n x n float64 array and predecessors as an n x n int32
+array, where predecessors[i][j] is the vertex before j on a shortest path from i
+(NO_PREDECESSOR when j == i or j is unreachable). This is the same layout as the
+dict-of-dicts returned by nx.floyd_warshall_predecessor_and_distance, so
+`dist[u][v]` and `pred[u][v]` call sites keep working unchanged.
+"""
+import numpy as np
+
+import instrumentation
+
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra, floyd_warshall
+except ImportError:
+    csr_matrix = None
+
+NO_PREDECESSOR = -1
+
+# Repeated Dijkstra beats Floyd-Warshall once the graph is large and sparse
+# enough that n * E * log(n) is well below n^3.
+DIJKSTRA_MIN_VERTICES = 300
+
+
+def adjacency_matrix_to_weights(adjacency_matrix):
+    """
+    Converts an adjacency matrix from an input file ('x' for no edge), or a
+    float array with NaN for no edge, into a float64 weight matrix with np.inf
+    for no edge. The diagonal is ignored.
+    """
+    if isinstance(adjacency_matrix, np.ndarray):
+        weights = np.array(adjacency_matrix, dtype=np.float64)
+        weights[np.isnan(weights)] = np.inf
+    else:
+        weights = np.array([[np.inf if entry == 'x' else entry for entry in row]
+                            for row in adjacency_matrix], dtype=np.float64)
+    np.fill_diagonal(weights, np.inf)
+    return weights
+
+
+def graph_to_weights(G, nodelist=None):
+    """
+    Converts a networkx graph into a float64 weight matrix with np.inf for no edge,
+    with rows ordered by nodelist (defaults to the order of G.nodes).
+    """
+    if nodelist is None:
+        nodelist = list(G)
+    index = {v: i for i, v in enumerate(nodelist)}
+    weights = np.full((len(nodelist), len(nodelist)), np.inf)
+    for u, v, w in G.edges(data='weight', default=1):
+        weights[index[u], index[v]] = weights[index[v], index[u]] = w
+    np.fill_diagonal(weights, np.inf)
+    return weights
+
+
+def use_dijkstra(weights):
+    """
+    Whether repeated Dijkstra is expected to be faster than Floyd-Warshall for
+    this graph, based on its size and density.
+    """
+    n = len(weights)
+    if n < DIJKSTRA_MIN_VERTICES:
+        return False
+    average_degree = np.isfinite(weights).sum() / n
+    return average_degree * np.log2(n) < n
+
+
+def all_pairs_shortest_paths(weights):
+    """
+    Computes all pairs shortest paths of an undirected graph.
+    Input:
+        weights: n x n float64 weight matrix, np.inf where there is no edge
+    Output:
+        dist: n x n float64 matrix of shortest path distances
+        pred: n x n int32 matrix of predecessors
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    if csr_matrix is None:
+        return floyd_warshall_numpy(weights)
+
+    edges = np.isfinite(weights)
+    np.fill_diagonal(edges, False)
+    rows, cols = np.nonzero(edges)
+    graph = csr_matrix((weights[rows, cols], (rows, cols)), shape=weights.shape)
+    if use_dijkstra(weights):
+        dist, pred = dijkstra(graph, directed=False, return_predecessors=True)
+    else:
+        dist, pred = floyd_warshall(graph, directed=False, return_predecessors=True)
+    pred = pred.astype(np.int32)
+    pred[pred < 0] = NO_PREDECESSOR
+    return dist, pred
+
+
+def floyd_warshall_numpy(weights):
+    """
+    Vectorized Floyd-Warshall, relaxing every pair through vertex k in one array
+    operation. Used when scipy is not installed.
+    """
+    n = len(weights)
+    dist = np.array(weights, dtype=np.float64)
+    np.fill_diagonal(dist, 0)
+    pred = np.where(np.isfinite(dist), np.arange(n, dtype=np.int32)[:, None],
+                    NO_PREDECESSOR).astype(np.int32)
+    np.fill_diagonal(pred, NO_PREDECESSOR)
+
+    for k in range(n):
+        through_k = dist[:, k, None] + dist[None, k, :]
+        improved = through_k < dist
+        np.copyto(dist, through_k, where=improved)
+        np.copyto(pred, np.broadcast_to(pred[k], pred.shape), where=improved)
+    return dist, pred
+
+
+def reconstruct_path(source, target, predecessors):
+    """
+    Returns the shortest path from source to target as a list of vertices, or
+    [] if source == target.
+    """
+    if source == target:
+        return []
+    prev = predecessors[source]
+    curr = int(prev[target])
+    path = [target, curr]
+    while curr != source:
+        curr = int(prev[curr])
+        path.append(curr)
+    return list(reversed(path))
+
+
+class DetourOracle:
+    def __init__(self, weights, dist, pred):
+        """
+        Answers "shortest source -> target path that avoids vertex x" queries.
+
+        When the all pairs shortest path from source to target already avoids x it
+        is returned directly. Otherwise a Dijkstra run from source with x removed is
+        computed once and cached, and every later query for the same (source, x)
+        is answered from it. The graph is fixed, so answers stay valid for the
+        whole lifetime of the oracle.
+
+        weights: n x n weight matrix with np.inf for no edge
+        dist, pred: all pairs shortest path matrices for the same graph
+        """
+        self.weights = weights
+        self.dist = dist
+        self.pred = pred
+        self._trees = {}
+        self._detours = {}
+
+    def detour(self, source, target, avoid):
+        """
+        Returns the shortest path from source to target that does not go through
+        avoid, as a list of vertices, or None if there is no such path.
+        """
+        instrumentation.count('detour_queries')
+        key = (source, target, avoid)
+        if key in self._detours:
+            instrumentation.count('detour_cache_hits')
+        else:
+            self._detours[key] = self._find_detour(source, target, avoid)
+        return self._detours[key]
+
+    def _find_detour(self, source, target, avoid):
+        if source == avoid or target == avoid:
+            return None
+        if source == target:
+            return [source]
+        path = reconstruct_path(source, target, self.pred)
+        if avoid not in path:
+            return path
+
+        if (source, avoid) not in self._trees:
+            instrumentation.count('detour_dijkstra_runs')
+            self._trees[(source, avoid)] = self._dijkstra_avoiding(source, avoid)
+        dist, pred = self._trees[(source, avoid)]
+        if not np.isfinite(dist[target]):
+            return None
+        path = [target]
+        while path[-1] != source:
+            path.append(int(pred[path[-1]]))
+        return list(reversed(path))
+
+    def _dijkstra_avoiding(self, source, avoid):
+        """
+        Dense Dijkstra from source on the graph with avoid removed, one vectorized
+        relaxation per settled vertex.
+        """
+        n = len(self.weights)
+        dist = np.full(n, np.inf)
+        dist[source] = 0
+        pred = np.full(n, NO_PREDECESSOR, dtype=np.int32)
+        done = np.zeros(n, dtype=bool)
+        done[avoid] = True
+        for _ in range(n):
+            u = int(np.argmin(np.where(done, np.inf, dist)))
+            if done[u] or not np.isfinite(dist[u]):
+                break
+            done[u] = True
+            through_u = dist[u] + self.weights[u]
+            better = (through_u < dist) & ~done
+            dist[better] = through_u[better]
+            pred[better] = u
+        return dist, pred
@@ -1,14 +1,29 @@
 import os
 import sys
+import json
+import time
 sys.path.append('..')
 sys.path.append('../..')
 import argparse
 import utils
+import instance_cache
+import instance_io
+import instrumentation
+import results_store
 import networkx as nx
+import numpy as np
+from parallel import run_tasks
 from solvers.mst import mst_dfs_solve
-from solvers.flp import flp_solve
-from solvers.local_search import local_search_solve
+from solvers.flp import flp_solve_all
+from solvers.local_search import local_search_solve, REPORT_INTERVAL
 from solvers.greedy import greedy_shortest_path_solve
+from solvers.context import InstanceContext
+from solvers.evaluation import evaluate_routes
+from solvers.features import instance_features
+from solvers.bounds import lower_bound, optimality_gap, stopping_cost
+from solvers.tour import improve_route
+from solvers.annealing import anneal
+from solvers import selector
 
 from student_utils import *
 """
@@ -17,53 +32,219 @@ from student_utils import *
 ======================================================================
 """
 
+def parse_params(params):
+    """
+    Turns the extra command line arguments into a dictionary. Each argument is
+    of the form key=value (leading dashes are dropped and other dashes become
+    underscores, so --time-budget=60 sets time_budget), a bare key maps to True,
+    and a dictionary is returned as is. Recognized keys:
+        time_budget: seconds the whole solve may take before local search stops
+                     and returns its best solution so far
+        report_interval: minimum seconds between two snapshots of the best solution
+        portfolio: 'auto' (default) runs the constructive solvers the selector
+                   picks for the instance, or all of them if there is no trained
+                   selector; 'all' always runs all of them
+        top_k: number of constructive solvers the selector picks (default 2)
+        selector: selector model file (default solvers.selector.DEFAULT_MODEL)
+        portfolio_log: JSONL file to append the instance's features and the
+                       cost and runtime of every constructive solver to, for
+                       training the selector; implies portfolio=all
+        input_file: name of the input, recorded in the portfolio log
+        chains: number of annealing chains (solvers.annealing) to run in
+                parallel after local search, until the time_budget runs out
+                or for anneal_time seconds (default ANNEAL_TIME) without one;
+                0 (default) skips annealing
+        seed: seed of the first annealing chain, the others use the next ones
+        stop_gap: stop searching once the best solution is within this
+                  fraction of its cost from the lower bound of solvers.bounds
+                  (default 0, i.e. only once it is proven optimal); must
+                  be at least 0 and less than 1
+    """
+    if isinstance(params, dict):
+        return params
+    parsed = {}
+    for param in params:
+        key, sep, value = param.partition('=')
+        parsed[key.lstrip('-').replace('-', '_')] = value if sep else True
+    return parsed
+
+
+CONSTRUCTIVE_SOLVERS = ['FLP0', 'FLP1', 'FLP2', 'MST_DFS', 'GREEDY_SP']
+
+# Seconds spent annealing with chains=N when there is no time_budget
+ANNEAL_TIME = 30
+
+
+def run_constructive_solvers(names, list_of_locations, list_of_homes, starting_car_location, adjacency_matrix,
+                             context, stop_cost=None):
+    """
+    Runs the named constructive solvers (see CONSTRUCTIVE_SOLVERS). With
+    stop_cost, the cheap solvers run first and the rest are skipped once one of
+    them finds a solution costing at most stop_cost.
+    Output:
+        a list of (name, path, dropoffs) in the order of names, for the solvers
+        that ran, and a dictionary of the seconds each solver took (the FLP
+        variants share their precomputation, which is split evenly between them)
+    """
+    results, times = {}, {}
+
+    def good_enough(name):
+        if stop_cost is None:
+            return False
+        driving, walking, _ = evaluate_routes([results[name][0]], context)
+        return driving[0] + walking[0] <= stop_cost
+
+    done = False
+    for name, solver in [('MST_DFS', mst_dfs_solve), ('GREEDY_SP', greedy_shortest_path_solve)]:
+        if name in names and not done:
+            start = time.time()
+            results[name] = solver(list_of_locations, list_of_homes, starting_car_location, adjacency_matrix,
+                                   context=context)
+            times[name] = time.time() - start
+            done = good_enough(name)
+    flp_names = [name for name in names if name.startswith('FLP')]
+    if flp_names and not done:
+        start = time.time()
+        flp_results = flp_solve_all(list_of_locations, list_of_homes, starting_car_location, adjacency_matrix,
+                                    variants=[int(name[3:]) for name in flp_names], context=context)
+        results.update(zip(flp_names, flp_results))
+        times.update((name, (time.time() - start) / len(flp_names)) for name in flp_names)
+    return [(name,) + tuple(results[name]) for name in names if name in results], times
+
+
+def log_portfolio(log_file, input_file, features, costs, times):
+    """
+    Appends one line with how every constructive solver did on an instance to
+    a portfolio log, see solvers.selector.
+    """
+    entry = {'input_file': input_file, 'features': features, 'costs': costs, 'times': times}
+    with open(log_file, 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+
+
 def solve(list_of_locations,
           list_of_homes,
           starting_car_location,
           adjacency_matrix,
-          params=[]):
+          params=[],
+          on_improvement=None,
+          details=None):
     """
     Write your algorithm here.
     Input:
         list_of_locations: A list of locations such that node i of the graph corresponds to name at index i of the list
         list_of_homes: A list of homes
         starting_car_location: The name of the starting location for the car
-        adjacency_matrix: The adjacency matrix from the input file
+        adjacency_matrix: The adjacency matrix from the input file (or its array form from instance_cache)
+        params: key=value strings (or a dict), see parse_params
+        on_improvement: optional callback(path, dropoffs, cost) that local search reports its best solution to
+        details: optional dictionary, filled in with the name of the solver that produced the answer, its cost,
+                 the lower bound on the cost of the instance and the gap between the two (see solvers.bounds),
+                 and the seconds spent in each phase (timings: apsp, lower_bound, selection, one entry per
+                 constructive solver that ran, tour, local_search and annealing)
     Output:
         A list of locations representing the car path
         A dictionary mapping drop-off location to a list of homes of TAs that got off at that particular location
         NOTE: both outputs should be in terms of indices not the names of the locations themselves
     """
-    G, _ = adjacency_matrix_to_graph(adjacency_matrix)
-    mst_t, mst_d = mst_dfs_solve(list_of_locations, list_of_homes, starting_car_location, adjacency_matrix)
-    greedy_t, greedy_d = greedy_shortest_path_solve(list_of_locations, list_of_homes, starting_car_location, adjacency_matrix)
-
-    flp_t_0, flp_d_0 = flp_solve(list_of_locations,
-                                 list_of_homes,
-                                 starting_car_location,
-                                 adjacency_matrix, 0)
-    flp_t_1, flp_d_1 = flp_solve(list_of_locations,
-                                 list_of_homes,
-                                 starting_car_location,
-                                 adjacency_matrix, 1)
-    flp_t_2, flp_d_2 = flp_solve(list_of_locations,
-                                 list_of_homes,
-                                 starting_car_location,
-                                 adjacency_matrix, 2)
-    options = [
-        ('FLP0', flp_t_0, flp_d_0),
-        ('FLP1', flp_t_1, flp_d_1),
-        ('FLP2', flp_t_2, flp_d_2),
-        ('MST_DFS', mst_t, mst_d),
-        ('GREEDY_SP', greedy_t, greedy_d),
-    ]
-    solver_name, solution, dropoffs = min(options, key=lambda x: cost_of_solution(G, x[1], x[2])[0])
-    print(f'\nUsed {solver_name}\n')
-    local_t, local_d = local_search_solve(list_of_locations,
-                                          list_of_homes,
-                                          starting_car_location,
-                                          adjacency_matrix,
-                                          initial_solution=solution)
+    start = time.time()
+    params = parse_params(params)
+    deadline = None
+    if 'time_budget' in params:
+        deadline = start + float(params['time_budget'])
+    stop_gap = float(params.get('stop_gap', 0))
+    if not 0 <= stop_gap < 1:
+        raise ValueError(f'stop_gap must be at least 0 and less than 1, got {stop_gap}')
+
+    # Seconds spent in each phase of the solve
+    timings = {}
+    phase_start = time.time()
+    context = InstanceContext(list_of_locations,
+                              list_of_homes,
+                              starting_car_location,
+                              adjacency_matrix)
+    timings['apsp'] = time.time() - phase_start
+    phase_start = time.time()
+    bound = lower_bound(context)
+    stop_cost = stopping_cost(bound, stop_gap)
+    timings['lower_bound'] = time.time() - phase_start
+    names = CONSTRUCTIVE_SOLVERS
+    model_file = params.get('selector', selector.DEFAULT_MODEL)
+    portfolio_log = params.get('portfolio_log')
+    features = None
+    phase_start = time.time()
+    if portfolio_log or (params.get('portfolio', 'auto') == 'auto' and selector.load_model(model_file)):
+        features = instance_features(context)
+    if not portfolio_log and params.get('portfolio', 'auto') == 'auto':
+        names = selector.select_solvers(features, names, top_k=int(params.get('top_k', 2)), model_file=model_file)
+    timings['selection'] = time.time() - phase_start
+
+    staying_cost = float(context.dist[context.start_idx, context.home_array].sum())
+    if not portfolio_log and staying_cost <= stop_cost:
+        # Dropping everyone off at the start meets the bound
+        print(f'\nDropping everyone off at the start meets the lower bound (cost {staying_cost})\n')
+        local_t = [context.start_idx]
+        local_d = {context.start_idx: list(context.home_idxs)} if len(context.home_idxs) else {}
+        solver_name, cost = 'START', staying_cost
+    else:
+        options, times = run_constructive_solvers(names, list_of_locations, list_of_homes, starting_car_location,
+                                                  adjacency_matrix, context,
+                                                  stop_cost=None if portfolio_log else stop_cost)
+        ran = [name for name, _, _ in options]
+        timings.update(times)
+        driving, walking, _ = evaluate_routes([route for _, route, _ in options], context)
+        costs = driving + walking
+        if portfolio_log:
+            log_portfolio(portfolio_log, params.get('input_file'), features,
+                          dict(zip(ran, costs.tolist())), times)
+        # Reorder the stops of every route before picking one
+        phase_start = time.time()
+        improved = [improve_route(route, context, deadline=deadline) for _, route, _ in options]
+        timings['tour'] = time.time() - phase_start
+        costs = np.array([cost for _, _, cost in improved])
+        options = [(name, route, dropoffs) for (name, _, _), (route, dropoffs, _) in zip(options, improved)]
+        solver_name, solution, dropoffs = options[int(np.argmin(costs))]
+        print(f'\nUsed {solver_name} (ran {", ".join(ran)})\n')
+        phase_start = time.time()
+        local_t, local_d = local_search_solve(list_of_locations,
+                                              list_of_homes,
+                                              starting_car_location,
+                                              adjacency_matrix,
+                                              initial_solution=solution,
+                                              context=context,
+                                              deadline=deadline,
+                                              on_improvement=on_improvement,
+                                              report_interval=float(params.get('report_interval', REPORT_INTERVAL)),
+                                              stop_cost=stop_cost)
+        timings['local_search'] = time.time() - phase_start
+        phase_start = time.time()
+        local_t, local_d, cost = improve_route(local_t, context, deadline=deadline)
+        timings['tour'] += time.time() - phase_start
+        solver_name += '+LOCAL_SEARCH'
+        chains = int(params.get('chains', 0))
+        anneal_time = float(params.get('anneal_time', ANNEAL_TIME))
+        if deadline is not None:
+            anneal_time = deadline - time.time()
+        if chains > 0 and anneal_time > 0 and cost > stop_cost:
+            starts = [local_t] + [options[i][1] for i in np.argsort(costs, kind='stable')]
+            phase_start = time.time()
+            route, drops, anneal_cost = anneal(context, starts, anneal_time, chains=chains,
+                                               seed=int(params.get('seed', 0)), stop_cost=stop_cost,
+                                               on_improvement=on_improvement,
+                                               report_interval=float(params.get('report_interval', REPORT_INTERVAL)))
+            timings['annealing'] = time.time() - phase_start
+            if anneal_cost < cost:
+                local_t, local_d, cost = route, drops, anneal_cost
+                solver_name += '+ANNEALING'
+    print(f'Cost {cost}, lower bound {bound}, gap {optimality_gap(cost, bound):.4%}')
+    if details is not None:
+        details['solver'] = solver_name
+        details['cost'] = cost
+        details['lower_bound'] = bound
+        details['gap'] = optimality_gap(cost, bound)
+        details['timings'] = timings
+    for name, seconds in timings.items():
+        instrumentation.add_time(name, seconds)
     return local_t, local_d
 
 """
@@ -77,60 +258,238 @@ Convert solution with path and dropoff_mapping in terms of indices
 and write solution output in terms of names to path_to_file + file_number + '.out'
 """
 def convertToFile(path, dropoff_mapping, path_to_file, list_locs):
-    string = ''
-    for node in path:
-        string += list_locs[node] + ' '
-    string = string.strip()
-    string += '\n'
-
-    dropoffNumber = len(dropoff_mapping.keys())
-    string += str(dropoffNumber) + '\n'
-    for dropoff in dropoff_mapping.keys():
-        strDrop = list_locs[dropoff] + ' '
-        for node in dropoff_mapping[dropoff]:
-            strDrop += list_locs[node] + ' '
-        strDrop = strDrop.strip()
-        strDrop += '\n'
-        string += strDrop
-    utils.write_to_file(path_to_file, string)
-
-def solve_from_file(input_file, output_directory, params=[]):
-    print('Processing', input_file)
+    instance_io.write_output(path_to_file, path, dropoff_mapping, list_locs)
+
+def solve_input(input_file, params=[], output_directory=None, best_known_cost=None, details=None,
+                profile_directory=None, store=None):
+    """
+    Parses and solves a single input file, returning the car path, the dropoffs
+    and the list of location names needed to write the output. If
+    output_directory is given, the best solution so far is written there while
+    the solver runs, so the output survives the run being cut off; with
+    best_known_cost, only solutions cheaper than it are written. With store (the
+    path to a results store), a solution is only written if it beats the
+    best known one in the store, and is recorded there once its output has
+    been replaced, so a later, worse run cannot overwrite it. details is
+    passed on to solve, and also gets the instrumentation of the whole run
+    (stats, see instrumentation.Stats.to_dict). With profile_directory, the run
+    is profiled and its pstats dump written there (see instrumentation.profile_file).
+    """
+    profile = instrumentation.profile_file(profile_directory, input_file) if profile_directory else None
+    with instrumentation.collect() as stats, instrumentation.profiled(profile):
+        car_path, drop_offs, list_locations = _solve_input(input_file, params, output_directory, best_known_cost,
+                                                           details, store)
+    if details is not None:
+        details['stats'] = stats.to_dict()
+    return car_path, drop_offs, list_locations
+
+
+def _solve_input(input_file, params, output_directory, best_known_cost, details, store):
+    start = time.time()
+    with instrumentation.phase('parse'):
+        instance = instance_cache.load_instance(input_file)
+        if instance is None:
+            input_data = utils.read_file(input_file)
+            num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix = data_parser(input_data)
+        else:
+            num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix = instance
+
+    on_improvement = None
+    if output_directory is not None:
+        conn = results_store.connect(store) if store is not None else None
+        input_hash = instance_cache.content_hash(input_file) if store is not None else None
+
+        def on_improvement(path, dropoffs, cost):
+            nonlocal best_known_cost
+            if best_known_cost is not None and cost >= best_known_cost:
+                return
+            if conn is not None and not results_store.beats_best(conn, input_hash, cost):
+                return
+            write_solution(input_file, output_directory, path, dropoffs, list_locations)
+            best_known_cost = cost
+            if conn is not None:
+                results_store.record_result(conn, input_hash, input_file, cost, results_store.SNAPSHOT_SOLVER,
+                                            time.time() - start, path, dropoffs)
 
-    input_data = utils.read_file(input_file)
-    num_of_locations, num_houses, list_locations, list_houses, starting_car_location, adjacency_matrix = data_parser(input_data)
-    car_path, drop_offs = solve(list_locations, list_houses, starting_car_location, adjacency_matrix, params=params)
+    params = dict(parse_params(params), input_file=input_file)
+    car_path, drop_offs = solve(list_locations, list_houses, starting_car_location, adjacency_matrix,
+                                params=params, on_improvement=on_improvement, details=details)
+    return car_path, drop_offs, list_locations
 
-    basename, filename = os.path.split(input_file)
+
+def write_solution(input_file, output_directory, car_path, drop_offs, list_locations):
     if not os.path.exists(output_directory):
-        os.makedirs(output_directory)
+        os.makedirs(output_directory, exist_ok=True)
     output_file = utils.input_to_output(input_file, output_directory)
-
     convertToFile(car_path, drop_offs, output_file, list_locations)
 
 
-def solve_all(input_directory, output_directory, params=[]):
+def solve_from_file(input_file, output_directory, params=[], store=None, skip_solved=False, target=None,
+                    stats_file=None, profile_directory=None):
+    """
+    Solves one input and writes its output. With a results store (see
+    solve_all), the output is only written if it beats the best known solution.
+    stats_file and profile_directory are as in solve_all.
+    """
+    print('Processing', input_file)
+    if store is None:
+        start = time.time()
+        details = {}
+        car_path, drop_offs, list_locations = solve_input(input_file, params=params,
+                                                          output_directory=output_directory, details=details,
+                                                          profile_directory=profile_directory)
+        write_solution(input_file, output_directory, car_path, drop_offs, list_locations)
+        record_stats(stats_file, input_file, details, time.time() - start)
+        return
+    conn = results_store.connect(store)
+    input_hash = instance_cache.content_hash(input_file)
+    best = results_store.get_result(conn, input_hash)
+    if skip_solved and results_store.is_solved(best, target):
+        print(f'Skipping {input_file}, its best known cost {best.cost} cannot be improved on')
+        return
+    start = time.time()
+    details = {}
+    car_path, drop_offs, list_locations = solve_input(input_file, params=params, output_directory=output_directory,
+                                                      best_known_cost=best.cost if best else None, details=details,
+                                                      profile_directory=profile_directory, store=store)
+    store_solution(conn, input_hash, input_file, output_directory, car_path, drop_offs, list_locations,
+                   details, time.time() - start)
+    record_stats(stats_file, input_file, details, time.time() - start)
+
+
+def store_solution(conn, input_hash, input_file, output_directory, car_path, drop_offs, list_locations,
+                   details, runtime):
+    """
+    Records a solution and the lower bound of its input in the results store,
+    and writes its output only if it is better than the best known one. The
+    output is written before the solution is recorded, so the store never
+    holds a solution whose output was not written.
+    """
+    results_store.record_lower_bound(conn, input_hash, input_file, details['lower_bound'])
+    if results_store.beats_best(conn, input_hash, details['cost']):
+        write_solution(input_file, output_directory, car_path, drop_offs, list_locations)
+        results_store.record_result(conn, input_hash, input_file, details['cost'], details['solver'],
+                                    runtime, car_path, drop_offs)
+    else:
+        print(f'Kept the best known solution of {input_file}, the new one costs {details["cost"]}')
+
+
+def _solve_task(task):
+    input_file, output_directory, params, best_known_cost, profile_directory, store = task
+    print('Processing', input_file)
+    details = {}
+    car_path, drop_offs, list_locations = solve_input(input_file, params=params, output_directory=output_directory,
+                                                      best_known_cost=best_known_cost, details=details,
+                                                      profile_directory=profile_directory, store=store)
+    return car_path, drop_offs, list_locations, details
+
+
+def record_error(error_file, input_file, error, elapsed):
+    """
+    Appends one JSON line describing a failed input to error_file.
+    """
+    entry = {'input_file': input_file, 'error': error, 'elapsed': elapsed}
+    with open(error_file, 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+
+
+def record_stats(stats_file, input_file, details, elapsed):
+    """
+    Appends one JSON line with the instrumentation of a solved input to
+    stats_file, if there is one: its solver, cost and gap, the seconds spent in
+    each phase and in every local search iteration, the work counters and the
+    peak memory (see instrumentation.Stats.to_dict).
+    """
+    if stats_file is None:
+        return
+    entry = {'input_file': input_file, 'elapsed': elapsed,
+             'solver': details.get('solver'), 'cost': details.get('cost'), 'gap': details.get('gap')}
+    entry.update(details.get('stats', {}))
+    instrumentation.write_record(stats_file, entry)
+
+
+def solve_all(input_directory, output_directory, params=[], jobs=1, timeout=None,
+              error_file='./errors.jsonl', store=None, skip_solved=False, targets=None,
+              stats_file=None, profile_directory=None):
+    """
+    Solves every input in input_directory, spread across `jobs` worker processes.
+    Each input gets at most `timeout` seconds; failures and timeouts are recorded
+    in error_file (one JSON object per line, with the traceback and elapsed time)
+    and do not stop the rest of the run. Outputs are written by this process as
+    results come back, while the workers keep solving.
+
+    store is the path to a results store (see results_store), or None to always
+    overwrite outputs. With a store, existing outputs the store does not know
+    about yet are scored and added to it first, and an output is only written
+    when it beats the best known solution of its input. skip_solved skips
+    inputs whose best known cost meets their proven lower bound or their cost
+    in targets (a dictionary from input name to target cost).
+
+    stats_file is a JSONL file that every solved input appends its
+    instrumentation to (see record_stats), and with profile_directory every
+    input is run under cProfile and its pstats dump written there.
+    """
     input_files = utils.get_files_with_extension(input_directory, 'in')
+    conn = None
+    if store is not None:
+        conn = results_store.connect(store)
+        hashes = {input_file: instance_cache.content_hash(input_file) for input_file in input_files}
+        unknown = [input_file for input_file in input_files if results_store.get_result(conn, hashes[input_file]) is None]
+        results_store.import_outputs(conn, unknown, output_directory, solver='existing', jobs=jobs)
 
+    tasks = []
     for input_file in input_files:
-        try:
-            solve_from_file(input_file, output_directory, params=params)
-        except:
-            with open('./err.txt', 'a') as f:
-                f.write(input_file + '\n')
+        best_known_cost = None
+        if conn is not None:
+            best = results_store.get_result(conn, hashes[input_file])
+            if skip_solved and results_store.is_solved(best, results_store.target_for(targets, input_file)):
+                print(f'Skipping {input_file}, its best known cost {best.cost} cannot be improved on')
+                continue
+            best_known_cost = best.cost if best else None
+        tasks.append((input_file, output_directory, params, best_known_cost, profile_directory, store))
+
+    for result in run_tasks(_solve_task, tasks, jobs=jobs, timeout=timeout):
+        input_file = result.task[0]
+        if result.error is not None:
+            print(f'Failed on {input_file} after {result.elapsed:.1f} seconds')
+            record_error(error_file, input_file, result.error, result.elapsed)
+            continue
+        car_path, drop_offs, list_locations, details = result.value
+        if conn is None:
+            write_solution(input_file, output_directory, car_path, drop_offs, list_locations)
+        else:
+            store_solution(conn, hashes[input_file], input_file, output_directory, car_path, drop_offs,
+                           list_locations, details, result.elapsed)
+        record_stats(stats_file, input_file, details, result.elapsed)
 
 
 if __name__=="__main__":
     parser = argparse.ArgumentParser(description='Parsing arguments')
     parser.add_argument('--all', action='store_true', help='If specified, the solver is run on all files in the input directory. Else, it is run on just the given input file')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of worker processes to use with --all')
+    parser.add_argument('--timeout', type=float, default=None, help='Wall clock seconds allowed per input with --all')
+    parser.add_argument('--errors', type=str, default='./errors.jsonl', help='File that failed inputs are reported to with --all')
+    parser.add_argument('--store', type=str, default=results_store.DEFAULT_STORE, help='Results store that keeps the best known solution of every input')
+    parser.add_argument('--no-store', action='store_true', help='Always overwrite outputs instead of keeping the best known ones')
+    parser.add_argument('--skip-solved', action='store_true', help='Skip inputs whose best known cost meets their lower bound or target')
+    parser.add_argument('--targets', type=str, default=None, help='JSON file mapping input names to target costs, for --skip-solved')
+    parser.add_argument('--stats', type=str, default=None, help='JSONL file to append the timings, counters and peak memory of every solved input to')
+    parser.add_argument('--profile', type=str, default=None, help='Directory to write a cProfile dump of every input to')
     parser.add_argument('input', type=str, help='The path to the input file or directory')
     parser.add_argument('output_directory', type=str, nargs='?', default='.', help='The path to the directory where the output should be written')
     parser.add_argument('params', nargs=argparse.REMAINDER, help='Extra arguments passed in')
     args = parser.parse_args()
     output_directory = args.output_directory
+    store = None if args.no_store else args.store
+    targets = results_store.load_targets(args.targets) if args.targets else None
     if args.all:
         input_directory = args.input
-        solve_all(input_directory, output_directory, params=args.params)
+        solve_all(input_directory, output_directory, params=args.params,
+                  jobs=args.jobs, timeout=args.timeout, error_file=args.errors,
+                  store=store, skip_solved=args.skip_solved, targets=targets,
+                  stats_file=args.stats, profile_directory=args.profile)
     else:
         input_file = args.input
-        solve_from_file(input_file, output_directory, params=args.params)
+        solve_from_file(input_file, output_directory, params=args.params, store=store,
+                        skip_solved=args.skip_solved, target=results_store.target_for(targets, input_file),
+                        stats_file=args.stats, profile_directory=args.profile)
@@ -0,0 +1,238 @@
+"""
+Iterated local search with simulated annealing acceptance, run as several
+independent chains across processes that share the best solution found.
+
+Each chain repeats: kick its current solution with a few random moves of
+local_search.get_neighbors, descend with steepest descent over the same moves,
+reorder the stops (solvers.tour) and accept the new local minimum if it is
+cheaper, or with probability exp(-increase / temperature). The temperature
+falls geometrically from INITIAL_TEMPERATURE to FINAL_TEMPERATURE (as
+fractions of the starting cost) over the time budget. Kicked descents often
+fall back into a local minimum they reached before, so each chain remembers
+the result of descending every path it passed through (see settle).
+
+Chains publish improvements to a shared cost and route in shared memory. A
+chain that stays more than RESTART_GAP above the shared best for
+RESTART_PATIENCE rounds restarts from the shared best, and every chain stops
+at the deadline or once the shared best meets stop_cost.
+"""
+import multiprocessing
+import multiprocessing.connection
+import time
+
+import numpy as np
+
+import instrumentation
+from solvers.evaluation import EvaluationCache, route_key
+from solvers.local_search import IncrementalEvaluator, get_neighbors
+from solvers.tour import improve_route
+
+INITIAL_TEMPERATURE = 0.01
+FINAL_TEMPERATURE = 0.0001
+# Number of random moves in a kick
+KICK_MOVES = 3
+RESTART_GAP = 0.02
+RESTART_PATIENCE = 20
+# Seconds between two checks of the shared best by the parent process
+POLL_INTERVAL = 1
+
+
+class SharedBest:
+    def __init__(self, route, cost, capacity):
+        """
+        The best route of all chains and its cost, in shared memory. Routes
+        longer than capacity are not shared.
+        """
+        self.lock = multiprocessing.Lock()
+        self.cost = multiprocessing.Value('d', float('inf'), lock=False)
+        self.length = multiprocessing.Value('l', 0, lock=False)
+        self.route = multiprocessing.Array('l', capacity, lock=False)
+        self.offer(route, cost)
+
+    def offer(self, route, cost):
+        """
+        Stores route if it is cheaper than the shared best. Returns whether it was.
+        """
+        if cost >= self.cost.value or len(route) > len(self.route):
+            return False
+        with self.lock:
+            if cost >= self.cost.value:
+                return False
+            self.route[:len(route)] = route
+            self.length.value = len(route)
+            self.cost.value = cost
+        return True
+
+    def get(self):
+        with self.lock:
+            return list(self.route[:self.length.value]), self.cost.value
+
+
+def settle(context, path, cache, deadline=None):
+    """
+    Steepest descent over get_neighbors from path, then reordering the stops
+    of the local minimum it reaches. Every path it passes through is
+    remembered in cache (an EvaluationCache) with the result, and a later
+    descent that reaches one of them stops there. route_key gives a path and
+    its reverse the same key, and descending the reverse may end elsewhere,
+    so a cached result is a valid route with its true cost, not necessarily
+    where a fresh descent from path would end.
+    Output:
+        the final route and its cost
+    """
+    keys = []
+    evaluator = None
+    while True:
+        key = route_key(path)
+        result = cache.get(key)
+        if result is not None:
+            break
+        keys.append(key)
+        if deadline is not None and time.time() >= deadline:
+            # Cut short, so this is not where the descent ends
+            route, _, cost = improve_route(path, context, deadline=deadline)
+            return route, cost
+        if evaluator is None:
+            evaluator = IncrementalEvaluator(context, path)
+        neighbors = get_neighbors(context, path.copy())
+        costs = evaluator.costs_of(neighbors) if neighbors else []
+        best = int(np.argmin(costs)) if neighbors else None
+        if not neighbors or costs[best] >= evaluator.cost:
+            route, _, cost = improve_route(path, context, deadline=deadline)
+            result = (route, cost)
+            break
+        path = neighbors[best].path
+        evaluator = IncrementalEvaluator(context, path)
+    for key in keys:
+        cache.put(key, result)
+    return result
+
+
+def kick(context, path, rng, moves=KICK_MOVES):
+    """
+    Applies a few random get_neighbors moves to path.
+    """
+    for _ in range(moves):
+        neighbors = get_neighbors(context, path.copy())
+        if not neighbors:
+            break
+        path = neighbors[rng.integers(len(neighbors))].path
+    return path
+
+
+def run_chain(context, path, seed, start, deadline, shared, stop_cost=None):
+    """
+    One annealing chain from path, until the deadline. Returns its number of
+    rounds and restarts, its evaluation cache hits and misses, and the best
+    route it found and its cost, which the shared best may not hold if the
+    route is too long for it.
+    """
+    rng = np.random.default_rng(seed)
+    cache = EvaluationCache()
+    path, _, cost = improve_route(path, context, deadline=deadline)
+    shared.offer(path, cost)
+    best_path, best_cost = path, cost
+    initial_temperature = INITIAL_TEMPERATURE * cost
+    final_temperature = FINAL_TEMPERATURE * cost
+    rounds = restarts = behind = 0
+    while time.time() < deadline:
+        if stop_cost is not None and shared.cost.value <= stop_cost:
+            break
+        rounds += 1
+        candidate, candidate_cost = settle(context, kick(context, path, rng), cache, deadline)
+        shared.offer(candidate, candidate_cost)
+        if candidate_cost < best_cost:
+            best_path, best_cost = candidate, candidate_cost
+
+        progress = min(1.0, (time.time() - start) / max(deadline - start, 1e-9))
+        temperature = initial_temperature * (final_temperature / initial_temperature) ** progress
+        increase = candidate_cost - cost
+        if increase <= 0 or (temperature > 0 and rng.random() < np.exp(-increase / temperature)):
+            path, cost = candidate, candidate_cost
+
+        behind = behind + 1 if cost > shared.cost.value * (1 + RESTART_GAP) else 0
+        if behind >= RESTART_PATIENCE:
+            path, cost = shared.get()
+            restarts += 1
+            behind = 0
+    return rounds, restarts, cache.hits, cache.misses, best_path, best_cost
+
+
+def _chain_process(context, path, seed, start, deadline, shared, stop_cost, conn):
+    conn.send(run_chain(context, path, seed, start, deadline, shared, stop_cost))
+    conn.close()
+
+
+def anneal(context, initial_routes, time_budget, chains=1, seed=0, stop_cost=None, on_improvement=None,
+           report_interval=POLL_INTERVAL):
+    """
+    Runs chains annealing chains for time_budget seconds, in worker processes
+    when there are more than one (a single chain runs in this process if it is
+    itself a daemonic worker, which cannot start processes). Chain i starts from
+    initial_routes[i % len(initial_routes)] and is seeded with seed + i.
+    on_improvement: optional callback(path, dropoffs, cost), called by this
+                    process with the shared best at most once every
+                    report_interval seconds while it improves, when the
+                    chains run in worker processes
+    Output:
+        the best route found, its dropoffs and its cost
+    """
+    start = time.time()
+    deadline = start + time_budget
+    capacity = max(4 * len(context.weights), max(len(route) for route in initial_routes)) + 1
+    shared = SharedBest([], float('inf'), capacity)
+    if multiprocessing.current_process().daemon:
+        # Worker processes of parallel.run_tasks cannot start processes of their own
+        chains = 1
+    if chains <= 1:
+        results = [run_chain(context, initial_routes[0], seed, start, deadline, shared, stop_cost)]
+    else:
+        processes, receivers, results = [], [], []
+        for i in range(chains):
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=_chain_process, daemon=True,
+                                              args=(context, initial_routes[i % len(initial_routes)], seed + i,
+                                                    start, deadline, shared, stop_cost, sender))
+            process.start()
+            sender.close()
+            processes.append(process)
+            receivers.append(receiver)
+        reported = float('inf')
+        while receivers:
+            # Results are received as chains finish, so that none blocks sending a long route
+            for receiver in multiprocessing.connection.wait(receivers, timeout=report_interval):
+                try:
+                    results.append(receiver.recv())
+                except EOFError:
+                    # The chain died before returning
+                    pass
+                receivers.remove(receiver)
+            if on_improvement is not None and shared.cost.value < reported:
+                route, reported = shared.get()
+                route, dropoffs, cost = improve_route(route, context)
+                on_improvement(route, dropoffs, cost)
+        for process in processes:
+            process.join()
+
+    # The shared best misses routes longer than its capacity, which only the
+    # chains that found them return
+    candidates = [(cost, route) for _, _, _, _, route, cost in results]
+    route, cost = shared.get()
+    if route:
+        candidates.append((cost, route))
+    if candidates:
+        route = min(candidates, key=lambda candidate: candidate[0])[1]
+    else:
+        # Every chain failed before finding a solution
+        route = initial_routes[0]
+    route, dropoffs, cost = improve_route(route, context)
+    stats = np.array([result[:4] for result in results], dtype=np.int64).reshape(-1, 4).sum(axis=0).tolist()
+    # The chains' own counts stay in their processes, so only these are added up here
+    instrumentation.count('annealing_rounds', stats[0])
+    instrumentation.count('annealing_restarts', stats[1])
+    instrumentation.count('evaluation_cache_hits', stats[2])
+    instrumentation.count('evaluation_cache_misses', stats[3])
+    print(f'Annealing ran {chains} chains for {time.time() - start:.1f} seconds: '
+          f'{stats[0]} rounds, {stats[1]} restarts, best cost {cost} '
+          f'(evaluation cache: {stats[2]} hits, {stats[3]} misses)')
+    return route, dropoffs, cost
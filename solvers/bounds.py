@@ -0,0 +1,173 @@
+"""
+Lower bounds on the cost (2/3 of the distance driven plus the total distance
+walked) of any solution, for reporting optimality gaps and stopping early.
+lower_bound is the larger of two bounds.
+
+Radius bound. Let R be the largest distance from the start to any vertex the
+car visits. The car drives to such a vertex and back, so it drives at least 2R
+and pays at least 4R/3. Every vertex it visits lies in the ball B(R) of
+vertices within R of the start, so each home walks at least its distance to
+the closest vertex of B(R). Hence for the R of the optimal route
+
+    cost >= 4R/3 + sum over homes h of min over v in B(R) of d(h, v)
+
+and the minimum of the right hand side over every possible R (the distances
+from the start to each vertex) is a lower bound. The right hand side is never
+below the simpler 4R/3 + sum max(0, d(s, h) - R), and the bound is tight when
+staying at the start is optimal or the homes lie along one shortest path from
+the start.
+
+Moat bound. Relax the problem to a linear program: the car's closed walk
+crosses the boundary of every vertex set S without the start at least twice
+if it drops someone off inside S. A feasible solution of its dual is built the
+way Goemans and Williamson grow moats: every component of vertices that holds
+homes but not the start grows a moat around itself at a uniform rate, two
+components merge when their moats cover the edge between them, and a
+component stops growing once it reaches the start. Each unit of growth of a
+component with k homes is worth min(k, 4/3): either the car enters the moat,
+driving across it and back, or all k homes walk across it. The bound is the
+total worth of all growth; it is exact for a single home and usually far
+tighter than the radius bound when the homes are spread out.
+"""
+import heapq
+
+import numpy as np
+
+# Upper bound on the size of the homes x vertices block handled at once
+MAX_CHUNK_ELEMENTS = 1 << 22
+
+# Relative slack when comparing a cost with a bound, for floating point error
+COST_TOLERANCE = 1e-9
+
+
+def radius_bounds(context):
+    """
+    Returns the candidate radii R (distances from the start to every reachable
+    vertex, in increasing order) and the lower bound for each of them.
+    """
+    order = np.argsort(context.dist[context.start_idx], kind='stable')
+    radii = context.dist[context.start_idx, order]
+    order, radii = order[np.isfinite(radii)], radii[np.isfinite(radii)]
+
+    walking = np.zeros(len(order))
+    homes = context.home_array
+    chunk = max(1, MAX_CHUNK_ELEMENTS // max(1, len(order)))
+    for lo in range(0, len(homes), chunk):
+        # closest[h][k]: distance from home h to the closest of the k + 1
+        # vertices nearest to the start
+        closest = np.minimum.accumulate(context.dist[np.ix_(homes[lo:lo + chunk], order)], axis=1)
+        walking += closest.sum(axis=0)
+    return radii, radii * 4 / 3 + walking
+
+
+def radius_bound(context):
+    _, bounds = radius_bounds(context)
+    return float(bounds.min()) if len(bounds) else 0.0
+
+
+def moat_bound(context):
+    """
+    The moat bound, growing moats over the edges of context.G. Edges wait in a
+    heap keyed by the time their slack runs out; only the edges of the
+    components whose growth rate changes in a merge are rescheduled, so this
+    takes O(m log m) time for m edges.
+    """
+    us, vs, ws = context.G.edges()
+    n = len(context.G)
+    ends = np.concatenate([us, vs])
+    incident = np.argsort(ends, kind='stable') % len(ws)
+    incident_ptr = np.searchsorted(np.sort(ends), np.arange(n + 1))
+
+    component = np.arange(n)
+    members = [[v] for v in range(n)]
+    homes = np.bincount(context.home_array, minlength=n)
+    has_start = np.zeros(n, dtype=bool)
+    has_start[context.start_idx] = True
+    active = (homes > 0) & ~has_start
+    # grown[v]: total width of the moats around v at time stamp[v], since when
+    # it grows at rate 1 if v's component is active
+    grown = np.zeros(n)
+    stamp = np.zeros(n)
+    due = np.full(len(ws), np.inf)
+    now = 0.0
+
+    def freeze(vertices):
+        grown[vertices] += active[component[vertices]] * (now - stamp[vertices])
+        stamp[vertices] = now
+
+    def schedule(edges):
+        u, v = us[edges], vs[edges]
+        cu, cv = component[u], component[v]
+        rates = np.where(cu != cv, active[cu].astype(np.float64) + active[cv], 0)
+        slack = ws[edges] - grown[u] - grown[v] - (active[cu] * (now - stamp[u]) + active[cv] * (now - stamp[v]))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            due[edges] = np.where(rates > 0, now + np.maximum(slack, 0) / rates, np.inf)
+        return [(due[e], e) for e in edges[rates > 0].tolist()]
+
+    heap = schedule(np.arange(len(ws)))
+    heapq.heapify(heap)
+    # number of active components with one home and with several
+    singles = int(np.sum(active & (homes == 1)))
+    groups = int(np.sum(active & (homes > 1)))
+    bound = 0.0
+    while heap and singles + groups:
+        time, edge = heapq.heappop(heap)
+        a, b = component[us[edge]], component[vs[edge]]
+        if time != due[edge] or a == b:
+            continue
+        bound += (time - now) * (singles + groups * 4 / 3)
+        now = time
+        if len(members[a]) < len(members[b]):
+            a, b = b, a
+        for c in (a, b):
+            if active[c]:
+                singles -= int(homes[c] == 1)
+                groups -= int(homes[c] > 1)
+        merged_active = homes[a] + homes[b] > 0 and not (has_start[a] or has_start[b])
+        changed = [c for c in (a, b) if active[c] != merged_active]
+        changed = np.array([v for c in changed for v in members[c]], dtype=np.int64)
+        freeze(changed)
+
+        component[members[b]] = a
+        members[a].extend(members[b])
+        members[b] = []
+        homes[a] += homes[b]
+        has_start[a] |= has_start[b]
+        active[a], active[b] = merged_active, False
+        if merged_active:
+            singles += int(homes[a] == 1)
+            groups += int(homes[a] > 1)
+        if len(changed):
+            edges = np.unique(np.concatenate([incident[incident_ptr[v]:incident_ptr[v + 1]] for v in changed]))
+            for entry in schedule(edges):
+                heapq.heappush(heap, entry)
+    return float(bound)
+
+
+def lower_bound(context):
+    """
+    Lower bound on the cost of every solution of the instance.
+    """
+    return max(radius_bound(context), moat_bound(context))
+
+
+def optimality_gap(cost, bound):
+    """
+    How far cost may be above the optimum, as a fraction of cost.
+    """
+    if cost <= 0:
+        return 0.0
+    return max(0.0, (cost - bound) / cost)
+
+
+def stopping_cost(bound, gap=0.0):
+    """
+    The cost at or below which a solution is within gap (a fraction of its
+    cost) of the bound, so searching further can gain at most that much. gap
+    is at least 0 and less than 1 (solver.solve checks the stop_gap it gets).
+    """
+    return bound / (1 - gap) + COST_TOLERANCE * max(1.0, abs(bound))
+
+
+def is_optimal(cost, bound, gap=0.0):
+    return cost <= stopping_cost(bound, gap)
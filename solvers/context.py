@@ -0,0 +1,67 @@
+import numpy as np
+from csr_graph import CSRGraph
+from shortest_paths import adjacency_matrix_to_weights, all_pairs_shortest_paths, DetourOracle
+
+
+class InstanceContext:
+    def __init__(self,
+                 list_of_locations,
+                 list_of_homes,
+                 starting_car_location,
+                 adjacency_matrix):
+        """
+        Everything the solvers precompute about one input, built once per file
+        and handed to every solver instead of each one rebuilding it.
+
+        list_of_locations: names of the locations, in adjacency matrix order
+        list_of_homes: names of the TA homes
+        starting_car_location: name of the starting location for the car
+        adjacency_matrix: adjacency matrix from the input file, either as parsed
+                          by data_parser or as a float array with NaN for no edge
+        """
+        self.list_of_locations = list_of_locations
+        self.list_of_homes = list_of_homes
+        self.starting_car_location = starting_car_location
+        self.adjacency_matrix = adjacency_matrix
+
+        self.mapping = {name: i for i, name in enumerate(list_of_locations)}
+        self.start_idx = self.mapping[starting_car_location]
+        self.home_idxs = [self.mapping[h] for h in list_of_homes]
+        self.home_array = np.array(self.home_idxs, dtype=np.int64)
+
+        self.weights = adjacency_matrix_to_weights(adjacency_matrix)
+        self.G = CSRGraph.from_matrix(self.weights)
+        self.dist, self.pred = all_pairs_shortest_paths(self.weights)
+        self.detours = DetourOracle(self.weights, self.dist, self.pred)
+        self._weight_lookup = None
+
+    @property
+    def weight_lookup(self):
+        """
+        The weight of every edge as weight_lookup[u][v], one dictionary of
+        neighbors per vertex, for the pure Python loops that look up edge
+        weights many times. Non-edges are missing rather than np.inf, so it
+        takes memory linear in the number of edges. Built on first use.
+        """
+        if self._weight_lookup is None:
+            G = self.G
+            indptr, indices, weights = G.indptr.tolist(), G.indices.tolist(), G.weights.tolist()
+            self._weight_lookup = [dict(zip(indices[indptr[u]:indptr[u + 1]], weights[indptr[u]:indptr[u + 1]]))
+                                   for u in range(len(G))]
+        return self._weight_lookup
+
+
+def get_context(context,
+                list_of_locations,
+                list_of_homes,
+                starting_car_location,
+                adjacency_matrix):
+    """
+    Returns the given context, or builds one if the solver was called without it.
+    """
+    if context is None:
+        context = InstanceContext(list_of_locations,
+                                  list_of_homes,
+                                  starting_car_location,
+                                  adjacency_matrix)
+    return context
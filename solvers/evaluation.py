@@ -0,0 +1,146 @@
+"""
+Scores many candidate solutions at once with NumPy reductions.
+
+Routes are passed as lists of vertex indices (or as a K x L array padded with
+PAD), and each one is scored with the optimal dropoff assignment: every home
+walks from the closest vertex on the route.
+"""
+import collections
+import numpy as np
+
+import instrumentation
+
+PAD = -1
+
+# Upper bound on the size of the K x H x V temporary built by walking_costs.
+MAX_CHUNK_ELEMENTS = 1 << 22
+
+# Number of routes an EvaluationCache remembers
+EVALUATION_CACHE_SIZE = 200000
+
+
+def pad_index_lists(lists, pad=PAD):
+    """
+    Stacks K lists of vertex indices into a K x max_len int array, filling
+    the end of shorter rows with pad.
+    """
+    width = max([len(l) for l in lists] + [1])
+    padded = np.full((len(lists), width), pad, dtype=np.int64)
+    for k, l in enumerate(lists):
+        padded[k, :len(l)] = l
+    return padded
+
+
+def driving_costs(routes, weights):
+    """
+    Input:
+        routes: K x L array of vertex indices, padded with PAD
+        weights: V x V edge weight matrix
+    Output:
+        K driving costs, 2/3 of the total edge weight of each route
+    """
+    u, v = routes[:, :-1], routes[:, 1:]
+    valid = v != PAD
+    edge_weights = np.where(valid, weights[np.where(valid, u, 0), np.where(valid, v, 0)], 0)
+    # Like cost_of_solution, a route made of a single edge costs nothing to drive
+    edge_weights[valid.sum(axis=1) == 1] = 0
+    return edge_weights.sum(axis=1) * 2 / 3
+
+
+def visited_masks(routes, num_locations):
+    """
+    Converts K padded routes into a K x V boolean mask of visited vertices.
+    """
+    masks = np.zeros((len(routes), num_locations + 1), dtype=bool)
+    rows = np.arange(len(routes))[:, None]
+    masks[rows, np.where(routes == PAD, num_locations, routes)] = True
+    return masks[:, :num_locations]
+
+
+def walking_costs(masks, home_dists):
+    """
+    Input:
+        masks: K x V boolean matrix, masks[k][v] if route k visits v
+        home_dists: H x V matrix of shortest path distances from each home
+    Output:
+        K walking costs, and a K x H matrix with the vertex each home is
+        dropped off at
+    """
+    num_routes = len(masks)
+    num_homes, num_locations = home_dists.shape
+    walking = np.zeros(num_routes)
+    assignment = np.zeros((num_routes, num_homes), dtype=np.int64)
+    chunk = max(1, MAX_CHUNK_ELEMENTS // max(1, num_homes * num_locations))
+    for lo in range(0, num_routes, chunk):
+        hi = min(lo + chunk, num_routes)
+        candidates = np.where(masks[lo:hi, None, :], home_dists[None, :, :], np.inf)
+        assignment[lo:hi] = np.argmin(candidates, axis=2)
+        walking[lo:hi] = np.take_along_axis(candidates, assignment[lo:hi, :, None], axis=2).sum(axis=(1, 2))
+    return walking, assignment
+
+
+def evaluate_routes(routes, context):
+    """
+    Scores K routes on one instance.
+    Input:
+        routes: list of K routes, each a list of vertex indices
+        context: solvers.context.InstanceContext of the instance
+    Output:
+        K driving costs, K walking costs, and the K x H optimal dropoff
+        assignment (column j is for home context.home_idxs[j])
+    """
+    instrumentation.count('route_evaluations', len(routes))
+    padded = pad_index_lists(routes)
+    driving = driving_costs(padded, context.weights)
+    masks = visited_masks(padded, len(context.weights))
+    walking, assignment = walking_costs(masks, context.dist[context.home_array])
+    return driving, walking, assignment
+
+
+def assignment_to_dropoffs(assignment, home_idxs):
+    """
+    Converts one row of an assignment matrix into a dropoff dictionary.
+    """
+    dropoffs = collections.defaultdict(list)
+    for h, loc in zip(home_idxs, assignment.tolist()):
+        dropoffs[loc].append(h)
+    return dict(dropoffs)
+
+
+def route_key(route):
+    """
+    A 64 bit hash of a route that is the same for the route driven backwards,
+    which costs the same.
+    """
+    route = tuple(route)
+    return hash(min(route, route[::-1]))
+
+
+class EvaluationCache:
+    def __init__(self, maxsize=EVALUATION_CACHE_SIZE):
+        """
+        Results computed for routes, keyed by route_key and dropped least
+        recently used first once there are maxsize of them, with hit and miss
+        counts.
+        """
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Returns the result stored for key, or None.
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
@@ -0,0 +1,96 @@
+"""
+Cheap numeric features of an instance, for picking which solvers to run.
+
+Every feature is computed from arrays the InstanceContext already holds, in
+O(n^2) array operations at most, so extracting them costs far less than
+running any of the constructive solvers.
+"""
+import numpy as np
+
+FEATURE_NAMES = [
+    'num_locations',
+    'num_homes',
+    'home_ratio',
+    'density',
+    'mean_degree',
+    'degree_std',
+    'max_degree',
+    'leaf_fraction',
+    'degree_two_fraction',
+    'cycles_per_vertex',
+    'mst_weight_fraction',
+    'unit_weight_fraction',
+    'weight_cv',
+    'home_spread',
+    'home_clustering',
+    'start_centrality',
+]
+
+
+def instance_features(context):
+    """
+    Returns a dictionary with a value for every name in FEATURE_NAMES:
+        size: num_locations, num_homes, home_ratio
+        degrees: density, mean_degree, degree_std, max_degree
+        structure: leaf_fraction and degree_two_fraction tell the branching
+            (tree) and cycle subgraphs of phase1/generate_graphs apart,
+            and cycles_per_vertex (independent cycles per vertex, 0 for a
+            tree) and mst_weight_fraction (share of the total edge weight in a
+            minimum spanning tree, 1 for a tree) measure how tree-like the
+            graph is
+        weights: unit_weight_fraction, weight_cv
+        homes: home_spread (mean distance from the start to a home over the
+            graph's diameter), home_clustering (mean distance from a home to
+            the closest other home over the mean distance from the start) and
+            start_centrality (the start's mean distance to every vertex over
+            the mean over all vertices)
+    """
+    G = context.G
+    n = len(G)
+    num_homes = len(context.home_array)
+    degrees = G.degrees().astype(np.float64)
+    us, vs, ws = G.edges()
+    num_edges = len(ws)
+    mst_weight = G.minimum_spanning_tree().weights.sum() / 2 if n > 1 else 0.0
+    total_weight = ws.sum()
+
+    dist = context.dist
+    finite = np.isfinite(dist)
+    diameter = dist[finite].max() if finite.any() else 0.0
+    start_dists = dist[context.start_idx, context.home_array]
+    mean_start_dist = start_dists.mean() if num_homes else 0.0
+    if num_homes > 1:
+        home_dists = dist[np.ix_(context.home_array, context.home_array)].copy()
+        np.fill_diagonal(home_dists, np.inf)
+        closest_home = home_dists.min(axis=1)
+        closest_home = closest_home[np.isfinite(closest_home)]
+        mean_closest_home = closest_home.mean() if len(closest_home) else 0.0
+    else:
+        mean_closest_home = 0.0
+    mean_dists = np.where(finite, dist, 0).sum(axis=1) / max(n - 1, 1)
+
+    return {
+        'num_locations': float(n),
+        'num_homes': float(num_homes),
+        'home_ratio': num_homes / n if n else 0.0,
+        'density': 2 * num_edges / (n * (n - 1)) if n > 1 else 0.0,
+        'mean_degree': degrees.mean() if n else 0.0,
+        'degree_std': degrees.std() if n else 0.0,
+        'max_degree': degrees.max() if n else 0.0,
+        'leaf_fraction': float(np.mean(degrees == 1)) if n else 0.0,
+        'degree_two_fraction': float(np.mean(degrees == 2)) if n else 0.0,
+        'cycles_per_vertex': (num_edges - n + 1) / n if n else 0.0,
+        'mst_weight_fraction': mst_weight / total_weight if total_weight else 1.0,
+        'unit_weight_fraction': float(np.mean(ws == 1)) if num_edges else 0.0,
+        'weight_cv': ws.std() / ws.mean() if num_edges and ws.mean() else 0.0,
+        'home_spread': mean_start_dist / diameter if diameter else 0.0,
+        'home_clustering': mean_closest_home / mean_start_dist if mean_start_dist else 0.0,
+        'start_centrality': mean_dists[context.start_idx] / mean_dists.mean() if n and mean_dists.mean() else 1.0,
+    }
+
+
+def feature_vector(features):
+    """
+    The features as an array in FEATURE_NAMES order.
+    """
+    return np.array([features[name] for name in FEATURE_NAMES], dtype=np.float64)
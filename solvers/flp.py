@@ -1,102 +1,207 @@
-import networkx as nx
-from student_utils import adjacency_matrix_to_graph, is_valid_walk, cost_of_solution, convert_locations_to_indices
-from collections import defaultdict
+import heapq
+import numpy as np
+from solvers.context import get_context
+from solvers.evaluation import assignment_to_dropoffs
+from shortest_paths import reconstruct_path
+
+INF = float('inf')
+
+
+class FacilityLocation:
+    def __init__(self, context):
+        """
+        Greedy set cover over (facility, k nearest homes) pairs, shared by the three
+        flp_solve variants.
+
+        Every location f is a facility, and for every 1 <= s < |homes| the set made
+        of the s homes closest to f costs the sum of their distances to f plus 2/3
+        of the drive from the start to f. Each facility's home distances are sorted
+        once, so the cost of all its sets is one prefix sum.
+        """
+        self.context = context
+        homes = context.home_array
+        self.num_homes = len(homes)
+        self.num_sets = max(self.num_homes - 1, 0)
+        facility_dists = context.dist[:, homes]
+        # order[f] lists home positions (into homes) by distance from f
+        self.order = np.argsort(facility_dists, axis=1, kind='stable')
+        self.rank = np.argsort(self.order, axis=1)
+        sorted_dists = np.take_along_axis(facility_dists, self.order, axis=1)
+        self.prefix = np.cumsum(sorted_dists, axis=1)[:, :self.num_sets]
+        self.start_dists = context.dist[context.start_idx]
+        self.base = self.prefix + (2 / 3) * self.start_dists[:, None]
+
+    def solve(self, variant):
+        """
+        Returns the car path and dropoffs for variant 0, 1 or 2 of the greedy:
+            0: set costs never change
+            1: once a facility is opened, the drive to it is subtracted from the
+               cost of its remaining sets every round
+            2: unopened facilities cost their walking distance plus 1/4 of their
+               distance to every facility opened so far
+        """
+        return self.route_through(self.select(variant))
+
+    def select(self, variant):
+        """
+        Runs the greedy cover and returns the opened facilities in opening order.
+        The set with the smallest cost per newly covered home is picked every
+        round, ties going to the lower facility and then the smaller set, using
+        a lazily updated heap.
+        """
+        num_facilities = len(self.base)
+        start = self.context.start_idx
+        base = self.base.tolist()
+        prefix = self.prefix.tolist()
+        start_dists = self.start_dists.tolist()
+        # coverage[f][s - 1] is how many still uncovered homes set (f, s) covers
+        coverage = np.tile(np.arange(1, self.num_sets + 1), (num_facilities, 1))
+        covered = np.zeros(self.num_homes, dtype=bool)
+        num_uncovered = self.num_homes
+        remaining = num_facilities * self.num_sets
+
+        opened = []
+        is_open = [False] * num_facilities
+        # Variant 1: current cost of the remaining sets of every opened facility
+        open_costs = {}
+        open_alive = {}
+        # Variant 2: 1/4-weighted distance to the opened facilities, and its value
+        # when each facility was opened
+        opened_dists = np.zeros(num_facilities)
+        frozen_dists = {}
+
+        def cost(f, s):
+            if variant == 2 and opened:
+                if f in frozen_dists:
+                    if frozen_dists[f] is None:
+                        return base[f][s - 1]
+                    return prefix[f][s - 1] + (1 / 4) * frozen_dists[f]
+                return prefix[f][s - 1] + (1 / 4) * opened_dists[f]
+            return base[f][s - 1]
+
+        def key(f, s):
+            cov = coverage[f, s - 1]
+            return (cost(f, s) / cov if cov > 0 else INF, f, s)
+
+        def build_heap():
+            heap = [key(f, s)
+                    for f in range(num_facilities) if not (variant == 1 and is_open[f])
+                    for s in range(1, self.num_sets + 1) if (f, s) not in picked]
+            heapq.heapify(heap)
+            return heap
+
+        def peek(heap):
+            # Keys only grow, so a stale top that is still no larger than the next
+            # stale key once refreshed is the true minimum
+            while heap:
+                _, f, s = heap[0]
+                if variant == 1 and is_open[f]:
+                    heapq.heappop(heap)
+                    continue
+                fresh = key(f, s)
+                heapq.heappop(heap)
+                if not heap or fresh <= heap[0]:
+                    heapq.heappush(heap, fresh)
+                    return fresh
+                heapq.heappush(heap, fresh)
+            return None
+
+        picked = set()
+        heap = build_heap()
+        while num_uncovered and remaining:
+            best = peek(heap)
+            from_heap = True
+            if variant == 1:
+                for f in opened:
+                    alive = np.flatnonzero(open_alive[f])
+                    if not len(alive):
+                        continue
+                    cov = coverage[f, alive]
+                    ratios = np.where(cov > 0, open_costs[f][alive] / np.maximum(cov, 1), INF)
+                    i = int(np.argmin(ratios))
+                    candidate = (float(ratios[i]), f, int(alive[i]) + 1)
+                    if best is None or candidate < best:
+                        best, from_heap = candidate, False
+            _, f, s = best
+            if from_heap:
+                heapq.heappop(heap)
+            else:
+                open_alive[f][s - 1] = False
+            picked.add((f, s))
+            remaining -= 1
+
+            newly_open = not is_open[f]
+            if newly_open:
+                is_open[f] = True
+                opened.append(f)
+                if variant == 1:
+                    open_costs[f] = self.base[f].copy()
+                    open_alive[f] = np.array([(f, t) not in picked
+                                              for t in range(1, self.num_sets + 1)], dtype=bool)
+                if variant == 2:
+                    frozen_dists[f] = None if len(opened) == 1 else opened_dists[f]
+
+            for h in self.order[f, :s]:
+                if not covered[h]:
+                    covered[h] = True
+                    num_uncovered -= 1
+                    coverage -= self.rank[:, h, None] < np.arange(1, self.num_sets + 1)
+
+            if variant == 1:
+                for g in opened:
+                    open_costs[g] -= start_dists[g]
+            if variant == 2 and newly_open:
+                if f != start:
+                    opened_dists += self.context.dist[f]
+                if len(opened) == 1:
+                    # Unopened facilities drop the drive from the start from
+                    # their cost, which can lower keys, so refresh all of them
+                    heap = build_heap()
+        return opened
+
+    def route_through(self, facilities):
+        """
+        Drives from the start to the closest unvisited facility until all are
+        visited and returns to the start, then drops every home off at the
+        closest vertex on that path.
+        """
+        context = self.context
+        start = context.start_idx
+        traversal = [start]
+        to_visit = [f for f in facilities if f != start]
+        while to_visit:
+            dists = context.dist[traversal[-1], to_visit]
+            n = to_visit.pop(int(np.argmin(dists)))
+            traversal.extend(reconstruct_path(traversal[-1], n, context.pred)[1:])
+        traversal.extend(reconstruct_path(traversal[-1], start, context.pred)[1:])
+
+        closest = np.argmin(context.dist[np.ix_(context.home_array, traversal)], axis=1)
+        return traversal, assignment_to_dropoffs(np.array(traversal)[closest], context.home_idxs)
+
+
 def flp_solve(list_of_locations,
+              list_of_homes,
+              starting_car_location,
+              adjacency_matrix,
+              solve,
+              params=[],
+              context=None):
+    context = get_context(context, list_of_locations, list_of_homes,
+                          starting_car_location, adjacency_matrix)
+    return FacilityLocation(context).solve(solve)
+
+
+def flp_solve_all(list_of_locations,
                   list_of_homes,
                   starting_car_location,
                   adjacency_matrix,
-                  solve,
-                  params=[]):
-    mapping = defaultdict(int)
-    for i in range(len(list_of_locations)):
-        mapping[list_of_locations[i]] = i
-    G, _ = adjacency_matrix_to_graph(adjacency_matrix)
-    U = list_of_homes
-    facilities = list_of_locations
-    start = starting_car_location
-    paths, distances = nx.floyd_warshall_predecessor_and_distance(G, weight='weight')
-#     print(distances)
-#     print(paths)
-# print("ran all pairs")
-    # Builds set S in polynomial time as opposed to powerset (exponential)
-    def buildS():
-        res = []
-        for f in facilities:
-            for s in range(1, len(U)):
-                sorted_dist = sorted([(target, distances[mapping[f]][mapping[target]]) for target in U], key=lambda x: x[1])
-                sorted_dist = sorted_dist[:s]
-                A = set([t for t, _ in sorted_dist])
-                cost = sum([s[1] for s in sorted_dist]) + (2/3) * distances[mapping[start]][mapping[f]]
-                elem = {'facility': f, 
-                        'A': A, 
-                        'count': s, 
-                        'cost': cost
-                       } # facility, dictionary to see which elements are present, num elements, cost
-                res.append(elem)
-        return res
-    S = buildS()
-   # print("Built S")
-    uncovered = set(U)
-    lst = [(s['cost']/s['count'], hash(s['facility'] + str(s['count'])), s) for s in S]
-    result = set([])
-    dropoff_mapping = defaultdict(list)
-    while uncovered and lst:
-        smallest = min(lst, key = lambda x: x[0])
-        lst.remove(smallest)
-        smallest = smallest[2]
-        result.add(smallest['facility'])
-        dropoff_mapping[smallest['facility']] = list(smallest['A'])
-        uncovered = uncovered.difference(smallest['A'])
-        new_lst = []
-        for _, h, elem in lst:
-            if solve == 1:
-                if elem['facility'] in result:
-                    elem['cost'] -= distances[mapping[start]][mapping[elem['facility']]]
-            if solve == 2:
-                if elem['facility'] not in result:
-                    elem['cost'] = sum([distances[mapping[s]][mapping[elem['facility']]] for s in elem['A']]) + (1/4) * sum([distances[mapping[r]][mapping[elem['facility']]] for r in result if r != start])
-            intersect = len(elem['A'].intersection(uncovered))
-            new_cost = float('inf')
-            if intersect > 0:
-                new_cost = elem['cost']/intersect
-            new_lst.append((new_cost, h, elem))
-        lst = new_lst
-   # print("computed dropoffs")
-    #finding path between all
-    traversal = [mapping[start]]
-    dists = [(distances[traversal[-1]][mapping[r]], mapping[r]) for r in list(result) if r != start]
-    dropoffs = [mapping[start]] if start in result else []
-   # print("computing traversal")
-    def reconstruct_path(source, target, predecessors):
-        if source == target:
-            return []
-        prev = predecessors[source]
-        curr = prev[target]
-        path = [target, curr]
-        while curr != source:
-            curr = prev[curr]
-            path.append(curr)
-        return list(reversed(path))
-        
-    while dists:
-        n = min(dists, key= lambda x: x[0])
-        dists.remove(n)
-        n = n[1]
-        dropoffs.append(n)
-        traversal.extend(reconstruct_path(traversal[-1], n, paths)[1:])
-        dists = [(distances[traversal[-1]][r], r) for _, r in dists]
-    traversal.extend(reconstruct_path(traversal[-1], mapping[start], paths)[1:]) 
-   # print("done")
-#     dropoffs_dict = {key: dropoff_mapping[key] for key in dropoff_mapping}
-    dropoffs_dict = defaultdict(list)
-    for h in convert_locations_to_indices(list_of_homes, list_of_locations):
-        minValue = float('inf')
-        minVertex = mapping[start]
-        for i in traversal:
-            if distances[h][i] < minValue:
-                minValue = distances[h][i]
-                minVertex = i
-        dropoffs_dict[minVertex].append(h)
-    dropoffs_dict = {key: dropoffs_dict[key] for key in dropoffs_dict}
-    return traversal, dropoffs_dict
-
+                  variants=(0, 1, 2),
+                  params=[],
+                  context=None):
+    """
+    Solves every requested variant from one shared precomputation.
+    """
+    context = get_context(context, list_of_locations, list_of_homes,
+                          starting_car_location, adjacency_matrix)
+    flp = FacilityLocation(context)
+    return [flp.solve(variant) for variant in variants]
@@ -10,13 +10,200 @@ from student_utils import adjacency_matrix_to_graph
 import collections
 
 from student_utils import cost_of_solution
-from itertools import islice
 import time
 
+import instrumentation
 from solvers.mst import mst_dfs_solve
+from solvers.context import get_context
+from solvers.evaluation import pad_index_lists, assignment_to_dropoffs
+
+# Minimum number of seconds between two on_improvement snapshots
+REPORT_INTERVAL = 10
+
+
+# A candidate move: the new path, the change in total edge weight driven, and the
+# change in how many times each vertex appears on the path.
+Neighbor = collections.namedtuple('Neighbor', ['path', 'drive_delta', 'count_delta'])
+
+
+def path_weight(weights, path):
+    return sum(weights[path[i]][path[i + 1]] for i in range(len(path) - 1))
+
+
+def get_neighbors(context, path):
+    """
+    Returns "1-change" neighbors, which are all paths that:
+        Either include a vertex that is not visited in path
+        Include a vertex visited in path
+        Swap a vertex that is visited with a vertex not visited
+    Each neighbor records the splices that produced it, so it can be scored
+    without walking the whole new path.
+    """
+    G = context.G
+    weights = context.weight_lookup
+    visited = set(path)
+    unvisited = set(range(len(G))) - visited
+
+    occurences = collections.Counter(path)
+
+    neighbors = []
+
+    # Exclude a vertex
+    for vertex_to_exclude in visited - {context.start_idx}:
+        new_path = path.copy()
+        drive_delta = 0
+        count_delta = collections.Counter()
+
+        for i in range(occurences[vertex_to_exclude]):
+            idx = new_path.index(vertex_to_exclude)
+            prev, nxt = new_path[idx - 1], new_path[idx + 1]
+            if prev == nxt:  # Able to skip over visiting
+                new_path.pop(idx)
+                new_path.pop(idx)
+                drive_delta -= weights[prev][vertex_to_exclude] + weights[vertex_to_exclude][nxt]
+                count_delta[vertex_to_exclude] -= 1
+                count_delta[nxt] -= 1
+            else:
+                alt_path = context.detours.detour(prev, nxt, vertex_to_exclude)
+                if alt_path is not None:
+                    new_path.pop(idx)
+                    new_path = new_path[:idx-1] + alt_path + new_path[idx+1:]
+                    drive_delta += (path_weight(weights, alt_path)
+                                    - weights[prev][vertex_to_exclude]
+                                    - weights[vertex_to_exclude][nxt])
+                    count_delta[vertex_to_exclude] -= 1
+                    count_delta.update(alt_path[1:-1])
+        if occurences[vertex_to_exclude] + count_delta[vertex_to_exclude] == 0:
+            neighbors.append(Neighbor(new_path, drive_delta, count_delta))
+
+    # Include a vertex
+    visited_array = np.array(sorted(visited))
+    for vertex_to_include in unvisited:
+        new_path = path.copy()
+
+        edge_weights = context.weights[vertex_to_include, visited_array]
+        one_away = np.isfinite(edge_weights)
+        if not one_away.any():
+            continue
+        closest_neighbor = int(visited_array[one_away][np.argmin(edge_weights[one_away])])
+        # Get the index of the closest neighbor, check if a path exists between 
+        # the vertex being added and the next vertex in the path. If so, a better
+        # detour exists than the trivial path to the new vertex and directly back.
+        closest_idx = new_path.index(closest_neighbor)
+        # Make sure that the closest_idx is not the last node, otherwise this would
+        # go out of bounds
+        if closest_idx + 1 < len(new_path) and G.has_edge(vertex_to_include, new_path[closest_idx + 1]):
+            nxt = new_path[closest_idx + 1]
+            new_path.insert(closest_idx + 1, vertex_to_include)
+            drive_delta = (weights[closest_neighbor][vertex_to_include]
+                           + weights[vertex_to_include][nxt]
+                           - weights[closest_neighbor][nxt])
+            count_delta = {vertex_to_include: 1}
+        else:
+            new_path.insert(closest_idx + 1, closest_neighbor)
+            new_path.insert(closest_idx + 1, vertex_to_include)
+            drive_delta = 2 * weights[closest_neighbor][vertex_to_include]
+            count_delta = {vertex_to_include: 1, closest_neighbor: 1}
+        neighbors.append(Neighbor(new_path, drive_delta, count_delta))
+
+    # Handle cycles
+    
+
+    # Swap a vertex (maybe add this)
+
+    instrumentation.count('neighbors', len(neighbors))
+    return neighbors
+
+
+class IncrementalEvaluator:
+    def __init__(self, context, path):
+        """
+        Scores neighbors of `path` without re-evaluating them from scratch.
+
+        For every home it keeps the nearest and second nearest vertex on the path,
+        so removing a vertex only needs to fall back to the second nearest, and
+        adding a vertex only needs one distance per home. A move then costs
+        O(H) plus the size of its splice instead of O(H * V + len(path)).
+        """
+        self.context = context
+        self.path = path
+        self.counts = collections.Counter(path)
+        self.driving = path_weight(context.weight_lookup, path)
+
+        self.home_dists = context.dist[context.home_array]
+        self.route = np.array(sorted(self.counts))
+        route_dists = self.home_dists[:, self.route]
+        num_homes = len(context.home_array)
+        order = np.argsort(route_dists, axis=1, kind='stable')[:, :2]
+        rows = np.arange(num_homes)
+        self.nearest = self.route[order[:, 0]]
+        self.nearest_dist = route_dists[rows, order[:, 0]]
+        if len(self.route) > 1:
+            self.second = self.route[order[:, 1]]
+            self.second_dist = route_dists[rows, order[:, 1]]
+        else:
+            # V is never a real vertex, so it is never removed
+            self.second = np.full(num_homes, len(context.weights))
+            self.second_dist = np.full(num_homes, np.inf)
+        self.walking = self.nearest_dist.sum()
+
+    @property
+    def cost(self):
+        return self.driving * 2 / 3 + self.walking
+
+    def dropoffs(self):
+        """
+        Returns the dictionary of all dropoffs along the path.
+        """
+        return assignment_to_dropoffs(self.nearest, self.context.home_idxs)
+
+    def split_counts(self, neighbor):
+        """
+        Returns the vertices that neighbor removes from and adds to the path.
+        """
+        removed, added = [], []
+        for v, change in neighbor.count_delta.items():
+            if change < 0 and self.counts[v] + change == 0:
+                removed.append(v)
+            elif change > 0 and self.counts[v] == 0:
+                added.append(v)
+        return removed, added
+
+    def cost_of(self, neighbor):
+        """
+        Cost of the path given by applying neighbor's splices to this path.
+        """
+        return self.costs_of([neighbor])[0]
+
+    def costs_of(self, neighbors):
+        """
+        Costs of many neighbors at once, as one set of K x H array operations.
+        """
+        instrumentation.count('neighbor_evaluations', len(neighbors))
+        num_locations = len(self.context.weights)
+        removed, added = zip(*[self.split_counts(n) for n in neighbors])
+
+        # K x (V + 1) mask of removed vertices; column V stands in for "no vertex"
+        removed_mask = np.zeros((len(neighbors), num_locations + 1), dtype=bool)
+        rows = np.arange(len(neighbors))[:, None]
+        removed_padded = pad_index_lists(removed, pad=num_locations)
+        removed_mask[rows, removed_padded] = True
+        removed_mask[:, num_locations] = False
+
+        lost_nearest = removed_mask[:, self.nearest]
+        walking = np.where(lost_nearest, self.second_dist, self.nearest_dist)
+        lost_both = lost_nearest & removed_mask[:, self.second]
+        for k, h in zip(*np.nonzero(lost_both)):
+            remaining = self.route[~removed_mask[k, self.route]]
+            walking[k, h] = self.home_dists[h, remaining].min() if len(remaining) else np.inf
+
+        home_dists = np.hstack([self.home_dists, np.full((len(self.home_dists), 1), np.inf)])
+        added_padded = pad_index_lists(added, pad=num_locations)
+        walking = np.minimum(walking, home_dists[:, added_padded].min(axis=2).T)
+
+        drive_deltas = np.array([n.drive_delta for n in neighbors])
+        return (self.driving + drive_deltas) * 2 / 3 + walking.sum(axis=1)
 
-def k_shortest_paths(G, source, target, k, weight=None):
-    return list(islice(nx.shortest_simple_paths(G, source, target, weight=weight), k))
 
 def local_search_solve(list_of_locations,
                        list_of_homes,
@@ -24,158 +211,102 @@ def local_search_solve(list_of_locations,
                        adjacency_matrix,
                        initial_solver=mst_dfs_solve,
                        initial_solution=None,
-                       params=[]):
+                       params=[],
+                       context=None,
+                       time_budget=None,
+                       deadline=None,
+                       on_improvement=None,
+                       report_interval=REPORT_INTERVAL,
+                       stop_cost=None):
+    """
+    Steepest descent over get_neighbors, starting from initial_solution (or the
+    output of initial_solver).
 
+    time_budget: seconds this search may run for, or None for no limit
+    deadline: absolute time.time() to stop at; the earlier of the two wins
+    on_improvement: optional callback(path, dropoffs, cost), called with the
+                    starting solution and then with the best solution so far at
+                    most once every report_interval seconds while it improves
+    stop_cost: stop as soon as the best cost is at most this, e.g. the
+               solvers.bounds.stopping_cost of a lower bound
+    The best solution found is returned when the search converges or runs out
+    of time.
+    """
     start = time.time()
+    if time_budget is not None:
+        budget_deadline = start + time_budget
+        deadline = budget_deadline if deadline is None else min(deadline, budget_deadline)
+    context = get_context(context, list_of_locations, list_of_homes,
+                          starting_car_location, adjacency_matrix)
     # Generate initial solution (random or greedy algorithm)
     if not initial_solution:
         current_solution, _ = initial_solver(list_of_locations,
                                              list_of_homes,
                                              starting_car_location,
                                              adjacency_matrix,
-                                             params=params)
+                                             params=params,
+                                             context=context)
     else:
         current_solution = initial_solution
 
-    G, _ = adjacency_matrix_to_graph(adjacency_matrix)
-    
-    home_idxs = [list_of_locations.index(h) for h in list_of_homes]
-    all_pairs_dists = nx.floyd_warshall(G, weight='weight')
-    
-    def get_neighbors(G, path):
-        """
-        Returns "1-change" neighbors, which are all paths that:
-            Either include a vertex that is not visited in path
-            Include a vertex visited in path
-            Swap a vertex that is visited with a vertex not visited
-        """
-        visited = set(path)
-        unvisited = set(range(len(G))) - visited
-
-        occurences = collections.Counter(path)
-
-        neighbors = []
-
-        # Exclude a vertex
-        for vertex_to_exclude in visited - {0}:
-            new_path = path.copy()
-    #         print(f'VERTEX TO EXCLUDE: {vertex_to_exclude}')
-
-            for i in range(occurences[vertex_to_exclude]):
-                idx = new_path.index(vertex_to_exclude)
-                prev, nxt = new_path[idx - 1], new_path[idx + 1]
-                if prev == nxt:  # Able to skip over visiting
-                    new_path.pop(idx)
-                    new_path.pop(idx)
-                else:
-                    two_shortest = k_shortest_paths(G, source=prev, target=nxt,
-                                                    k=2, weight='weight')
-                    for alt_path in two_shortest:
-                        if alt_path != path[idx-1:idx+2] and vertex_to_exclude not in alt_path:
-                            new_path.pop(idx)
-                            new_path = new_path[:idx-1] + alt_path + new_path[idx+1:]
-                            break
-                if vertex_to_exclude not in new_path:
-#                     print(f'REMOVING {vertex_to_exclude}: {new_path}')
-                    neighbors.append(new_path)
-        
-        # Include a vertex
-        for vertex_to_include in unvisited:
-            new_path = path.copy()
-
-            one_away = []
-            for v in visited:
-                if vertex_to_include in G.neighbors(v):
-                    one_away.append(v)
-            if not one_away:
-                continue
-    #         print(f'\nVERTEX TO INCLUDE: {vertex_to_include}')
-            closest_neighbor = min(one_away, key=lambda n: G[vertex_to_include][n]['weight'])
-            # Get the index of the closest neighbor, check if a path exists between 
-            # the vertex being added and the next vertex in the path. If so, a better
-            # detour exists than the trivial path to the new vertex and directly back.
-            closest_idx = new_path.index(closest_neighbor)
-            # Make sure that the closest_idx is not the last node, otherwise this would
-            # go out of bounds
-            if closest_idx + 1 < len(new_path) and G.has_edge(vertex_to_include, new_path[closest_idx + 1]):
-                new_path.insert(closest_idx + 1, vertex_to_include)
-            else:
-                new_path.insert(closest_idx + 1, closest_neighbor)
-                new_path.insert(closest_idx + 1, vertex_to_include)
-#             print(f'ADDING {vertex_to_include}: {new_path}')
-            neighbors.append(new_path)
-
-        # Handle cycles
-        
-    
-        # Swap a vertex (maybe add this)
-
-        return neighbors
-
-    def assign_dropoffs(G, path, home_idxs):
-        """
-        Returns the dictionary of all dropoffs along this path.
-        """
-        locations_on_path = set(path)
-        dropoffs = collections.defaultdict(list)
-    #     print(locations_on_path)
-        for h in home_idxs:
-    #         print(f'DISTANCES FOR {h}', all_pairs_dists[h])
-            closest_loc_on_path = min(locations_on_path, key=lambda loc: all_pairs_dists[h][loc])
-            dropoffs[closest_loc_on_path].append(h)
-        return dropoffs
-
-    def evaluate(G, path, home_idxs, verbose=False):
-        """
-        Assigns optimal dropoff locations for each TA, given a path that the car
-        is going to take, and calculate the total energy expended. This is the
-        metric that neighbors are going to be evaluated on.
-        """
-        dropoffs = assign_dropoffs(G, path, home_idxs)
-        cost, msg = cost_of_solution(G, path, dropoffs, shortest=all_pairs_dists)
-        if verbose:
-            print(msg)
-
-        return cost
-    
-#     print(get_neighbors(G, current_solution))
-#     print(assign_dropoffs(G, current_solution, home_idxs))
-    
     i = 0
-    current_cost = evaluate(G, current_solution, home_idxs)
+    evaluator = IncrementalEvaluator(context, current_solution)
+    current_cost = evaluator.cost
+    best_solution, best_dropoffs, best_cost = current_solution, evaluator.dropoffs(), current_cost
+    if on_improvement:
+        on_improvement(best_solution, best_dropoffs, best_cost)
+    last_report = time.time()
     
 #     epsilon = 0.1
     epsilon = 0
     epsilon_decay_factor = 0.95
-    while True:  # TODO(justinvyu): Add a timeout
+    while deadline is None or time.time() < deadline:
+        if stop_cost is not None and best_cost <= stop_cost:
+            print(f'Local search stopped after {i} iterations, its solution is close enough to the lower bound')
+            break
         start_iter = time.time()
-        neighbors = get_neighbors(G, current_solution.copy())
+        neighbors = get_neighbors(context, current_solution.copy())
+        if not neighbors:
+            break
         
         # Take a random action with epsilon probability, decaying over time
         if np.random.rand() < epsilon:
-            current_solution = neighbors[np.random.randint(len(neighbors))]
-            current_cost = evaluate(G, current_solution, home_idxs)
+            current_solution = neighbors[np.random.randint(len(neighbors))].path
+            evaluator = IncrementalEvaluator(context, current_solution)
+            current_cost = evaluator.cost
             print(f'=== Iteration #{i}, Epsilon = {epsilon} ==='
                   f'\n Picked a RANDOM neighbor, Cost = {current_cost}')
             epsilon *= epsilon_decay_factor
+            neighbors = get_neighbors(context, current_solution.copy())
+            if not neighbors:
+                break
             
         # print(f'\nSearching over {len(neighbors)} neighbors...')
-        best_neighbor = min(neighbors, key=(
-            lambda neighbor_sol: evaluate(G, neighbor_sol, home_idxs)))
-        best_cost = evaluate(G, best_neighbor, home_idxs, verbose=False)
-        if best_cost < current_cost:
-            # print(f'=== Iteration #{i}, Epsilon = {epsilon} === \n Improved Cost = {best_cost}')
-            current_solution = best_neighbor
-            current_cost = best_cost
+        costs = evaluator.costs_of(neighbors)
+        best_idx = int(np.argmin(costs))
+        if costs[best_idx] < current_cost:
+            # print(f'=== Iteration #{i}, Epsilon = {epsilon} === \n Improved Cost = {costs[best_idx]}')
+            current_solution = neighbors[best_idx].path
+            evaluator = IncrementalEvaluator(context, current_solution)
+            current_cost = evaluator.cost
         else:
-            print(f'Local search took: {time.time() - start} seconds')
-            print(f'Local search terminated with solution (cost={current_cost}): {current_solution}')
-            evaluate(G, current_solution, home_idxs, verbose=True)
-            return current_solution, assign_dropoffs(G, current_solution, home_idxs)
+            instrumentation.record_iteration('local_search', time.time() - start_iter)
+            break
+        if current_cost < best_cost:
+            best_solution, best_dropoffs, best_cost = current_solution, evaluator.dropoffs(), current_cost
+            if on_improvement and time.time() - last_report >= report_interval:
+                on_improvement(best_solution, best_dropoffs, best_cost)
+                last_report = time.time()
         i += 1
         epsilon *= epsilon_decay_factor
-        end_iter = time.time()
-        # print(f'Iteration took {end_iter - start_iter} s')
+        instrumentation.record_iteration('local_search', time.time() - start_iter)
+    else:
+        print(f'Local search stopped at its deadline after {i} iterations')
+
+    print(f'Local search took: {time.time() - start} seconds')
+    print(f'Local search terminated with solution (cost={best_cost}): {best_solution}')
+    print(cost_of_solution(context.G, best_solution, best_dropoffs, context=context)[1])
+    return best_solution, best_dropoffs
 
 if __name__ == '__main__':
     # input_path = '../phase1/100.in'
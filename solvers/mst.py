@@ -1,29 +1,24 @@
-import networkx as nx
 from student_utils import adjacency_matrix_to_graph, is_valid_walk, cost_of_solution, convert_locations_to_indices
+from solvers.context import get_context
+from csr_graph import CSRGraph
 def mst_dfs_solve(list_of_locations,
                   list_of_homes,
                   starting_car_location,
                   adjacency_matrix,
                   existing_mst=None,
-                  params=[]):
+                  params=[],
+                  context=None):
     
     if not existing_mst:
-        G, _ = adjacency_matrix_to_graph(adjacency_matrix)
-        mst = nx.minimum_spanning_tree(G)
-    else:
+        context = get_context(context, list_of_locations, list_of_homes,
+                              starting_car_location, adjacency_matrix)
+        mst = context.G.minimum_spanning_tree()
+    elif isinstance(existing_mst, CSRGraph):
         mst = existing_mst
-        
-    seen = set()
-    traversal = []
-    def dfs(u):
-        if u not in seen:
-            traversal.append(u)
-            seen.add(u)
-            for v in mst.neighbors(u):
-                if v not in seen:
-                    dfs(v)
-                    traversal.append(u)
-    dfs(list_of_locations.index(starting_car_location))
+    else:
+        mst = CSRGraph.from_networkx(existing_mst)
+
+    traversal = mst.dfs_walk(list_of_locations.index(starting_car_location))
     
     dropoffs = {
         home: [home] for home in list_of_homes 
@@ -0,0 +1,152 @@
+"""
+Picks which constructive solvers to run on an instance, from how they did on
+similar instances in our own run logs.
+
+solver.solve appends one JSON line per instance to a portfolio log when given
+portfolio_log=PATH: the instance's features (solvers.features) and the cost
+and runtime of every constructive solver. Training turns a log into a model
+file holding the standardized features of every logged instance and each
+solver's regret on it (cost over the best cost, minus 1). To select, the
+instance's k nearest logged neighbors vote: solvers are ranked by their mean
+regret over the neighbors and the best top_k are run.
+
+    python3 -m solvers.selector portfolio.jsonl solver_selector.json
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+from solvers.features import FEATURE_NAMES, feature_vector
+
+DEFAULT_MODEL = os.environ.get('SOLVER_SELECTOR', 'solver_selector.json')
+NUM_NEIGHBORS = 15
+# Below this many logged instances the selector does not trust itself
+MIN_SAMPLES = 20
+
+_models = {}
+
+
+def read_log(log_file):
+    """
+    Reads the records of a portfolio log, skipping lines that are cut off.
+    """
+    records = []
+    with open(log_file) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+def train(records, solvers=None, num_neighbors=NUM_NEIGHBORS):
+    """
+    Builds a selector model from portfolio log records. Only records that
+    have a finite cost for every solver in solvers (default: every solver in
+    the first record) are used.
+    Output:
+        the model, a JSON-serializable dictionary
+    """
+    if solvers is None:
+        solvers = sorted(records[0]['costs']) if records else []
+    features, regrets = [], []
+    for record in records:
+        costs = np.array([record['costs'].get(name, np.inf) for name in solvers], dtype=np.float64)
+        if not np.all(np.isfinite(costs)):
+            continue
+        best = costs.min()
+        features.append(feature_vector(record['features']))
+        regrets.append(costs / best - 1 if best > 0 else np.where(costs > 0, np.inf, 0.0))
+    features = np.array(features).reshape(-1, len(FEATURE_NAMES))
+    mean = features.mean(axis=0) if len(features) else np.zeros(len(FEATURE_NAMES))
+    scale = features.std(axis=0) if len(features) else np.ones(len(FEATURE_NAMES))
+    scale[scale == 0] = 1
+    return {
+        'feature_names': FEATURE_NAMES,
+        'solvers': solvers,
+        'num_neighbors': num_neighbors,
+        'mean': mean.tolist(),
+        'scale': scale.tolist(),
+        'samples': ((features - mean) / scale).tolist(),
+        'regrets': np.array(regrets).reshape(-1, len(solvers)).tolist(),
+    }
+
+
+def load_model(model_file=DEFAULT_MODEL):
+    """
+    Loads a model file once per process. Returns None if there is none, or it
+    was trained on different features or too few instances to be trusted.
+    """
+    if model_file not in _models:
+        model = None
+        if os.path.isfile(model_file):
+            with open(model_file) as f:
+                model = json.load(f)
+            if model['feature_names'] != FEATURE_NAMES or len(model['samples']) < MIN_SAMPLES:
+                model = None
+        _models[model_file] = model
+    return _models[model_file]
+
+
+def rank_solvers(model, features):
+    """
+    Returns the model's solvers from most to least promising for an instance,
+    by mean regret over its nearest logged neighbors.
+    """
+    x = (feature_vector(features) - np.array(model['mean'])) / np.array(model['scale'])
+    samples = np.array(model['samples'])
+    distances = np.linalg.norm(samples - x, axis=1)
+    nearest = np.argsort(distances, kind='stable')[:model['num_neighbors']]
+    mean_regrets = np.array(model['regrets'])[nearest].mean(axis=0)
+    return [model['solvers'][i] for i in np.argsort(mean_regrets, kind='stable')]
+
+
+def select_solvers(features, solvers, top_k=2, model_file=DEFAULT_MODEL):
+    """
+    Picks the top_k most promising of the given solvers for an instance, in the
+    order they are given. Falls back to all of them when there is no usable
+    model or it does not know some of them.
+    """
+    model = load_model(model_file)
+    if model is None or not set(solvers) <= set(model['solvers']):
+        return list(solvers)
+    chosen = [name for name in rank_solvers(model, features) if name in solvers][:top_k]
+    return [name for name in solvers if name in chosen]
+
+
+def evaluate(records, solvers, top_k=2, num_neighbors=NUM_NEIGHBORS):
+    """
+    Leave-one-out estimate of what selection costs: the mean regret of the
+    best selected solver, and how often it is the overall best.
+    """
+    model = train(records, solvers, num_neighbors)
+    samples, regrets = np.array(model['samples']), np.array(model['regrets'])
+    losses = []
+    for i in range(len(samples)):
+        distances = np.linalg.norm(samples - samples[i], axis=1)
+        distances[i] = np.inf
+        nearest = np.argsort(distances, kind='stable')[:num_neighbors]
+        chosen = np.argsort(regrets[nearest].mean(axis=0), kind='stable')[:top_k]
+        losses.append(regrets[i, chosen].min())
+    losses = np.array(losses)
+    return (float(losses.mean()) if len(losses) else 0.0,
+            float(np.mean(losses == 0)) if len(losses) else 1.0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Trains the solver selector on a portfolio log')
+    parser.add_argument('log', type=str, help='Portfolio log written by solver.py with portfolio_log=PATH')
+    parser.add_argument('model', type=str, nargs='?', default=DEFAULT_MODEL, help='Where to write the model')
+    parser.add_argument('--neighbors', type=int, default=NUM_NEIGHBORS, help='Number of neighbors that vote')
+    parser.add_argument('--top-k', type=int, default=2, help='Number of solvers picked, for the evaluation')
+    args = parser.parse_args()
+    records = read_log(args.log)
+    model = train(records, num_neighbors=args.neighbors)
+    with open(args.model, 'w') as f:
+        json.dump(model, f)
+    mean_regret, best_rate = evaluate(records, model['solvers'], args.top_k, args.neighbors)
+    print(f'Trained on {len(model["samples"])} instances. Leave-one-out with top {args.top_k}: '
+          f'mean regret {mean_regret:.4%}, best solver picked {best_rate:.1%} of the time')
@@ -0,0 +1,237 @@
+"""
+Reorders the stops of a route with 2-opt and Or-opt moves.
+
+The constructive solvers visit their stops in nearest-next order and expand
+each hop into a shortest path, and local search only adds or removes single
+vertices, so nothing ever changes the order of the stops. Here a route is
+compressed to its stops (the start and every vertex someone is dropped off
+at), the stops are reordered as a closed tour over the shortest path
+distances, and the tour is expanded back into a walk in the graph at the end.
+
+Only the stops with a closer stop among their NUM_CANDIDATES nearest are tried
+as new neighbors of a stop, and a stop whose neighborhood gave no improving
+move is not looked at again until a move changes one of its tour edges (its
+don't-look bit), so a pass costs about O(NUM_CANDIDATES) per stop plus the
+O(n) to apply each improving move.
+
+Moves must shorten the tour by more than EPSILON times its length, so
+rounding on long tours (e.g. edge weights near 1e9) cannot make two moves undo
+each other forever, and the search stops after MAX_PASSES passes' worth of
+stops or at a deadline.
+"""
+import collections
+import time
+
+import numpy as np
+
+from solvers.evaluation import assignment_to_dropoffs, evaluate_routes
+from shortest_paths import reconstruct_path
+
+NUM_CANDIDATES = 8
+# Longest run of consecutive stops that Or-opt moves elsewhere
+MAX_SEGMENT = 3
+# Smallest decrease in length, as a fraction of the tour length, that counts
+# as an improvement
+EPSILON = 1e-9
+# Most stops looked at, as a multiple of the number of stops
+MAX_PASSES = 50
+
+
+def route_stops(route, context, assignment=None):
+    """
+    Returns the start followed by every vertex of route that some home is
+    dropped off at (in the dropoff assignment of evaluate_routes, or the given
+    one), each once, in the order the route first reaches them.
+    """
+    if assignment is None:
+        _, _, assignment = evaluate_routes([route], context)
+        assignment = assignment[0]
+    dropoffs = set(np.asarray(assignment).tolist())
+    stops, seen = [context.start_idx], {context.start_idx}
+    for v in route:
+        if v in dropoffs and v not in seen:
+            stops.append(v)
+            seen.add(v)
+    return stops
+
+
+def tour_length(tour, dist):
+    """
+    Length of the closed tour visiting the vertices of tour in order.
+    """
+    if len(tour) < 2:
+        return 0.0
+    tour = np.asarray(tour)
+    return float(dist[tour, np.roll(tour, -1)].sum())
+
+
+def expand_tour(tour, context):
+    """
+    The walk in the graph that drives between consecutive stops of tour, which
+    starts at the start, along shortest paths and back to the start.
+    """
+    route = [tour[0]]
+    for v in list(tour[1:]) + [tour[0]]:
+        route.extend(reconstruct_path(route[-1], v, context.pred)[1:])
+    return route
+
+
+class TourOptimizer:
+    def __init__(self, dist, num_candidates=NUM_CANDIDATES):
+        """
+        2-opt and Or-opt over a closed tour of n stops.
+
+        dist: n x n symmetric matrix of distances between the stops
+        """
+        n = len(dist)
+        self.n = n
+        self.dist = dist.tolist()
+        order = np.argsort(dist, axis=1, kind='stable')
+        # order[i][0] is i itself
+        self.candidates = order[:, 1:num_candidates + 1].tolist()
+        self.order = list(range(n))
+        self.pos = list(range(n))
+        self.epsilon = EPSILON * max(1.0, tour_length(self.order, dist))
+
+    def succ(self, v):
+        return self.order[(self.pos[v] + 1) % self.n]
+
+    def pred(self, v):
+        return self.order[(self.pos[v] - 1) % self.n]
+
+    def reverse(self, i, j):
+        """
+        Reverses the stops from position i forward to position j (cyclically),
+        or the rest of the tour if that is shorter, which gives the same tour.
+        """
+        n, order, pos = self.n, self.order, self.pos
+        length = (j - i) % n + 1
+        if 2 * length > n:
+            i, j = (j + 1) % n, (i - 1) % n
+            length = n - length
+        for _ in range(length // 2):
+            order[i], order[j] = order[j], order[i]
+            pos[order[i]], pos[order[j]] = i, j
+            i, j = (i + 1) % n, (j - 1) % n
+
+    def two_opt(self, a):
+        """
+        Tries to replace a tour edge at a with an edge from a to one of its
+        candidates. Returns the stops whose tour edges changed, or None.
+        """
+        d, epsilon = self.dist, self.epsilon
+        for step in (self.succ, self.pred):
+            b = step(a)
+            for c in self.candidates[a]:
+                if d[a][c] >= d[a][b] - epsilon:
+                    break
+                e = step(c)
+                if c == b or e == a:
+                    continue
+                if d[a][c] + d[b][e] < d[a][b] + d[c][e] - epsilon:
+                    if step == self.succ:
+                        self.reverse(self.pos[b], self.pos[c])
+                    else:
+                        self.reverse(self.pos[a], self.pos[e])
+                    return [a, b, c, e]
+        return None
+
+    def or_opt(self, a, max_segment=MAX_SEGMENT):
+        """
+        Tries to move a run of up to max_segment stops that starts or ends at a,
+        possibly reversed, between two neighboring stops next to one of the
+        candidates of its ends. Returns the stops whose tour edges changed, or None.
+        """
+        n, d, order, pos, epsilon = self.n, self.dist, self.order, self.pos, self.epsilon
+        for length in range(1, min(max_segment, n - 3) + 1):
+            for first_pos in (pos[a], pos[a] - length + 1):
+                segment = [order[(first_pos + k) % n] for k in range(length)]
+                first, last = segment[0], segment[-1]
+                p, q = self.pred(first), self.succ(last)
+                removed = d[p][first] + d[last][q] - d[p][q]
+                inside = set(segment)
+                for end in (first, last):
+                    for c in self.candidates[end]:
+                        if d[end][c] >= removed - epsilon:
+                            break
+                        if c in inside:
+                            continue
+                        for u, v in ((c, self.succ(c)), (self.pred(c), c)):
+                            if u in inside or v in inside:
+                                continue
+                            forward = d[u][first] + d[last][v] - d[u][v]
+                            backward = d[u][last] + d[first][v] - d[u][v]
+                            if min(forward, backward) < removed - epsilon:
+                                if backward < forward:
+                                    segment.reverse()
+                                self.move(segment, u)
+                                return [p, q, first, last, u, v]
+        return None
+
+    def move(self, segment, u):
+        """
+        Moves the stops of segment, in that order, to right after u.
+        """
+        inside = set(segment)
+        rest = [v for v in self.order if v not in inside]
+        i = rest.index(u) + 1
+        self.order = rest[:i] + segment + rest[i:]
+        for i, v in enumerate(self.order):
+            self.pos[v] = i
+
+    def optimize(self, max_segment=MAX_SEGMENT, deadline=None, max_passes=MAX_PASSES):
+        """
+        Applies improving moves until none is left, max_passes times n stops
+        have been looked at or the deadline passes, and returns the tour as a
+        list of stop positions that starts at stop 0.
+        """
+        if self.n >= 4:
+            queue = collections.deque(range(self.n))
+            queued = [True] * self.n
+            budget = max_passes * self.n
+            while queue and budget > 0:
+                if deadline is not None and time.time() >= deadline:
+                    break
+                budget -= 1
+                a = queue.popleft()
+                queued[a] = False
+                changed = self.two_opt(a) or self.or_opt(a, max_segment)
+                if changed:
+                    for v in changed + [a]:
+                        if not queued[v]:
+                            queued[v] = True
+                            queue.append(v)
+        i = self.pos[0]
+        return self.order[i:] + self.order[:i]
+
+
+def optimize_tour(tour, dist, num_candidates=NUM_CANDIDATES, max_segment=MAX_SEGMENT, deadline=None):
+    """
+    Reorders the closed tour of vertices tour, keeping tour[0] first, to
+    shorten it under the distance matrix dist.
+    """
+    tour = list(tour)
+    optimizer = TourOptimizer(dist[np.ix_(tour, tour)], num_candidates)
+    return [tour[i] for i in optimizer.optimize(max_segment, deadline)]
+
+
+def improve_route(route, context, num_candidates=NUM_CANDIDATES, max_segment=MAX_SEGMENT, deadline=None):
+    """
+    Reorders the stops of route, until the deadline at the latest, and
+    expands them back into a walk.
+    Output:
+        the better of route and the reordered walk, its dropoffs and its cost
+    """
+    driving, walking, assignment = evaluate_routes([route], context)
+    cost = float(driving[0] + walking[0])
+    dropoffs = assignment_to_dropoffs(assignment[0], context.home_idxs)
+    stops = route_stops(route, context, assignment[0])
+    if len(stops) < 4:
+        return route, dropoffs, cost
+
+    new_route = expand_tour(optimize_tour(stops, context.dist, num_candidates, max_segment, deadline), context)
+    driving, walking, assignment = evaluate_routes([new_route], context)
+    new_cost = float(driving[0] + walking[0])
+    if new_cost < cost - EPSILON * max(1.0, cost):
+        return new_route, assignment_to_dropoffs(assignment[0], context.home_idxs), new_cost
+    return route, dropoffs, cost
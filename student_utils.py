@@ -1,5 +1,6 @@
 import networkx as nx
 import numpy as np
+from shortest_paths import graph_to_weights, all_pairs_shortest_paths
 
 
 def decimal_digits_check(number):
@@ -29,7 +30,7 @@ def adjacency_matrix_to_graph(adjacency_matrix):
     for i in range(len(adjacency_matrix_formatted)):
         adjacency_matrix_formatted[i][i] = 0
 
-    G = nx.convert_matrix.from_numpy_matrix(np.matrix(adjacency_matrix_formatted))
+    G = nx.from_numpy_array(np.array(adjacency_matrix_formatted))
 
     message = ''
 
@@ -42,11 +43,20 @@ def adjacency_matrix_to_graph(adjacency_matrix):
 
 
 def is_metric(G):
-    shortest = dict(nx.floyd_warshall(G))
-    for u, v, datadict in G.edges(data=True):
-        if abs(shortest[u][v] - datadict['weight']) >= 0.00001:
-            return False
-    return True
+    return weights_are_metric(graph_to_weights(G))
+
+
+def weights_are_metric(weights):
+    """
+    Whether every edge of a weight matrix (np.inf for no edge) is a shortest
+    path between its endpoints, comparing all edges with the all pairs shortest
+    paths at once. A negative edge is never metric.
+    """
+    edges = np.isfinite(weights)
+    if np.any(weights[edges] < 0):
+        return False
+    shortest, _ = all_pairs_shortest_paths(weights)
+    return bool(np.all(np.abs(shortest[edges] - weights[edges]) < 0.00001))
 
 
 def adjacency_matrix_to_edge_list(adjacency_matrix):
@@ -72,11 +82,13 @@ G is the adjacency matrix.
 car_cycle is the cycle of the car in terms of indices.
 dropoff_mapping is a dictionary of dropoff location to list of TAs that got off at said droppoff location
 in terms of indices.
+shortest is an optional precomputed all pairs shortest path table, and context an
+optional solvers.context.InstanceContext whose table is used when shortest is not given.
+When context is given, edge weights are read from it and G is not used.
 """
-def cost_of_solution(G, car_cycle, dropoff_mapping, shortest=None):
+def cost_of_solution(G, car_cycle, dropoff_mapping, shortest=None, context=None):
     cost = 0
     message = ''
-    dropoffs = dropoff_mapping.keys()
     # if not is_valid_walk(G, car_cycle):
     #     message += 'This is not a valid walk for the given graph.\n'
     #     cost = 'infinite'
@@ -85,22 +97,8 @@ def cost_of_solution(G, car_cycle, dropoff_mapping, shortest=None):
         message += 'The start and end vertices are not the same.\n'
         cost = 'infinite'
     if cost != 'infinite':
-        if len(car_cycle) == 1:
-            car_cycle = []
-        else:
-            car_cycle = get_edges_from_path(car_cycle[:-1]) + [(car_cycle[-2], car_cycle[-1])]
-        if len(car_cycle) != 1:
-            driving_cost = sum([G.edges[e]['weight'] for e in car_cycle]) * 2 / 3
-        else:
-            driving_cost = 0
-        walking_cost = 0
-        if not shortest:
-            shortest = dict(nx.floyd_warshall(G))
-
-        for drop_location in dropoffs:
-            for house in dropoff_mapping[drop_location]:
-                walking_cost += shortest[drop_location][house]
-
+        driving_cost, walking_cost = driving_and_walking_costs(G, car_cycle, dropoff_mapping,
+                                                               shortest=shortest, context=context)
         message += f'The driving cost of your solution is {driving_cost}.\n'
         message += f'The walking cost of your solution is {walking_cost}.\n'
         cost = driving_cost + walking_cost
@@ -108,5 +106,37 @@ def cost_of_solution(G, car_cycle, dropoff_mapping, shortest=None):
     message += f'The total cost of your solution is {cost}.\n'
     return cost, message
 
+
+def driving_and_walking_costs(G, car_cycle, dropoff_mapping, shortest=None, context=None):
+    """
+    The two parts of cost_of_solution for a car cycle that starts and ends at the
+    same vertex, with the same arguments. Like G.edges, a missing edge on the
+    cycle raises KeyError.
+    """
+    if len(car_cycle) == 1:
+        car_cycle = []
+    else:
+        car_cycle = get_edges_from_path(car_cycle[:-1]) + [(car_cycle[-2], car_cycle[-1])]
+    if len(car_cycle) != 1 and context is not None:
+        weights = context.weight_lookup
+        for u, v in car_cycle:
+            if u is None or v is None or v not in weights[u]:
+                raise KeyError((u, v))
+        driving_cost = sum([weights[u][v] for u, v in car_cycle]) * 2 / 3
+    elif len(car_cycle) != 1:
+        driving_cost = sum([G.edges[e]['weight'] for e in car_cycle]) * 2 / 3
+    else:
+        driving_cost = 0
+    walking_cost = 0
+    if shortest is None and context is not None:
+        shortest = context.dist
+    if shortest is None:
+        shortest, _ = all_pairs_shortest_paths(graph_to_weights(G, nodelist=range(len(G))))
+
+    for drop_location in dropoff_mapping.keys():
+        for house in dropoff_mapping[drop_location]:
+            walking_cost += shortest[drop_location][house]
+    return driving_cost, walking_cost
+
 def convert_locations_to_indices(list_to_convert, list_of_locations):
     return [list_of_locations.index(name) if name in list_of_locations else None for name in list_to_convert]
@@ -0,0 +1,72 @@
+import contextlib
+import io
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+import pytest
+
+import instance_cache
+from solvers import annealing
+from solvers.context import InstanceContext
+from solvers.evaluation import EvaluationCache, evaluate_routes
+from solvers.mst import mst_dfs_solve
+from solvers.tour import improve_route
+
+INPUTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'inputs')
+
+
+def mst_route(name):
+    _, _, locations, homes, start, adjacency_matrix = instance_cache.load_parsed(os.path.join(INPUTS, name))
+    context = InstanceContext(locations, homes, start, adjacency_matrix)
+    with contextlib.redirect_stdout(io.StringIO()):
+        route, _ = mst_dfs_solve(locations, homes, start, adjacency_matrix, context=context)
+    return route, context
+
+
+def route_cost(route, context):
+    driving, walking, _ = evaluate_routes([route], context)
+    return float(driving[0] + walking[0])
+
+
+def test_reported_snapshots_are_consistent():
+    route, context = mst_route('1_50.in')
+    reports = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        annealing.anneal(context, [route], 2, chains=2, report_interval=0.1,
+                         on_improvement=lambda path, dropoffs, cost: reports.append((path, dropoffs, cost)))
+    assert reports
+    for path, dropoffs, cost in reports:
+        assert set(dropoffs) <= set(path)
+        assert sorted(h for homes in dropoffs.values() for h in homes) == sorted(context.home_idxs)
+        assert cost == pytest.approx(route_cost(path, context))
+
+
+def test_chain_bests_are_kept_when_routes_do_not_fit(monkeypatch):
+    class TinySharedBest(annealing.SharedBest):
+        def __init__(self, route, cost, capacity):
+            super().__init__(route, cost, 1)
+
+    monkeypatch.setattr(annealing, 'SharedBest', TinySharedBest)
+    route, context = mst_route('1_50.in')
+    start_cost = improve_route(route, context)[2]
+    with contextlib.redirect_stdout(io.StringIO()):
+        new_route, _, cost = annealing.anneal(context, [route], 2, chains=1)
+    assert cost < start_cost
+    assert cost == pytest.approx(route_cost(new_route, context))
+
+
+@pytest.mark.parametrize('name', ['1_50.in', '2_50.in'])
+def test_settle_with_a_warm_cache_matches_a_cold_run(name):
+    route, context = mst_route(name)
+    rng = np.random.default_rng(0)
+    warm = EvaluationCache()
+    for _ in range(20):
+        annealing.settle(context, annealing.kick(context, list(route), rng), warm)
+    hits = warm.hits
+    for _ in range(20):
+        path = annealing.kick(context, list(route), rng)
+        assert annealing.settle(context, list(path), warm) == annealing.settle(context, list(path), EvaluationCache())
+    # Later descents run into paths that earlier ones passed through
+    assert warm.hits > hits
@@ -0,0 +1,63 @@
+import itertools
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+import pytest
+
+from solvers.bounds import lower_bound, moat_bound, radius_bound
+from solvers.context import InstanceContext
+from solvers.tour import tour_length
+
+
+def random_instance(seed, n=7):
+    """
+    A connected graph on n locations with random integer weights, a random
+    start and a random nonempty set of homes.
+    """
+    rng = np.random.default_rng(seed)
+    weights = np.full((n, n), np.nan)
+    for v in range(1, n):
+        u = int(rng.integers(v))
+        weights[u, v] = weights[v, u] = rng.integers(1, 20)
+    for u, v in itertools.combinations(range(n), 2):
+        if np.isnan(weights[u, v]) and rng.random() < 0.3:
+            weights[u, v] = weights[v, u] = rng.integers(1, 20)
+    locations = [f'v{i}' for i in range(n)]
+    homes = [locations[i] for i in sorted(rng.choice(n, size=int(rng.integers(1, n + 1)), replace=False))]
+    return InstanceContext(locations, homes, locations[int(rng.integers(n))], weights)
+
+
+def brute_force_optimum(context):
+    """
+    The cheapest solution: for every set of vertices the car visits, the
+    shortest closed tour through them from the start, with every home walking
+    from the closest of them.
+    """
+    start = context.start_idx
+    others = [v for v in range(len(context.dist)) if v != start]
+    best = np.inf
+    for size in range(len(others) + 1):
+        for visited in itertools.combinations(others, size):
+            walking = context.dist[np.ix_(context.home_array, [start, *visited])].min(axis=1).sum()
+            driving = min(tour_length([start, *order], context.dist) for order in itertools.permutations(visited))
+            best = min(best, driving * 2 / 3 + walking)
+    return best
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_bounds_are_at_most_the_optimum(seed):
+    context = random_instance(seed)
+    optimum = brute_force_optimum(context)
+    for bound in (radius_bound, moat_bound, lower_bound):
+        assert bound(context) <= optimum * (1 + 1e-9)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_moat_bound_is_exact_for_one_home(seed):
+    context = random_instance(seed)
+    home = next(h for h in context.list_of_locations if h != context.starting_car_location)
+    context = InstanceContext(context.list_of_locations, [home], context.starting_car_location,
+                              context.adjacency_matrix)
+    assert moat_bound(context) == pytest.approx(brute_force_optimum(context))
@@ -0,0 +1,61 @@
+import glob
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pytest
+
+import instance_cache
+from solvers.context import InstanceContext
+from solvers.flp import FacilityLocation
+
+INPUTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'inputs')
+
+
+def reference_facilities(context, variant):
+    """
+    The facilities the original greedy set cover opened, in opening order,
+    computed the way it did: every (facility, s nearest homes) set is
+    rescored from scratch every round.
+    """
+    dist = context.dist.tolist()
+    homes = context.home_idxs
+    start = context.start_idx
+    sets = []
+    for f in range(len(dist)):
+        by_distance = sorted(homes, key=lambda h: dist[f][h])
+        for s in range(1, len(homes)):
+            nearest = by_distance[:s]
+            cost = sum(dist[f][h] for h in nearest) + (2 / 3) * dist[start][f]
+            sets.append({'facility': f, 'homes': nearest, 'cost': cost})
+    uncovered = set(homes)
+    scored = [(s['cost'] / len(s['homes']), s) for s in sets]
+    opened = []
+    while uncovered and scored:
+        best = min(scored, key=lambda x: x[0])
+        scored.remove(best)
+        best = best[1]
+        if best['facility'] not in opened:
+            opened.append(best['facility'])
+        uncovered -= set(best['homes'])
+        rescored = []
+        for _, s in scored:
+            f = s['facility']
+            if variant == 1 and f in opened:
+                s['cost'] -= dist[start][f]
+            if variant == 2 and f not in opened:
+                s['cost'] = (sum(dist[h][f] for h in s['homes'])
+                             + (1 / 4) * sum(dist[r][f] for r in opened if r != start))
+            count = len(uncovered.intersection(s['homes']))
+            rescored.append((s['cost'] / count if count else float('inf'), s))
+        scored = rescored
+    return opened
+
+
+@pytest.mark.parametrize('input_file', sorted(glob.glob(os.path.join(INPUTS, '1*_50.in')))[:10])
+def test_facilities_match_the_original_greedy(input_file):
+    _, _, locations, homes, start, adjacency_matrix = instance_cache.load_parsed(input_file)
+    context = InstanceContext(locations, homes, start, adjacency_matrix)
+    flp = FacilityLocation(context)
+    for variant in (0, 1, 2):
+        assert flp.select(variant) == reference_facilities(context, variant)
@@ -0,0 +1,37 @@
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from generate_inputs import generate_instance
+import input_validator
+from instance_io import write_input
+
+
+def write_generated(path, size, seed=0):
+    locations, houses, source, weights = generate_instance(size, seed)
+    write_input(str(path), [str(v) for v in locations], [str(v) for v in houses], str(source), weights)
+    return str(path)
+
+
+def test_generated_input_names_are_accepted_with_sizes(tmp_path):
+    message, error = input_validator.tests(write_generated(tmp_path / '3_50.in', 50), sizes=[50, 1000])
+    assert not error, message
+
+
+def test_generated_input_larger_than_its_name_is_rejected(tmp_path):
+    message, error = input_validator.tests(write_generated(tmp_path / '3_50.in', 60), sizes=[50, 60])
+    assert error and 'the size of the input is 60' in message
+
+
+def test_generated_input_names_need_an_allowed_size(tmp_path):
+    input_file = write_generated(tmp_path / '3_50.in', 50)
+    message, error = input_validator.tests(input_file, sizes=[100])
+    assert error and 'allowed file names' in message
+    os.rename(input_file, tmp_path / '50.in')
+    message, error = input_validator.tests(str(tmp_path / '50.in'), sizes=[50])
+    assert not error, message
+
+
+def test_generated_input_names_need_sizes(tmp_path):
+    message, error = input_validator.tests(write_generated(tmp_path / '1_50.in', 50))
+    assert error and 'allowed file names' in message
@@ -0,0 +1,42 @@
+import contextlib
+import io
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+import pytest
+
+import instance_cache
+from solvers.context import InstanceContext
+from solvers.evaluation import evaluate_routes
+from solvers.greedy import greedy_shortest_path_solve
+from solvers.local_search import IncrementalEvaluator, get_neighbors
+from solvers.mst import mst_dfs_solve
+
+INPUTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'inputs')
+
+
+def initial_routes(name):
+    _, _, locations, homes, start, adjacency_matrix = instance_cache.load_parsed(os.path.join(INPUTS, name))
+    context = InstanceContext(locations, homes, start, adjacency_matrix)
+    with contextlib.redirect_stdout(io.StringIO()):
+        routes = [solve(locations, homes, start, adjacency_matrix, context=context)[0]
+                  for solve in (mst_dfs_solve, greedy_shortest_path_solve)]
+    return routes, context
+
+
+@pytest.mark.parametrize('name', ['1_50.in', '2_100.in', '1_200.in', '20_100.in'])
+def test_costs_of_matches_evaluate_routes(name):
+    routes, context = initial_routes(name)
+    for path in routes:
+        # Follow the best neighbor for a few steps, so that paths with repeated
+        # vertices and detours are checked too
+        for _ in range(3):
+            neighbors = get_neighbors(context, list(path))
+            if not neighbors:
+                break
+            costs = IncrementalEvaluator(context, path).costs_of(neighbors)
+            driving, walking, _ = evaluate_routes([n.path for n in neighbors], context)
+            np.testing.assert_allclose(costs, driving + walking, rtol=1e-9)
+            path = neighbors[int(np.argmin(costs))].path
@@ -0,0 +1,107 @@
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+
+import instance_cache
+import instance_io
+import results_store
+import utils
+
+
+def write_triangle(input_file):
+    weights = np.array([[np.nan, 1, 2], [1, np.nan, 1], [2, 1, np.nan]])
+    instance_io.write_input(input_file, ['a', 'b', 'c'], ['b', 'c'], 'a', weights)
+
+
+def record(conn, cost, solver='test'):
+    return results_store.record_result(conn, 'h', 'h.in', cost, solver, 1.0, [0, 1, 0], {1: [1, 2]})
+
+
+def test_only_cheaper_solutions_replace_the_best(tmp_path):
+    conn = results_store.connect(str(tmp_path / 'results.sqlite'))
+    assert results_store.best_cost(conn, 'h') is None
+    assert record(conn, 5.0)
+    assert not record(conn, 6.0)
+    assert not record(conn, 5.0)
+    assert not record(conn, 5.0 - results_store.COST_TOLERANCE / 2)
+    assert results_store.best_cost(conn, 'h') == 5.0
+    assert record(conn, 4.0, solver='better')
+    result = results_store.get_result(conn, 'h')
+    assert (result.cost, result.solver) == (4.0, 'better')
+
+
+def test_final_solution_replaces_its_snapshot(tmp_path):
+    conn = results_store.connect(str(tmp_path / 'results.sqlite'))
+    assert record(conn, 5.0, solver=results_store.SNAPSHOT_SOLVER)
+    assert not record(conn, 5.5, solver='final')
+    assert record(conn, 5.0, solver='final')
+    assert results_store.get_result(conn, 'h').solver == 'final'
+    # A final solution is only replaced by a cheaper one
+    assert not record(conn, 5.0, solver='other')
+
+
+def test_beats_best_agrees_with_record_result(tmp_path):
+    conn = results_store.connect(str(tmp_path / 'results.sqlite'))
+    costs = [5.0, 6.0, 5.0, 4.0, 4.0, 3.0]
+    solvers = [results_store.SNAPSHOT_SOLVER, 'a', 'a', results_store.SNAPSHOT_SOLVER, 'b', 'c']
+    for cost, solver in zip(costs, solvers):
+        expected = results_store.beats_best(conn, 'h', cost)
+        assert record(conn, cost, solver=solver) == expected
+
+
+def test_lower_bound_keeps_the_largest(tmp_path):
+    conn = results_store.connect(str(tmp_path / 'results.sqlite'))
+    results_store.record_lower_bound(conn, 'h', 'h.in', 2.0)
+    results_store.record_lower_bound(conn, 'h', 'h.in', 1.0)
+    assert results_store.get_result(conn, 'h').lower_bound == 2.0
+    # A bound alone is not a solution
+    assert results_store.get_result(conn, 'h').route is None
+    assert results_store.beats_best(conn, 'h', 100.0)
+    record(conn, 3.0)
+    results_store.record_lower_bound(conn, 'h', 'h.in', 2.5)
+    result = results_store.get_result(conn, 'h')
+    assert (result.cost, result.lower_bound) == (3.0, 2.5)
+
+
+def test_route_and_dropoffs_round_trip(tmp_path):
+    conn = results_store.connect(str(tmp_path / 'results.sqlite'))
+    results_store.record_result(conn, 'h', 'h.in', 7.0, 'test', None,
+                                np.array([0, 2, 1, 0]), {np.int64(2): [np.int64(2)], 1: [1]})
+    result = results_store.get_result(conn, 'h')
+    assert result.route == [0, 2, 1, 0]
+    assert result.dropoffs == {2: [2], 1: [1]}
+
+
+def test_is_solved():
+    result = results_store.Result('h', 'h.in', 3.0, 'test', 1.0, [0], {0: [0]}, None, 0.0)
+    assert not results_store.is_solved(None)
+    assert not results_store.is_solved(result)
+    assert results_store.is_solved(result, target=3.0)
+    assert not results_store.is_solved(result, target=2.9)
+    assert results_store.is_solved(result._replace(lower_bound=3.0))
+    assert not results_store.is_solved(result._replace(lower_bound=2.0))
+    assert not results_store.is_solved(result._replace(cost=None, lower_bound=3.0))
+
+
+def test_import_and_export_outputs(tmp_path):
+    input_file = str(tmp_path / '1_3.in')
+    write_triangle(input_file)
+    outputs = str(tmp_path / 'outputs')
+    os.makedirs(outputs)
+    output_file = utils.input_to_output(input_file, outputs)
+    instance_io.write_output(output_file, [0, 1, 0], {1: [1, 2]}, ['a', 'b', 'c'])
+
+    conn = results_store.connect(str(tmp_path / 'results.sqlite'))
+    assert results_store.import_outputs(conn, [input_file], outputs) == 1
+    result = results_store.get_result(conn, instance_cache.content_hash(input_file))
+    assert result.solver == 'import'
+    assert result.route == [0, 1, 0] and result.dropoffs == {1: [1, 2]}
+    # The same outputs again are not an improvement
+    assert results_store.import_outputs(conn, [input_file], outputs) == 0
+
+    exported = str(tmp_path / 'exported')
+    assert results_store.export_outputs(conn, [input_file], exported) == 1
+    with open(output_file) as f, open(utils.input_to_output(input_file, exported)) as g:
+        assert f.read() == g.read()
@@ -0,0 +1,82 @@
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+import pytest
+
+import instance_cache
+import instance_io
+import results_store
+import solver
+import utils
+
+
+def write_triangle(input_file):
+    weights = np.array([[np.nan, 1, 2], [1, np.nan, 1], [2, 1, np.nan]])
+    instance_io.write_input(input_file, ['a', 'b', 'c'], ['b', 'c'], 'a', weights)
+
+
+def test_timed_out_snapshot_survives_worse_rerun(tmp_path, monkeypatch):
+    input_file = str(tmp_path / '1_3.in')
+    output_directory = str(tmp_path / 'outputs')
+    store = str(tmp_path / 'results.sqlite')
+    write_triangle(input_file)
+
+    def timed_out_solve(*args, on_improvement=None, **kwargs):
+        on_improvement([0, 1, 0], {1: [1, 2]}, 3.0)
+        raise TimeoutError('killed after its first snapshot')
+
+    monkeypatch.setattr(solver, 'solve', timed_out_solve)
+    with pytest.raises(TimeoutError):
+        solver.solve_input(input_file, output_directory=output_directory, store=store)
+    output_file = utils.input_to_output(input_file, output_directory)
+    with open(output_file) as f:
+        snapshot = f.read()
+
+    def worse_solve(*args, on_improvement=None, details=None, **kwargs):
+        on_improvement([0], {0: [1, 2]}, 3.5)
+        details.update(solver='WORSE', cost=3.5, lower_bound=1.0, gap=0.0, timings={})
+        return [0], {0: [1, 2]}
+
+    monkeypatch.setattr(solver, 'solve', worse_solve)
+    solver.solve_from_file(input_file, output_directory, store=store)
+    with open(output_file) as f:
+        assert f.read() == snapshot
+    conn = results_store.connect(store)
+    best = results_store.get_result(conn, instance_cache.content_hash(input_file))
+    assert best.cost == 3.0 and best.route == [0, 1, 0]
+
+
+def test_failed_write_keeps_the_old_output_and_store(tmp_path, monkeypatch):
+    input_file = str(tmp_path / '1_3.in')
+    output_directory = str(tmp_path / 'outputs')
+    store = str(tmp_path / 'results.sqlite')
+    write_triangle(input_file)
+
+    def solve_costing(cost, route):
+        def fake_solve(*args, details=None, **kwargs):
+            details.update(solver='FAKE', cost=cost, lower_bound=1.0, gap=0.0, timings={})
+            return route, {route[0]: [1, 2]}
+        return fake_solve
+
+    monkeypatch.setattr(solver, 'solve', solve_costing(3.5, [0]))
+    solver.solve_from_file(input_file, output_directory, store=store)
+    output_file = utils.input_to_output(input_file, output_directory)
+    with open(output_file) as f:
+        written = f.read()
+
+    def killed_replace(src, dst):
+        raise KeyboardInterrupt('killed while replacing the output')
+
+    monkeypatch.setattr(solver, 'solve', solve_costing(3.0, [0, 1, 0]))
+    monkeypatch.setattr(instance_io.os, 'replace', killed_replace)
+    with pytest.raises(KeyboardInterrupt):
+        solver.solve_from_file(input_file, output_directory, store=store)
+    monkeypatch.undo()
+
+    with open(output_file) as f:
+        assert f.read() == written
+    assert os.listdir(output_directory) == [os.path.basename(output_file)]
+    conn = results_store.connect(store)
+    assert results_store.best_cost(conn, instance_cache.content_hash(input_file)) == 3.5
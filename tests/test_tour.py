@@ -0,0 +1,82 @@
+import contextlib
+import io
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import time
+
+import numpy as np
+import pytest
+
+import instance_cache
+from solvers.context import InstanceContext
+from solvers.evaluation import evaluate_routes
+from solvers.greedy import greedy_shortest_path_solve
+from solvers.mst import mst_dfs_solve
+from solvers.tour import TourOptimizer, improve_route, tour_length
+
+INPUTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'inputs')
+
+
+def load_context(name):
+    _, _, locations, homes, start, adjacency_matrix = instance_cache.load_parsed(os.path.join(INPUTS, name))
+    return locations, homes, start, adjacency_matrix, InstanceContext(locations, homes, start, adjacency_matrix)
+
+
+def mst_route(name):
+    locations, homes, start, adjacency_matrix, context = load_context(name)
+    with contextlib.redirect_stdout(io.StringIO()):
+        route, _ = mst_dfs_solve(locations, homes, start, adjacency_matrix, context=context)
+    return route, context
+
+
+def route_cost(route, context):
+    driving, walking, _ = evaluate_routes([route], context)
+    return float(driving[0] + walking[0])
+
+
+@pytest.mark.parametrize('name', ['20_100.in', '153_50.in', '15_50.in'])
+def test_improve_route_finishes_with_weights_near_1e9(name):
+    route, context = mst_route(name)
+    assert np.nanmax(np.where(np.isfinite(context.dist), context.dist, np.nan)) > 1e8
+    new_route, _, cost = improve_route(route, context)
+    assert cost <= route_cost(route, context)
+    assert cost == pytest.approx(route_cost(new_route, context))
+
+
+@pytest.mark.parametrize('name', ['1_50.in', '2_50.in', '2_100.in', '1_200.in'])
+def test_improve_route_never_increases_cost(name):
+    locations, homes, start, adjacency_matrix, context = load_context(name)
+    with contextlib.redirect_stdout(io.StringIO()):
+        routes = [solve(locations, homes, start, adjacency_matrix, context=context)[0]
+                  for solve in (mst_dfs_solve, greedy_shortest_path_solve)]
+    for route in routes:
+        new_route, _, cost = improve_route(route, context)
+        assert new_route[0] == new_route[-1] == context.start_idx
+        assert cost <= route_cost(route, context) * (1 + 1e-12)
+        assert cost == pytest.approx(route_cost(new_route, context))
+        # Improving an improved route finds nothing more to gain
+        assert improve_route(new_route, context)[2] <= cost * (1 + 1e-12)
+
+
+def test_optimize_stops_at_the_deadline():
+    rng = np.random.default_rng(0)
+    points = rng.random((300, 2)) * 1e9
+    dist = np.linalg.norm(points[:, None] - points[None], axis=2)
+    optimizer = TourOptimizer(dist)
+    start = time.time()
+    tour = optimizer.optimize(deadline=start)
+    assert sorted(tour) == list(range(300)) and tour[0] == 0
+    assert tour_length(tour, dist) == pytest.approx(tour_length(list(range(300)), dist))
+
+
+def test_optimize_is_capped_at_max_passes():
+    rng = np.random.default_rng(1)
+    points = rng.random((200, 2))
+    dist = np.linalg.norm(points[:, None] - points[None], axis=2)
+    capped = TourOptimizer(dist)
+    capped_tour = capped.optimize(max_passes=0)
+    assert capped_tour == list(range(200))
+    full = TourOptimizer(dist).optimize()
+    assert tour_length(full, dist) < tour_length(capped_tour, dist)
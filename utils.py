@@ -1,4 +1,5 @@
 import sys, os
+from instance_io import read_lines
 
 def get_files_with_extension(directory, extension):
     files = []
@@ -8,10 +9,7 @@ def get_files_with_extension(directory, extension):
     return files
 
 def read_file(file):
-    with open(file, 'r') as f:
-        data = f.readlines()
-    data = [line.replace("Â", " ").strip().split() for line in data]
-    return data
+    return [line.split() for line in read_lines(file)]
 
 
 def write_to_file(file, string, append=False):